@@ -6,6 +6,8 @@ import pyvisa
 import time
 
 import nanodrivers.visa_drivers.visa_dev as v
+from nanodrivers.utilities.settle import Settle, SettleModel
+from nanodrivers.LakeShore370.pid_tune import PIDTable
 
 
 global_ls_address = 'GPIB0::5::INSTR'
@@ -42,13 +44,25 @@ class LakeShore(v.BaseVisa):
      Args:
          device_num:
              GPIB num (float) or full device address (string)
+         pid_table:
+             PID table applied on every set_setpoint: PIDTable, file name, or True - default table file
+             (see pid_tune.find_table). None - PID is not changed by set_setpoint
      """
-    def __init__(self, device_num=global_ls_address):
+    def __init__(self, device_num=global_ls_address, pid_table=None):
         super().__init__(device_num)
+        self.settle = Settle({'setpoint': SettleModel(t0=30, slope=600, t_max=3600)})  # s per K
+        self.get_setpoint()
 
         self.PID = np.array([nan, nan, nan])
         self.get_PID()
 
+        # PID table from autotune (see pid_tune.PIDTuner), applied on every set_setpoint
+        if pid_table is True:
+            pid_table = PIDTable()
+        elif isinstance(pid_table, str):
+            pid_table = PIDTable(pid_table)
+        self.pid_table = pid_table
+
         self.channel_temp = np.full(20, np.nan)
 
         for i in [1, 2, 5, 6]:
@@ -84,6 +98,39 @@ class LakeShore(v.BaseVisa):
         self.channel_temp[channel-1] = float((self.query('RDGK? {}'.format(channel)))[:-2])
         return self.channel_temp[channel-1]
 
+    def get_scan(self):
+        """
+        Function to get scanner state
+        Returns: channel currently scanned, autoscan (1 - on, 0 - off)
+
+        """
+        sr = self.query('SCAN?').strip().split(',')
+        return int(sr[0]), int(sr[1])
+
+    def set_scan(self, channel, autoscan=0):
+        """
+        Function to switch scanner to channel
+        Args:
+            channel: channel number [1..16]
+            autoscan: 1 - scanner goes through enabled channels by itself, 0 - stays on channel
+
+        Returns: None
+
+        """
+        self.write('SCAN {},{}'.format(int(channel), int(autoscan)))
+
+    def get_inset(self, channel):
+        """
+        Function to get input channel parameters
+        Args:
+            channel: channel number [1..16]
+
+        Returns: enabled (1/0), dwell time in s, pause (change pause) time in s
+
+        """
+        sr = self.query('INSET? {}'.format(int(channel))).strip().split(',')
+        return int(sr[0]), float(sr[1]), float(sr[2])
+
     def get_PID(self):
         """
         Function to get PID control
@@ -105,18 +152,26 @@ class LakeShore(v.BaseVisa):
         Returns: None
 
         """
-        return float(self.query('SETP?')[:-2])
+        setpoint = float(self.query('SETP?')[:-2])
+        self.settle.known('setpoint', setpoint)
+        return setpoint
 
     def set_setpoint(self, set_temp):
         """
-        Function to set temperature of specific channel
+        Function to set temperature of specific channel.
+        If PID table is loaded (self.pid_table), PID for this temperature is set as well.
         Args:
             set_temp: temperature in Kelvins to be set on channel
             channel: channel number [1..6]
         Returns: None
 
         """
+        if self.pid_table is not None:
+            pid = self.pid_table.pid_for(set_temp)
+            if pid is not None:
+                self.set_PID(*pid)
         self.write('SETP {}'.format(str(set_temp)))
+        self.settle.step('setpoint', set_temp)
 
     def set_PID(self, P, I, D):
         """
@@ -134,11 +189,12 @@ class LakeShore(v.BaseVisa):
 
         """
         self.write('PID {},{},{}'.format(str(P), str(I), str(D)))
+        self.PID[:] = [P, I, D]
 
     def adjust_PID(self):
         """
-        Function to update PID accordingly to the temperature using a table
-        TODO: setUP script to sweep over PID parameters to find optimal
+        Function to update PID accordingly to the temperature using a table.
+        Hand-picked values, see pid_tune.PIDTuner for measured table applied by set_setpoint.
         Returns: None
         """
 
@@ -1,3 +1,5 @@
-
-
-from .LS_370_GPIB import LakeShore
\ No newline at end of file
+from .LS_370_GPIB import LakeShore
+from .temp_logger import TempLogger
+from .stability import TempStability
+from .pid_tune import PIDTuner, PIDTable
+from .scanner import ScanScheduler
\ No newline at end of file
@@ -0,0 +1,237 @@
+import os
+import time
+import numpy as np
+
+from nanodrivers.LakeShore370.stability import TempStability
+
+
+default_table_file = None  # path of the PID table set by user, overrides environment and user folder
+table_env = 'NANODRIVERS_PID_TABLE'  # environment variable with the path of the PID table
+
+
+def find_table():
+    """
+    Function to find the PID table file: default_table_file, then environment variable,
+    then pid_table.txt in the user configuration folder (%APPDATA%\\nanodrivers on Windows,
+    ~/.config/nanodrivers otherwise). The table belongs to the cryostat, not to the installed package.
+    Returns: path (the file may not exist yet)
+
+    """
+    path = default_table_file or os.environ.get(table_env)
+    if path:
+        return path
+    if os.name == 'nt':
+        folder = os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        folder = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(folder, 'nanodrivers', 'pid_table.txt')
+
+
+def fit_fopdt(t, temp, du):
+    """
+    Function to fit first-order-plus-dead-time model to a step response
+    (two-point method: times of 28.3% and 63.2% of the final change):
+
+        T(t) = T0 + K * du * (1 - exp(-(t - theta) / tau)),  t > theta
+
+    Args:
+        t: time from the step in s
+        temp: temperature in K
+        du: heater output step in %
+
+    Returns: K (K per % of heater), tau (s), theta (s)
+
+    """
+    t = np.asarray(t, dtype=float)
+    temp = np.asarray(temp, dtype=float)
+    n_end = max(len(temp) // 10, 1)
+    t0, t_end = temp[0], np.mean(temp[-n_end:])
+    change = t_end - t0
+    frac = (temp - t0) / change
+    t28 = t[np.argmax(frac >= 0.283)]
+    t63 = t[np.argmax(frac >= 0.632)]
+    tau = max(1.5 * (t63 - t28), 1e-3)
+    theta = max(t63 - tau, 0.)
+    return change / du, tau, theta
+
+
+def imc_pid(k, tau, theta, tau_c=None):
+    """
+    Function to compute PID parameters for FOPDT process (IMC tuning rules).
+    Smaller tau_c gives faster settling, tau_c = theta is fast but still robust.
+
+    Args:
+        k: process gain, K per % of heater
+        tau: time constant in s
+        theta: dead time in s
+        tau_c: closed loop time constant in s, default theta (or tau/10 without dead time)
+
+    Returns: P, I, D limited to Lake Shore 370 ranges
+
+    """
+    if tau_c is None:
+        tau_c = theta if theta > 0 else tau / 10
+    p = (tau + theta / 2) / (k * (tau_c + theta / 2))
+    i = tau + theta / 2
+    d = tau * theta / (2 * tau + theta)
+    return float(np.clip(abs(p), 0.001, 1000)), float(np.clip(i, 0, 10000)), float(np.clip(d, 0, 2500))
+
+
+class PIDTable:
+    """
+    Lookup table of PID parameters versus temperature with linear interpolation.
+    Stored on disk as text file with columns: T (K), P, I, D.
+
+     Args:
+         file_name:
+             table file, read if it exists, None - see find_table
+     """
+    def __init__(self, file_name=None):
+        self.file_name = find_table() if file_name is None else file_name
+        self.table = np.empty((0, 4))
+        if os.path.exists(self.file_name):
+            self.load()
+
+    def load(self):
+        self.table = np.atleast_2d(np.loadtxt(self.file_name))
+        self.table = self.table[np.argsort(self.table[:, 0])]
+
+    def save(self):
+        folder = os.path.dirname(self.file_name)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        np.savetxt(self.file_name, self.table, fmt='%.6g', header='T(K) P I D')
+
+    def add(self, temp, p, i, d):
+        """
+        Function to add (or replace) a row of the table
+        Args:
+            temp: temperature in K
+            p, i, d: PID parameters
+
+        Returns: None
+
+        """
+        table = self.table[self.table[:, 0] != temp]
+        table = np.vstack([table, [temp, p, i, d]])
+        self.table = table[np.argsort(table[:, 0])]
+
+    def pid_for(self, temp):
+        """
+        Function to get PID parameters for temperature, constant outside of the table range
+        Args:
+            temp: temperature in K
+
+        Returns: P, I, D (None if table is empty)
+
+        """
+        if len(self.table) == 0:
+            return None
+        return tuple(float(np.interp(temp, self.table[:, 0], self.table[:, k])) for k in [1, 2, 3])
+
+
+class PIDTuner:
+    """
+    PID autotune for Lake Shore 370 by open loop step response experiments.
+    At every temperature the loop is stabilised with the current PID, switched to open loop
+    with the same heater output, heater output is stepped by du and the response is fitted
+    with first-order-plus-dead-time model. PID is computed with IMC rules and stored in the table.
+
+    Example:
+        tuner = PIDTuner(ls, channel=6)
+        tuner.autotune([0.05, 0.1, 0.3, 0.7, 1, 1.5, 2, 3, 4])
+        ls.pid_table = tuner.table   # PID is now applied on every set_setpoint
+        ls = LakeShore(pid_table=True)  # later sessions: table from the saved file (see find_table)
+
+     Args:
+         ls:
+             LakeShore object
+         channel:
+             control channel
+         table:
+             PIDTable to fill, default table in the default file (see find_table)
+     """
+    def __init__(self, ls, channel, table=None):
+        self.ls = ls
+        self.channel = channel
+        self.table = PIDTable() if table is None else table
+        self.results = dict()
+
+    def get_heater(self):
+        """
+        Returns: heater output in % of range
+
+        """
+        return float(self.ls.query('HTR?')[:-2])
+
+    def step_response(self, du, duration, period=1.):
+        """
+        Function to record open loop step response at the current operating point
+        Args:
+            du: heater output step in %
+            duration: recording time in s
+            period: time between readings in s
+
+        Returns: t (s), T (K), numpy arrays
+
+        """
+        u0 = self.get_heater()
+        self.ls.write('CMODE 3')  # open loop
+        self.ls.write('MOUT {}'.format(u0))
+        t, temp = [], []
+        try:
+            time.sleep(period)
+            temp.append(self.ls.get_temp(self.channel))
+            t.append(0.)
+            self.ls.write('MOUT {}'.format(u0 + du))
+            t_start = time.monotonic()
+            while time.monotonic() - t_start < duration:
+                time.sleep(period)
+                t.append(time.monotonic() - t_start)
+                temp.append(self.ls.get_temp(self.channel))
+        finally:
+            self.ls.write('CMODE 1')  # back to closed loop PID
+        return np.array(t), np.array(temp)
+
+    def tune_at(self, temp, du=1., duration=600., period=1., tau_c=None, timeout=3600.):
+        """
+        Function to tune PID at one temperature
+        Args:
+            temp: temperature in K
+            du: heater output step in %
+            duration: step response recording time in s
+            period: time between readings in s
+            tau_c: closed loop time constant in s, see imc_pid
+            timeout: max time to stabilise before the experiment in s
+
+        Returns: P, I, D
+
+        """
+        self.ls.set_setpoint(temp)
+        TempStability(self.ls, self.channel, period=period, setpoint=temp, tol=max(1e-3, 0.01 * temp)) \
+            .wait_stable(timeout)
+        t, resp = self.step_response(du, duration, period)
+        k, tau, theta = fit_fopdt(t, resp, du)
+        pid = imc_pid(k, tau, theta, tau_c)
+        self.results[temp] = dict(t=t, T=resp, K=k, tau=tau, theta=theta, PID=pid)
+        self.table.add(temp, *pid)
+        print('T={} K: K={:.3g} K/%, tau={:.3g} s, theta={:.3g} s -> PID {:.3g},{:.3g},{:.3g}'.format(
+            temp, k, tau, theta, *pid))
+        return pid
+
+    def autotune(self, temps, save=True, **kwargs):
+        """
+        Function to tune PID at a set of temperatures and save the table
+        Args:
+            temps: list of temperatures in K
+            save: write the table to its file after every temperature
+            kwargs: see tune_at
+
+        Returns: PIDTable
+
+        """
+        for temp in temps:
+            self.tune_at(temp, **kwargs)
+            if save:
+                self.table.save()
+        return self.table
@@ -0,0 +1,146 @@
+import time
+import numpy as np
+
+
+class ScanScheduler:
+    """
+    Multi-channel reading for Lake Shore 370 that takes the scanner into account.
+    The bridge measures one channel at a time: after switching, it waits 'pause' and then
+    measures during 'dwell'. RDGK? of any other channel returns the value from its last dwell window.
+
+    Three ways to read:
+        read_now - no switching, channels not under the scanner are flagged stale
+        read_fresh - manual switching in the order that needs the least switches
+        harvest - autoscan, every channel is read when the scanner leaves it
+
+    Example:
+        sch = ScanScheduler(ls)
+        temps, stamps, stale = sch.harvest([1, 2, 5, 6])
+
+     Args:
+         ls:
+             LakeShore object
+     """
+    def __init__(self, ls):
+        self.ls = ls
+        self.inset = dict()
+        self.channel = None
+        self.autoscan = None
+        self.read_config()
+
+    def read_config(self, channels=range(1, 17)):
+        """
+        Function to read scanner state and dwell/pause times of the channels
+        Args:
+            channels: channels to read the configuration of
+
+        Returns: dict {channel: (enabled, dwell, pause)}
+
+        """
+        self.channel, self.autoscan = self.ls.get_scan()
+        for ch in channels:
+            self.inset[ch] = self.ls.get_inset(ch)
+        return self.inset
+
+    def order(self, channels):
+        """
+        Function to order channels the way autoscan goes: starting from the current channel,
+        increasing numbers with wrap around. Each channel is visited once, scanner is never moved back.
+        Args:
+            channels: channel numbers
+
+        Returns: list of channels
+
+        """
+        return sorted(set(channels), key=lambda ch: (ch - self.channel) % 16)
+
+    def read_now(self, channels):
+        """
+        Function to read all channels without switching the scanner
+        Args:
+            channels: channel numbers
+
+        Returns: temperatures (K), unix time stamps of the reads, stale flags (numpy arrays).
+            Stale means the value comes from an earlier dwell window of that channel
+
+        """
+        self.channel, self.autoscan = self.ls.get_scan()
+        temps = np.array([self.ls.get_temp(ch) for ch in channels])
+        stamps = np.full(len(channels), time.time())
+        stale = np.array([ch != self.channel for ch in channels])
+        return temps, stamps, stale
+
+    def read_fresh(self, channels, restore=True):
+        """
+        Function to get a fresh reading of every channel: scanner is switched manually
+        in the order of self.order (the current channel first) and every reading is taken
+        after pause + dwell of the channel.
+
+        Args:
+            channels: channel numbers
+            restore: switch the scanner back to the initial channel and autoscan mode
+
+        Returns: temperatures (K), unix time stamps of the reads, stale flags (all False)
+
+        """
+        self.channel, self.autoscan = self.ls.get_scan()
+        start_channel, start_autoscan = self.channel, self.autoscan
+        result = dict()
+        for ch in self.order(channels):
+            enabled, dwell, pause = self.inset.get(ch) or self.ls.get_inset(ch)
+            if ch == self.channel:
+                self.ls.set_scan(ch, 0)  # keep scanner here, the channel may be in the middle of its dwell
+                time.sleep(dwell)
+            else:
+                self.ls.set_scan(ch, 0)
+                self.channel = ch
+                time.sleep(pause + dwell)
+            result[ch] = (self.ls.get_temp(ch), time.time())
+        if restore:
+            self.ls.set_scan(start_channel, start_autoscan)
+            self.channel, self.autoscan = start_channel, start_autoscan
+
+        temps = np.array([result[ch][0] for ch in channels])
+        stamps = np.array([result[ch][1] for ch in channels])
+        return temps, stamps, np.zeros(len(channels), dtype=bool)
+
+    def harvest(self, channels, timeout=600., poll=0.2):
+        """
+        Function to collect readings with autoscan: scanner state is polled and a channel is read
+        right after the scanner leaves it, so the value is the end of a complete dwell window.
+        Channels that are not enabled are never visited by autoscan and are read stale at the end.
+
+        Args:
+            channels: channel numbers
+            timeout: max time in s
+            poll: time between scanner state queries in s
+
+        Returns: temperatures (K), unix time stamps of the reads, stale flags (numpy arrays)
+
+        """
+        self.channel, self.autoscan = self.ls.get_scan()
+        if not self.autoscan:
+            self.ls.set_scan(self.channel, 1)
+            self.autoscan = 1
+        wanted = set(ch for ch in channels if self.inset.get(ch, (1,))[0])
+        result = dict()
+        prev = self.channel
+        seen = {prev: False}  # False - scanner was already on the channel when we started
+        t_end = time.monotonic() + timeout
+        while wanted - set(result) and time.monotonic() < t_end:
+            time.sleep(poll)
+            ch, _ = self.ls.get_scan()
+            if ch != prev:
+                if prev in wanted and seen.get(prev):
+                    result[prev] = (self.ls.get_temp(prev), time.time(), False)
+                seen[ch] = True
+                prev = ch
+        self.channel = prev
+
+        for ch in channels:  # not enabled, or timeout
+            if ch not in result:
+                result[ch] = (self.ls.get_temp(ch), time.time(), True)
+        temps = np.array([result[ch][0] for ch in channels])
+        stamps = np.array([result[ch][1] for ch in channels])
+        stale = np.array([result[ch][2] for ch in channels])
+        return temps, stamps, stale
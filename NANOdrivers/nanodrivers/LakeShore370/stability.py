@@ -0,0 +1,187 @@
+import time
+from collections import deque
+import numpy as np
+
+
+class TempStability:
+    """
+    Temperature stability detector for Lake Shore 370.
+    Keeps a window of the latest readings of one channel with running sums, so drift
+    (slope of linear regression) and noise (std of residuals) are updated in O(1) per reading.
+    Temperature is stable when both are below the thresholds (and close to the set-point if given).
+
+    Example:
+        ls.set_setpoint(0.1)
+        st = TempStability(ls, channel=6, setpoint=0.1, tol=1e-3)
+        st.wait_stable(timeout=3600)
+
+     Args:
+         ls:
+             LakeShore object
+         channel:
+             channel to watch
+         window:
+             number of readings in the window
+         period:
+             time between readings in wait_stable, s
+         max_drift:
+             max |dT/dt|, K/s
+         max_noise:
+             max std of readings around the linear fit, K
+         setpoint:
+             target temperature in K, None - only drift and noise are checked
+         tol:
+             max |T - setpoint|, K
+         logger:
+             TempLogger, if given readings are taken from it instead of querying the bridge
+     """
+    def __init__(self, ls, channel, window=30, period=2., max_drift=1e-5, max_noise=1e-4,
+                 setpoint=None, tol=1e-3, logger=None):
+        self.ls = ls
+        self.channel = channel
+        self.window = int(window)
+        self.period = period
+        self.max_drift = max_drift
+        self.max_noise = max_noise
+        self.setpoint = setpoint
+        self.tol = tol
+        self.logger = logger
+        self.reset()
+
+    def reset(self):
+        """
+        Function to forget all readings (for example after set-point change)
+        Returns: None
+
+        """
+        self.points = deque()
+        self.t_ref = None
+        self.sums = np.zeros(6)  # n, t, T, t^2, tT, T^2 with t relative to t_ref
+
+    def add(self, t, temp):
+        """
+        Function to add a reading to the window
+        Args:
+            t: time in s
+            temp: temperature in K
+
+        Returns: None
+
+        """
+        if not np.isfinite(temp):
+            return
+        if self.t_ref is None:
+            self.t_ref = t
+        x = t - self.t_ref
+        self.points.append((x, temp))
+        self.sums += (1, x, temp, x * x, x * temp, temp * temp)
+        if len(self.points) > self.window:
+            x, temp = self.points.popleft()
+            self.sums -= (1, x, temp, x * x, x * temp, temp * temp)
+
+    def read(self):
+        """
+        Function to take one reading and add it to the window
+        Returns: temperature in K
+
+        """
+        if self.logger is not None:
+            t, temp = self.logger.last(self.channel)
+            if self.points and t - self.t_ref <= self.points[-1][0]:
+                return temp  # no new poll since the previous reading
+        else:
+            t = time.time()
+            temp = self.ls.get_temp(self.channel)
+        self.add(t, temp)
+        return temp
+
+    def __fit(self):
+        n, st, sT, stt, stT, sTT = self.sums
+        if n < 3:
+            return np.nan, np.nan
+        var_t = stt - st * st / n
+        if var_t <= 0:
+            return np.nan, np.nan
+        slope = (stT - st * sT / n) / var_t
+        res = sTT - sT * sT / n - slope * (stT - st * sT / n)
+        return slope, np.sqrt(max(res, 0.) / (n - 2))
+
+    def drift(self):
+        """
+        Returns: dT/dt in K/s over the window (nan if less than 3 readings)
+
+        """
+        return self.__fit()[0]
+
+    def noise(self):
+        """
+        Returns: std of the readings around linear fit in K
+
+        """
+        return self.__fit()[1]
+
+    def is_stable(self):
+        """
+        Returns: True if window is full and drift, noise (and distance to set-point) are small
+
+        """
+        if len(self.points) < self.window:
+            return False
+        slope, noise = self.__fit()
+        stable = abs(slope) <= self.max_drift and noise <= self.max_noise
+        if self.setpoint is not None:
+            stable = stable and abs(self.points[-1][1] - self.setpoint) <= self.tol
+        return bool(stable)
+
+    def eta(self):
+        """
+        Function to estimate time until temperature is within tol of the set-point
+        (of its final value if set-point is not given).
+        Exponential relaxation T = T_inf + A exp(-t/tau) is fitted with the three-means method:
+        the window is split into three parts of equal length.
+
+        Returns: time in s (0 if stable, nan if readings do not look like relaxation
+            or relaxation goes to a value outside of tolerance)
+
+        """
+        if self.is_stable():
+            return 0.
+        if len(self.points) < 6:
+            return np.nan
+        x, temp = np.array(self.points).T
+        k = len(x) // 3
+        m1, m2, m3 = temp[:k].mean(), temp[k:2 * k].mean(), temp[2 * k:3 * k].mean()
+        dt = x[k:2 * k].mean() - x[:k].mean()
+        if m2 == m1:
+            return np.nan
+        r = (m3 - m2) / (m2 - m1)
+        if not 0 < r < 1:
+            return np.nan
+        tau = -dt / np.log(r)
+        t_inf = m3 + (m3 - m2) * r / (1 - r)
+        margin = self.tol - (0. if self.setpoint is None else abs(t_inf - self.setpoint))
+        if margin <= 0:
+            return np.nan
+        dist = abs(temp[-1] - t_inf)
+        return float(tau * np.log(dist / margin)) if dist > margin else 0.
+
+    def wait_stable(self, timeout=3600., verbose=False):
+        """
+        Function reads temperature every period until it is stable
+        Args:
+            timeout: max waiting time in s
+            verbose: print temperature, drift and ETA at every reading
+
+        Returns: True if stable, False if timeout is reached
+
+        """
+        t_end = time.monotonic() + timeout
+        while time.monotonic() < t_end:
+            temp = self.read()
+            if self.is_stable():
+                return True
+            if verbose:
+                print('T={:.5g} K, drift={:.3g} K/s, noise={:.3g} K, ETA={:.0f} s'.format(
+                    temp, self.drift(), self.noise(), self.eta()))
+            time.sleep(self.period)
+        return False
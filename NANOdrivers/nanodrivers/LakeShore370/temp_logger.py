@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+import numpy as np
+
+
+class TempLogger:
+    """
+    Background temperature logger for Lake Shore 370.
+    Channels are polled in a separate thread, readings are kept in a ring buffer in memory
+    and appended to a text log file chunk by chunk. Sweeps can ask for temperature at any moment
+    (temp_at) without talking to the bridge themselves.
+
+    Example:
+        log = TempLogger(ls, period=5, file_name='fridge_log.txt')
+        log.start()
+        ...
+        gain[i, j] = ...
+        temp[i, j] = log.temp_at(time.time(), channel=6)
+        ...
+        log.stop()
+
+     Args:
+         ls:
+             LakeShore object
+         channels:
+             channels to poll
+         period:
+             time between polls of all channels, s
+         size:
+             number of polls kept in memory
+         file_name:
+             log file, None - no file. Columns: unix time, temperature of every channel in K
+         chunk:
+             number of polls written to the file at once
+     """
+    def __init__(self, ls, channels=(1, 2, 5, 6), period=10., size=100000, file_name=None, chunk=60):
+        self.ls = ls
+        self.channels = list(channels)
+        self.period = period
+        self.size = int(size)
+        self.file_name = file_name
+        self.chunk = int(chunk)
+
+        self.buffer = np.full((self.size, 1 + len(self.channels)), np.nan)  # time, T of each channel
+        self.n_total = 0  # number of polls since start, buffer index is n_total % size
+        self.n_saved = 0
+        self.buffer_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """
+        Function to start polling in background thread
+        Returns: None
+
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        if self.file_name is not None and not os.path.exists(self.file_name):
+            with open(self.file_name, 'w') as f:
+                f.write('# time ' + ' '.join('T{}'.format(ch) for ch in self.channels) + '\n')
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Function to stop polling and write the rest of the data to the file
+        Returns: None
+
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def poll(self):
+        """
+        Function to read all channels once and store them
+        Returns: row [time, temperatures...]
+
+        """
+        row = np.empty(1 + len(self.channels))
+        with self.ls.lock:  # channels are read together, other commands wait
+            row[0] = time.time()
+            for i, ch in enumerate(self.channels):
+                row[1 + i] = self.ls.get_temp(ch)
+        with self.buffer_lock:
+            self.buffer[self.n_total % self.size] = row
+            self.n_total += 1
+        return row
+
+    def flush(self):
+        """
+        Function to append not yet saved polls to the log file
+        Returns: None
+
+        """
+        if self.file_name is None:
+            return
+        with self.buffer_lock:
+            first = max(self.n_saved, self.n_total - self.size)  # older polls are already overwritten
+            idx = np.arange(first, self.n_total) % self.size
+            rows = self.buffer[idx].copy()
+            self.n_saved = self.n_total
+        if len(rows):
+            with open(self.file_name, 'a') as f:
+                np.savetxt(f, rows, fmt='%.3f' + ' %.6g' * len(self.channels))
+
+    def __run(self):
+        t_next = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print('Temperature logger: unable to read LakeShore.\n', e)
+            if self.n_total - self.n_saved >= self.chunk:
+                self.flush()
+            t_next += self.period
+            self.stopped.wait(max(0., t_next - time.monotonic()))
+
+    def get_log(self):
+        """
+        Function to get all polls kept in memory in time order
+        Returns: times (unix time), temperatures (array [poll, channel])
+
+        """
+        with self.buffer_lock:
+            first = max(0, self.n_total - self.size)
+            rows = self.buffer[np.arange(first, self.n_total) % self.size].copy()
+        return rows[:, 0], rows[:, 1:]
+
+    def last(self, channel=None):
+        """
+        Function to get the latest poll
+        Args:
+            channel: channel number, None - all logged channels
+
+        Returns: time (unix time), temperature in K (nan if nothing is logged yet)
+
+        """
+        with self.buffer_lock:
+            row = self.buffer[(self.n_total - 1) % self.size].copy()
+        if channel is None:
+            return row[0], row[1:]
+        return row[0], row[1 + self.channels.index(channel)]
+
+    def temp_at(self, t, channel=None):
+        """
+        Function to get temperature at given moment, linear interpolation between polls.
+        After the latest poll its values are returned while they are fresh: up to 1.5 polling
+        periods later (the next poll may be on its way). Binary search, so the cost does not depend
+        on the log length.
+
+        Args:
+            t: unix time (time.time())
+            channel: channel number, None - all logged channels
+
+        Returns: temperature in K (nan if t is before the log or the latest poll is stale)
+
+        """
+        with self.buffer_lock:
+            first = max(0, self.n_total - self.size)
+            lo, hi = first, self.n_total  # search in poll numbers, buffer row is poll % size
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.buffer[mid % self.size, 0] < t:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo >= self.n_total:
+                r1 = self.buffer[(self.n_total - 1) % self.size]
+                fresh = self.n_total > 0 and t - r1[0] <= 1.5 * self.period
+                temps = r1[1:].copy() if fresh else np.full(len(self.channels), np.nan)
+            elif lo == first and self.buffer[lo % self.size, 0] != t:
+                temps = np.full(len(self.channels), np.nan)
+            else:
+                r1 = self.buffer[lo % self.size]
+                r0 = self.buffer[(lo - 1) % self.size] if lo > first else r1
+                w = 0. if r1[0] == r0[0] else (t - r0[0]) / (r1[0] - r0[0])
+                temps = r0[1:] + w * (r1[1:] - r0[1:])
+
+        if channel is None:
+            return temps
+        return temps[self.channels.index(channel)]
@@ -103,7 +103,7 @@ class BaseVisa:
         resp = ""
         try:
             resp = device.query(cmd_str)
-            num = np.int(resp)
+            num = int(resp)
             return num
         except pyvisa.VisaIOError as e:
             print('Unable to read data from device.\n', e)
@@ -2,6 +2,8 @@ from nanodrivers.visa_drivers import *
 from nanodrivers.non_visa_drivers import *
 from nanodrivers.LakeShore370 import *
 from nanodrivers.scripts_for_matlab import *
+from nanodrivers.utilities import *
+from nanodrivers.sweeps import *
 
 import warnings
 import packaging
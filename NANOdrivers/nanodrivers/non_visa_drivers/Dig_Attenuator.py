@@ -1,73 +1,185 @@
 import numpy as np
 from numpy import *
-import os
+import atexit
 from ctypes import *
 
+from nanodrivers.utilities.settle import Settle, SettleModel
+
+from nanodrivers.non_visa_drivers.vaunix_steps import VaunixSteps
+from nanodrivers.non_visa_drivers.vnx_loader import load_vnx, VnxStub
+
+address_dll = None  # path of the vendor library, None - found by vnx_loader.find_vnx, 'stub' - simulated devices
+
+
+class DigAtt(VaunixSteps):
+    """Class for Vaunix digital attenuator.
+    The library is loaded and all attached attenuators are initialised once, when the object is created.
+    Device limits are cached, so setting attenuation is a single library call.
+    Devices stay open until close() (called automatically at exit or at the end of 'with' block).
+
+    Example:
+        att = DigAtt()
+        att.set_frequency(6)         # GHz
+        for a in range(0, 30):
+            att.set_attenuation(a)   # dB
 
-class DigAtt(object):
-    """Class for Vaunix digital attenuator
          Args:
-             device_num:
-                 GPIB num (float) or full device address (string)
+             dll:
+                 path to VNX_atten64.dll, None - see vnx_loader.find_vnx, 'stub' - simulated devices
     """
+    vnx_prefix = 'fnLDA_'
+    device_kind = 'attenuator'
+    value_limits = ('min_att', 'max_att')
+    value_unit = 0.25  # dB
+    step_function = 'SetAttenuationStep'
+    max_profile = 1000
 
-    def set_att(self, raw_freq, raw_atten):
-        """ Function to set attenuation
-             Args:
-                 raw_freq:
-                    Base frequency in GHz
-                 raw_atten:
-                    Attenuation in dB
-             """
-        address_dll = r"C:\Users\Demag\PycharmProjects\ColdMeasurements\nanodrivers\nanodrivers\non_visa_drivers\dAttenuator_dll\VNX_atten64.dll"
-        this_dir = os.path.abspath("")  # <-- Path to file her
-        vnx = cdll.LoadLibrary(os.path.join(this_dir, address_dll))
-        vnx.fnLDA_SetTestMode(False)
-        DeviceIDArray = c_int * 20
-        Devices = DeviceIDArray()
+    def __init__(self, dll=address_dll):
+        self.settle = Settle({'att': SettleModel(t0=0.001)})  # switching is fast, time is USB latency
+        self.vnx = None
+        self.simulated = False  # True - simulated devices (vnx_loader.VnxStub), nothing is switched
+        self.devices = dict()  # serial number: dict of handle, limits and current values
+        self.open(dll)
+        atexit.register(self.close)
 
-        vnx.fnLDA_GetNumDevices()                   # yes, this ...
-        vnx.fnLDA_GetDevInfo(Devices)
-        vnx.fnLDA_GetSerialNumber(Devices[0])
-        vnx.fnLDA_InitDevice(Devices[0])       # ... lines are needed
+    def __enter__(self):
+        return self
 
-        min_freq = vnx.fnLDA_GetMinWorkingFrequency(Devices[0])  # in "100kHz units????". Yes, it is not MHz
-        max_freq = vnx.fnLDA_GetMaxWorkingFrequency(Devices[0])
-        min_working_freq_in_MHz = int(min_freq / 10)  # Now it is in MHz
-        max_working_freq_in_MHz = int(max_freq / 10)
+    def __exit__(self, *exc):
+        self.close()
 
-        max_att = vnx.fnLDA_GetMaxAttenuation(Devices[0]) / 4  # in decibels
-        min_att = vnx.fnLDA_GetMinAttenuation(Devices[0]) / 4
-        step = vnx.fnLDA_GetAttenuationStep(Devices[0]) / 4
+    def open(self, dll=address_dll):
+        """
+        Function to load the library and initialise all attached attenuators
+        Args:
+            dll: path to VNX_atten64.dll, None - see vnx_loader.find_vnx
 
-        atten = int(raw_atten)
-        freq_GHz = float(raw_freq)
-        freq_MHz = freq_GHz * 1e3
+        Returns: list of serial numbers
 
-        test_freq = freq_MHz > max_working_freq_in_MHz or freq_MHz < min_working_freq_in_MHz  # True if out of range
-        test_att = atten > max_att or atten < min_att  # True if out of range
+        """
+        self.vnx = load_vnx('LDA', dll)
+        self.simulated = isinstance(self.vnx, VnxStub)
+        self.vnx.fnLDA_SetTestMode(False)
+        DeviceIDArray = c_int * 64
+        Devices = DeviceIDArray()
 
-        if test_freq or test_att:
-            print("Failure on frequency", freq_GHz)
-            print("Failure on attenuation:", atten)
-            closedev = vnx.fnLDA_CloseDevice(Devices[0])
+        self.vnx.fnLDA_GetNumDevices()                      # yes, this ...
+        n = self.vnx.fnLDA_GetDevInfo(Devices)
+        for handle in Devices[:n]:
+            serial = self.vnx.fnLDA_GetSerialNumber(handle)
+            result = self.vnx.fnLDA_InitDevice(handle)      # ... lines are needed
+            if result != 0:
+                print('InitDevice returned an error', result, 'for serial number', serial)
+                continue
+            self.devices[serial] = dict(
+                handle=handle,
+                min_freq=self.vnx.fnLDA_GetMinWorkingFrequency(handle) / 10,  # in 100 kHz units, now in MHz
+                max_freq=self.vnx.fnLDA_GetMaxWorkingFrequency(handle) / 10,
+                min_att=self.vnx.fnLDA_GetMinAttenuation(handle) / 4,  # in 0.25 dB units, now in dB
+                max_att=self.vnx.fnLDA_GetMaxAttenuation(handle) / 4,
+                step=self.vnx.fnLDA_GetAttenuationStep(handle) / 4,
+                freq=None,
+                att=None)
+        if not self.devices:
+            print('No Vaunix attenuators found')
+        return list(self.devices)
+
+    def close(self):
+        """
+        Function to close all devices
+        Returns: None
+
+        """
+        for serial, dev in self.devices.items():
+            closedev = self.vnx.fnLDA_CloseDevice(dev['handle'])
             if closedev != 0:
                 print('CloseDevice returned an error', closedev)
-            return 1
+        self.devices = dict()
+
+    def resolution(self, dev):
+        return dev['step']
+
+    def get_limits(self, serial=None):
+        """
+        Function to get cached device limits
+        Args:
+            serial: serial number, None - first device
+
+        Returns: dict with min_freq, max_freq (MHz), min_att, max_att, step (dB)
+
+        """
+        serial, dev = self.find_device(serial)
+        return {k: dev[k] for k in ['min_freq', 'max_freq', 'min_att', 'max_att', 'step']}
 
-        # Set the working frequency in MHz
-        result = vnx.fnLDA_SetWorkingFrequency(Devices[0], int(freq_MHz * 10))  # in "100kHz units????". Yes, it is not MHz
+    def set_frequency(self, freq_GHz, serial=None):
+        """
+        Function to set working frequency
+        Args:
+            freq_GHz: frequency in GHz
+            serial: serial number, None - first device
+
+        Returns: 0 - success, 1 - failure
+
+        """
+        serial, dev = self.find_device(serial)
+        freq_MHz = float(freq_GHz) * 1e3
+        if freq_MHz > dev['max_freq'] or freq_MHz < dev['min_freq']:
+            print("Failure on frequency", freq_GHz)
+            return 1
+        result = self.vnx.fnLDA_SetWorkingFrequency(dev['handle'], int(freq_MHz * 10))  # in 100 kHz units
         if result != 0:
             print('SetFrequency returned error', result)
             return 1
+        dev['freq'] = float(freq_GHz)
+        return 0
 
-        # Sets the Attenuation in decibels
-        result_1 = vnx.fnLDA_SetAttenuation(Devices[0], int(atten) * 4)
-        if result_1 != 0:
-            print('SetAttenuation returned error', result_1)
-            return 1
+    def set_attenuation(self, atten, serial=None):
+        """
+        Function to set attenuation
+        Args:
+            atten: attenuation in dB, rounded to device step
+            serial: serial number, None - first device
 
-        closedev = vnx.fnLDA_CloseDevice(Devices[0])
-        if closedev != 0:
-            print('CloseDevice returned an error', closedev)
+        Returns: 0 - success, 1 - failure
+
+        """
+        serial, dev = self.find_device(serial)
+        if atten > dev['max_att'] or atten < dev['min_att']:
+            print("Failure on attenuation:", atten)
+            return 1
+        atten = round(float(atten) / dev['step']) * dev['step']
+        result = self.vnx.fnLDA_SetAttenuation(dev['handle'], int(round(atten * 4)))  # in 0.25 dB units
+        if result != 0:
+            print('SetAttenuation returned error', result)
+            return 1
+        dev['att'] = atten
+        self.settle.step('att', atten, serial)
         return 0
+
+    def get_attenuation(self, serial=None):
+        """
+        Function to read attenuation from the device
+        Args:
+            serial: serial number, None - first device
+
+        Returns: attenuation in dB
+
+        """
+        serial, dev = self.find_device(serial)
+        return self.vnx.fnLDA_GetAttenuation(dev['handle']) / 4
+
+    def set_att(self, raw_freq, raw_atten, serial=None):
+        """ Function to set attenuation
+             Args:
+                 raw_freq:
+                    Base frequency in GHz
+                 raw_atten:
+                    Attenuation in dB
+                 serial:
+                    serial number, None - first device
+             Returns: 0 - success, 1 - failure
+             """
+        serial, dev = self.find_device(serial)
+        if dev['freq'] != float(raw_freq) and self.set_frequency(raw_freq, serial):
+            return 1
+        return self.set_attenuation(raw_atten, serial)
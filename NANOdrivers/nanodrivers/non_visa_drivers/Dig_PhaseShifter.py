@@ -1,135 +1,209 @@
 import numpy as np
 from numpy import *
-import os
+import atexit
 from ctypes import *
 
+from nanodrivers.non_visa_drivers.vaunix_steps import VaunixSteps
+from nanodrivers.non_visa_drivers.vnx_loader import load_vnx, VnxStub
 
+address_dll = None  # path of the vendor library, None - found by vnx_loader.find_vnx, 'stub' - simulated devices
+
+
+class DigPS(VaunixSteps):
+    """Class for Vaunix digital phase shifter (LPS-402, LPS-802, LPS-123).
+    The library is loaded and all attached phase shifters are initialised once, when the object is created.
+    Frequency and phase limits are cached, so setting the angle is a single library call.
+    Devices stay open until close() (called automatically at exit or at the end of 'with' block).
+
+    Example:
+        ps = DigPS()
+        ps.set_frequency(6e9)        # Hz
+        for a in range(0, 360, 5):
+            ps.set_angle(a)          # degrees
 
-class DigPS():
-    """Class for Vaunix digital phase shifter
          Args:
-             device_num:
-                 GPIB num (float) or full device address (string)
+             dll:
+                 path to VNX_dps64.dll, None - see vnx_loader.find_vnx, 'stub' - simulated devices
          """
-    def __int__(self):
-        self.address_dll =  r"C:\Users\Demag\PycharmProjects\ColdMeasurements\nanodrivers\nanodrivers\non_visa_drivers\dAtt_dll\VNX_dps64.dll"
-    def phase_shifter(self, freq1, angle1):
-        this_dir = os.path.abspath("")  # <-- Path to file here
-        # ATTENTION!
-        # Copy a file containing VNX_dps64.dll to your computer from the USB stick!
-        # Add the path to the file containing VNX_dps64.dll to line 7!
-        vnx = cdll.LoadLibrary(os.path.join(this_dir, self.address_dll))
-        vnx.fnLPS_SetTestMode(False)  # Use actual devices
-        DeviceIDArray = c_int * 20
-        Devices = DeviceIDArray()  # This array will hold the list of device handles
-        # returned by the DLL
+    vnx_prefix = 'fnLPS_'
+    device_kind = 'phase shifter'
+    value_limits = ('min_angle', 'max_angle')
+    value_unit = 1.  # degree
+    step_function = 'SetPhaseAngleStep'
+    max_profile = 50
+
+    def __init__(self, dll=address_dll):
+        self.address_dll = dll
+        self.vnx = None
+        self.simulated = False  # True - simulated devices (vnx_loader.VnxStub), nothing is switched
+        self.devices = dict()  # serial number: dict of handle, limits and current values
+        self.open(dll)
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self, dll=address_dll):
+        """
+        Function to load the library and initialise all attached phase shifters
+        Args:
+            dll: path to VNX_dps64.dll, None - see vnx_loader.find_vnx
+
+        Returns: list of serial numbers
+
+        """
+        self.vnx = load_vnx('LPS', dll)
+        self.simulated = isinstance(self.vnx, VnxStub)
+        self.vnx.fnLPS_SetTestMode(False)  # Use actual devices
+        DeviceIDArray = c_int * 64
+        Devices = DeviceIDArray()  # This array will hold the list of device handles returned by the DLL
 
         # GetNumDevices will determine how many LPS devices are available
-        numDevices = vnx.fnLPS_GetNumDevices()
-        # print(str(numDevices), ' device(s) found')
-
-        # GetDevInfo generates a list, stored in the devices array, of
-        # every availible LPS device attached to the system
-        # GetDevInfo will return the number of device handles in the array
-        dev_info = vnx.fnLPS_GetDevInfo(Devices)
-        # print('GetDevInfo returned', str(dev_info))
-
-        # GetSerialNumber will return the devices serial number
-        ser_num = vnx.fnLPS_GetSerialNumber(Devices[0])
-        # print('Serial number:', str(ser_num))
-
-        # InitDevice wil prepare the device for operation
-        init_dev = vnx.fnLPS_InitDevice(Devices[0])
-        # print('InitDevice returned', str(init_dev))
-
-        # print()
-
-        # These functions will get the working frequency range of the LPS device
-        # and those frequencies will be turned into MHz
-        min_freq = vnx.fnLPS_GetMinWorkingFrequency(Devices[0])
-        max_freq = vnx.fnLPS_GetMaxWorkingFrequency(Devices[0])
-        min_working_freq_in_MHz = int(min_freq / 10)
-        max_working_freq_in_MHz = int(max_freq / 10)
-        # print('Minimum working frequency for LPS device in MHz:', min_working_freq_in_MHz)
-        # print('Maximum working frequency for LPS device in MHz:', max_working_freq_in_MHz)
-
-        # These functions get the minimum and maximum phase shift for the LPS device
-        max_angle = vnx.fnLPS_GetMaxPhaseShift(Devices[0])
-        min_angle = vnx.fnLPS_GetMinPhaseShift(Devices[0])
-        # This function gives the smallest increment by which the phase shift can be changed
-        min_step = vnx.fnLPS_GetMinPhaseStep(Devices[0])
-        # print('Minimum phase shift that the Lab Brick is capable of, in degrees:', min_angle)
-        # print('Maximum phase shift that the Lab Brick is capable of, in degrees:', max_angle)
-        # print('Smallest phase shift increment that the Lab Brick is capable of, in degrees:', min_step)
-
-        # This is where the user can enter in the working frequency and phase shift for the LPS device
-        # print('Enter desired output frequency in GHz and desired phase shift separated by space:', end='')
-        angle = float(angle1)
-        freq = float(freq1)
-        freq = (freq / 1e9)
-        freq = freq * 1000
-
-        # This prevents the user from entering an working frequency outside of
-        # the devices range
-        if freq > max_working_freq_in_MHz or freq < min_working_freq_in_MHz:
-            # print('Enter a value between', min_working_freq_in_MHz / 1000, 'and', max_working_freq_in_MHz / 1000, ': ', end='')
-            # freq = float(input())
-            freq = freq / 1000
-            print("Failure on frequency", freq, "GHz")
-            closedev = vnx.fnLPS_CloseDevice(Devices[0])
+        self.vnx.fnLPS_GetNumDevices()
+        # GetDevInfo generates a list of every available LPS device and returns the number of handles
+        n = self.vnx.fnLPS_GetDevInfo(Devices)
+        for handle in Devices[:n]:
+            serial = self.vnx.fnLPS_GetSerialNumber(handle)
+            result = self.vnx.fnLPS_InitDevice(handle)
+            if result != 0:
+                print('InitDevice returned an error', result, 'for serial number', serial)
+                continue
+            self.devices[serial] = dict(
+                handle=handle,
+                min_freq=self.vnx.fnLPS_GetMinWorkingFrequency(handle) / 10,  # in 100 kHz units, now in MHz
+                max_freq=self.vnx.fnLPS_GetMaxWorkingFrequency(handle) / 10,
+                min_angle=self.vnx.fnLPS_GetMinPhaseShift(handle),  # degrees
+                max_angle=self.vnx.fnLPS_GetMaxPhaseShift(handle),
+                min_step=self.vnx.fnLPS_GetMinPhaseStep(handle),  # smallest increment of the angle
+                freq=None,
+                angle=None)
+        if not self.devices:
+            print('No Vaunix phase shifters found')
+        return list(self.devices)
+
+    def close(self):
+        """
+        Function to close all devices. You should always close the device when finished with it
+        Returns: None
+
+        """
+        for serial, dev in self.devices.items():
+            closedev = self.vnx.fnLPS_CloseDevice(dev['handle'])
             if closedev != 0:
                 print('CloseDevice returned an error', closedev)
-            f = 1
-            return f
-        else:
-            Hz = freq * 1000000
-            frequency = Hz / 100000
-
-            # This sets the working frequency for the LPS device
-            result = vnx.fnLPS_SetWorkingFrequency(Devices[0], int(frequency))
-            if result != 0:
-                print('SetFrequency returned error', result)
-
-            # print()
-
-            # Tis loop prevents the user from entering an angle outside of the device's range
-            if angle > max_angle or angle < min_angle:
-                # print('Enter a value between', min_angle, 'and', max_angle, ': ', end='')
-                # angle = float(input())
-
-                print("Failure to shift", angle, "degrees")
-                closedev = vnx.fnLPS_CloseDevice(Devices[0])
-                if closedev != 0:
-                    print('CloseDevice returned an error', closedev)
-                f = 1
-                return f
-            else:
-
-                # This sets the phase shift for the LPS device
-                result_1 = vnx.fnLPS_SetPhaseAngle(Devices[0], int(angle))
-                if result_1 != 0:
-                    print('SetPhaseAngle returned error', result_1)
-
-                # print()
-
-                # These two functions get the working frequency and the phase shift of the LPS device
-                result = vnx.fnLPS_GetWorkingFrequency(Devices[0])
-                if result < 0:
-                    print('GetWorkingFrequency returned an error', result)
-                result_1 = vnx.fnLPS_GetPhaseAngle(Devices[0])
-                if result_1 < 0:
-                    print('GetPhaseAngle returned an error', result_1)
-
-                freq = ((result * 100000) / 1000000) / 1000
-                angle = result_1
-
-                # print('Working frequency in GHz for the LPS device:', freq)
-                # print('Phase shift for LPS device:', angle)
-
-                # This function closes the device
-                # You should always close the device when finished with it
-                closedev = vnx.fnLPS_CloseDevice(Devices[0])
-                if closedev != 0:
-                    print('CloseDevice returned an error', closedev)
-                f = 0
-                return f
\ No newline at end of file
+        self.devices = dict()
+
+    def resolution(self, dev):
+        return dev['min_step'] if dev['min_step'] > 0 else 1
+
+    def get_limits(self, serial=None):
+        """
+        Function to get cached device limits
+        Args:
+            serial: serial number, None - first device
+
+        Returns: dict with min_freq, max_freq (MHz), min_angle, max_angle, min_step (degrees)
+
+        """
+        serial, dev = self.find_device(serial)
+        return {k: dev[k] for k in ['min_freq', 'max_freq', 'min_angle', 'max_angle', 'min_step']}
+
+    def set_frequency(self, freq, serial=None):
+        """
+        Function to set working frequency
+        Args:
+            freq: frequency in Hz
+            serial: serial number, None - first device
+
+        Returns: 0 - success, 1 - failure
+
+        """
+        serial, dev = self.find_device(serial)
+        freq_MHz = float(freq) / 1e6
+        if freq_MHz > dev['max_freq'] or freq_MHz < dev['min_freq']:
+            print("Failure on frequency", freq_MHz / 1000, "GHz")
+            return 1
+        result = self.vnx.fnLPS_SetWorkingFrequency(dev['handle'], int(freq_MHz * 10))  # in 100 kHz units
+        if result != 0:
+            print('SetFrequency returned error', result)
+            return 1
+        dev['freq'] = float(freq)
+        return 0
+
+    def get_frequency(self, serial=None):
+        """
+        Function to read working frequency from the device
+        Args:
+            serial: serial number, None - first device
+
+        Returns: frequency in Hz
+
+        """
+        serial, dev = self.find_device(serial)
+        result = self.vnx.fnLPS_GetWorkingFrequency(dev['handle'])
+        if result < 0:
+            print('GetWorkingFrequency returned an error', result)
+        return result * 1e5
+
+    def set_angle(self, angle, serial=None, verify=False):
+        """
+        Function to set phase shift
+        Args:
+            angle: phase shift in degrees, rounded to the device step
+            serial: serial number, None - first device
+            verify: read the angle back and compare
+
+        Returns: 0 - success, 1 - failure
+
+        """
+        serial, dev = self.find_device(serial)
+        if angle > dev['max_angle'] or angle < dev['min_angle']:
+            print("Failure to shift", angle, "degrees")
+            return 1
+        step = dev['min_step'] if dev['min_step'] > 0 else 1
+        angle = int(round(float(angle) / step) * step)
+        result = self.vnx.fnLPS_SetPhaseAngle(dev['handle'], angle)
+        if result != 0:
+            print('SetPhaseAngle returned error', result)
+            return 1
+        dev['angle'] = angle
+        if verify:
+            read_angle = self.get_angle(serial)
+            if read_angle != angle:
+                print('Phase angle read back', read_angle, 'instead of', angle)
+                return 1
+        return 0
+
+    def get_angle(self, serial=None):
+        """
+        Function to read phase shift from the device
+        Args:
+            serial: serial number, None - first device
+
+        Returns: phase shift in degrees
+
+        """
+        serial, dev = self.find_device(serial)
+        result = self.vnx.fnLPS_GetPhaseAngle(dev['handle'])
+        if result < 0:
+            print('GetPhaseAngle returned an error', result)
+        return result
+
+    def phase_shifter(self, freq1, angle1, serial=None):
+        """ Function to set frequency and phase shift
+             Args:
+                 freq1:
+                    frequency in Hz
+                 angle1:
+                    phase shift in degrees
+                 serial:
+                    serial number, None - first device
+             Returns: 0 - success, 1 - failure
+             """
+        serial, dev = self.find_device(serial)
+        if dev['freq'] != float(freq1) and self.set_frequency(freq1, serial):
+            return 1
+        return self.set_angle(angle1, serial, verify=True)
@@ -1,20 +1,264 @@
 from numpy import *
-import nidaqmx
+import numpy as np
+import time
+import threading
+try:
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+except ImportError:  # only simulated task is available
+    nidaqmx = None
 
 global_dac_address = 'Dev1'  # yes, instead of normal address it should be dev1
 
 
+class SimTask:
+    """
+    Simulated nidaqmx.Task for analog input: the same calls as used by DAQ, data is generated
+    in chunks by a thread at the sample rate (sine of 'freq' Hz with different phase on every channel
+    plus noise). With realtime=False chunks are generated as fast as possible,
+    so the throughput of the buffering and processing can be measured.
+
+     Args:
+         freq:
+             frequency of the simulated signal, Hz
+         noise:
+             rms noise, V
+         realtime:
+             generate data at the sample rate
+     """
+    def __init__(self, freq=17., noise=1e-3, realtime=True):
+        self.freq = freq
+        self.noise = noise
+        self.realtime = realtime
+        self.ai_channels = self
+        self.in_stream = self
+        self.channels = []
+        self.rate = 1000.
+        self.n = 0
+        self.callback = None
+        self.samples = 0  # samples per channel generated since start
+        self.running = threading.Event()
+        self.thread = None
+
+    def add_ai_voltage_chan(self, physical_channel, min_val=-10., max_val=10.):
+        self.channels.append((physical_channel, min_val, max_val))
+
+    def cfg_samp_clk_timing(self, rate, sample_mode=None, samps_per_chan=1000):
+        self.rate = float(rate)
+
+    def register_every_n_samples_acquired_into_buffer_event(self, n, callback):
+        self.n = n
+        self.callback = callback
+
+    def start(self):
+        self.samples = 0
+        self.running.set()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def close(self):
+        self.stop()
+
+    def __run(self):
+        t0 = time.monotonic()
+        k = 0
+        while self.running.is_set():
+            k += 1
+            if self.realtime:
+                delay = t0 + k * self.n / self.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.callback(0, 1, self.n, None)
+
+    def read_many_sample(self, data, number_of_samples_per_channel=None, timeout=10.):
+        n = data.shape[1]
+        t = (self.samples + np.arange(n)) / self.rate
+        phases = np.arange(len(self.channels))[:, None] * np.pi / 4
+        np.sin(2 * np.pi * self.freq * t + phases, out=data)
+        data += self.noise * np.random.standard_normal(data.shape)
+        self.samples += n
+        return n
+
+
 class DAQ:
     """Class for NI Digital Analog Converter, USB-6341 operation. Based on NI-DAQmx
+
+    Continuous hardware timed analog input: the driver calls back every 'chunk' samples,
+    the chunk is read straight into a slot of a preallocated ring buffer (no Python work per sample).
+    Consumers iterate over chunks, optionally the stream is appended to a binary file.
+
+    Example:
+        daq = DAQ()
+        daq.add_ai_channel(0)
+        daq.add_ai_channel(1)
+        daq.start_stream(rate=1e5, chunk=10000, file_name='trace.bin')
+        for t, data in daq.chunks(n=100):   # data - (channels, chunk) array
+            print(t, data.mean(axis=1))
+        daq.stop_stream()
+        data = load_stream('trace.bin', 2)
+
      Args:
          device_num:
              Should be dev1
+         simulate:
+             use SimTask instead of the device (also used if nidaqmx is not installed)
      """
-    def __init__(self, device_num=global_dac_address):
+    def __init__(self, device_num=global_dac_address, simulate=False):
         self.dev = device_num
-        self.task = nidaqmx.Task()
+        self.simulate = simulate or nidaqmx is None
+        self.task = SimTask() if self.simulate else nidaqmx.Task()
+        self.channels = []
+        self.rate = None
+        self.chunk = None
+        self.buffer = None  # (n_chunks, channels, chunk)
+        self.stamps = None  # time.time() of the end of every chunk in the buffer
+        self.acquired = 0  # number of chunks acquired since start
+        self.lost = 0  # number of chunks overwritten before a consumer took them
+        self.new_chunk = threading.Condition()
+        self.running = False
+        self.writer = None
+
+    def add_ai_channel(self, channel_num=0, v_min=-10., v_max=10.):
+        """
+        Function to add analog input voltage channel
+        Args:
+            channel_num: ai channel number
+            v_min: minimum expected voltage, V
+            v_max: maximum expected voltage, V
+
+        Returns: list of channel numbers
+
+        """
+        self.task.ai_channels.add_ai_voltage_chan("{}/ai{}".format(self.dev, str(channel_num)),
+                                                  min_val=v_min, max_val=v_max)
+        self.channels.append(channel_num)
+        return self.channels
+
+    def start_stream(self, rate, chunk=1000, n_chunks=100, file_name=None):
+        """
+        Function to start continuous acquisition
+        Args:
+            rate: sample rate per channel, Hz
+            chunk: samples per channel in one callback. Keep chunk/rate around 10-100 ms
+            n_chunks: number of chunks in the ring buffer
+            file_name: binary file to append the stream to (float64, samples x channels), None - no file
+
+        Returns: None
+
+        """
+        self.rate, self.chunk = float(rate), int(chunk)
+        self.buffer = np.zeros((n_chunks, len(self.channels), self.chunk))
+        self.stamps = np.zeros(n_chunks)
+        self.acquired = 0
+        self.lost = 0
+        if self.simulate:
+            self.task.cfg_samp_clk_timing(self.rate, samps_per_chan=self.chunk * n_chunks)
+            self.reader = self.task
+        else:
+            self.task.timing.cfg_samp_clk_timing(self.rate, sample_mode=AcquisitionType.CONTINUOUS,
+                                                 samps_per_chan=self.chunk * n_chunks)  # driver buffer
+            self.reader = AnalogMultiChannelReader(self.task.in_stream)
+        self.task.register_every_n_samples_acquired_into_buffer_event(self.chunk, self.__callback)
+        self.running = True
+        if file_name is not None:
+            self.writer = threading.Thread(target=self.__write, args=(file_name,), daemon=True)
+            self.writer.start()
+        self.task.start()
+
+    def stop_stream(self):
+        """
+        Function to stop acquisition, file is closed after the last chunk is written
+        Returns: None
+
+        """
+        self.task.stop()
+        self.task.register_every_n_samples_acquired_into_buffer_event(self.chunk, None)  # start_stream registers again
+        with self.new_chunk:
+            self.running = False
+            self.new_chunk.notify_all()
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+
+    def close(self):
+        if self.running:
+            self.stop_stream()
+        self.task.close()
+
+    def __callback(self, task_handle, event_type, n_samples, callback_data):
+        k = self.acquired % len(self.buffer)
+        self.reader.read_many_sample(self.buffer[k], number_of_samples_per_channel=self.chunk, timeout=0)
+        self.stamps[k] = time.time()
+        with self.new_chunk:
+            self.acquired += 1
+            self.new_chunk.notify_all()
+        return 0
+
+    def chunks(self, n=None, start=None, timeout=10.):
+        """
+        Generator of acquired chunks. Every consumer has its own position,
+        if it falls behind by more than the ring buffer, the oldest chunks are skipped (counted in self.lost)
+        Args:
+            n: number of chunks, None - until stop_stream
+            start: index of the first chunk, None - the next acquired one
+            timeout: max time to wait for a chunk in s, None - until stop_stream
+
+        Returns: yields time.time() of the chunk end and (channels, chunk) array copy
+
+        """
+        pos = self.acquired if start is None else start
+        stop = None if n is None else pos + n
+        size = len(self.buffer)
+        while stop is None or pos < stop:
+            with self.new_chunk:
+                if not self.new_chunk.wait_for(lambda: self.acquired > pos or not self.running, timeout):
+                    print('No data from DAQ for', timeout, 's')
+                    return
+                if self.acquired <= pos:  # stopped
+                    return
+            if self.acquired - pos > size - 1:  # slot may be written right now
+                skip = self.acquired - pos - (size - 1)
+                self.lost += skip
+                pos += skip
+            k = pos % size
+            data, t = self.buffer[k].copy(), self.stamps[k]
+            if self.acquired - pos > size - 1:  # overwritten while copying
+                self.lost += 1
+            else:
+                yield t, data
+            pos += 1
+
+    def read(self, n):
+        """
+        Function to get next n chunks as one array
+        Args:
+            n: number of chunks
+
+        Returns: (channels, n * chunk) array
+
+        """
+        return np.concatenate([data for t, data in self.chunks(n)], axis=1)
+
+    def __write(self, file_name):
+        with open(file_name, 'ab') as f:
+            for t, data in self.chunks(start=0, timeout=None):  # a chunk may take longer than any fixed timeout
+                data.T.tofile(f)
+
+
+def load_stream(file_name, n_channels):
+    """
+    Function to read a stream file written by DAQ.start_stream
+    Args:
+        file_name: file name
+        n_channels: number of channels
 
-    def add_ai_channel(self, channel_num=0):
-        task = task.ai_channels.add_ai_voltage_chan("{}/ai{}".format(self.dev, str(channel_num)))
-        return task
+    Returns: (channels, samples) array
 
+    """
+    return np.fromfile(file_name).reshape(-1, n_channels).T
@@ -0,0 +1,316 @@
+import time
+import numpy as np
+
+
+class StepSchedule:
+    """
+    Host-side model of values stepped by a Vaunix device itself (ramp or profile).
+    Device goes through 'values', staying 'dwell' seconds on each. With repeat it waits 'idle'
+    seconds at the end and starts again. Time is time.time(), so it can be compared with
+    time stamps of other measurements (for example VNA traces).
+
+    Example:
+        sched = att.ramp(0, 30, 1, dwell=0.5)
+        ...
+        t = time.time()
+        mag, pha = vna.get_data()
+        attenuation = sched.value_at(t)
+
+     Args:
+         values:
+             values in the order they are played
+         dwell:
+             time on each value, s
+         t_start:
+             time.time() when the first value was set
+         repeat:
+             True if the device starts again after the last value
+         idle:
+             pause after the last value before repeating, s
+     """
+    def __init__(self, values, dwell, t_start=None, repeat=False, idle=0.):
+        self.values = np.asarray(values, dtype=float)
+        self.dwell = float(dwell)
+        self.t_start = time.time() if t_start is None else float(t_start)
+        self.repeat = repeat
+        self.idle = float(idle)
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def period(self):
+        return len(self.values) * self.dwell + self.idle
+
+    @property
+    def t_end(self):
+        """
+        Returns: time.time() when the last value is finished (inf for repeat)
+
+        """
+        return np.inf if self.repeat else self.t_start + len(self.values) * self.dwell
+
+    def step_times(self):
+        """
+        Returns: time.time() of every step in the first pass
+
+        """
+        return self.t_start + np.arange(len(self.values)) * self.dwell
+
+    def index_at(self, t):
+        """
+        Function to get index of the value played at time t
+        Args:
+            t: time.time() value or array of them
+
+        Returns: index (or array), -1 before start. Last index after the end, or during idle time
+
+        """
+        dt = np.asarray(t, dtype=float) - self.t_start
+        if self.repeat:
+            dt = np.where(dt < 0, dt, np.mod(dt, self.period))
+        k = np.floor(dt / self.dwell).astype(int)
+        k = np.where(dt < 0, -1, np.minimum(k, len(self.values) - 1))
+        return k if k.ndim else int(k)
+
+    def value_at(self, t):
+        """
+        Function to get value played at time t
+        Args:
+            t: time.time() value or array of them
+
+        Returns: value (or array), nan before start
+
+        """
+        k = np.asarray(self.index_at(t))
+        v = np.where(k < 0, np.nan, self.values[np.clip(k, 0, None)])
+        return v if v.ndim else float(v)
+
+    def resync(self, index, t=None):
+        """
+        Function to correct the start time using an index reported by the device
+        Args:
+            index: index played at time t
+            t: time.time(), default now
+
+        Returns: None
+
+        """
+        t = time.time() if t is None else t
+        self.t_start = t - (index + 0.5) * self.dwell  # middle of the step, the best guess without more info
+
+    def wait_done(self):
+        """
+        Function blocks until the last value is finished (does nothing for repeat)
+        Returns: None
+
+        """
+        if not self.repeat:
+            time.sleep(max(0., self.t_end - time.time()))
+
+
+# GetDeviceStatus bits
+sweep_active = 0x00000004
+profile_active = 0x00000040
+
+
+class VaunixSteps:
+    """
+    Ramps and profiles played by Vaunix devices themselves, shared by DigAtt and DigPS.
+    A driver using it has 'self.vnx' (library), 'self.devices' ({serial: dict with 'handle' and limits})
+    and sets the class attributes below.
+
+     Class attributes:
+         vnx_prefix:
+             prefix of the library functions, 'fnLDA_' or 'fnLPS_'
+         device_kind:
+             name of the device in messages
+         value_limits:
+             keys of the lower and upper limit of the value in the device dict
+         value_unit:
+             value of one library unit (0.25 dB, 1 degree)
+         step_function:
+             library function setting the ramp step
+         max_profile:
+             max number of profile elements
+     """
+    vnx_prefix = ''
+    device_kind = 'device'
+    value_limits = ('min', 'max')
+    value_unit = 1.
+    step_function = ''
+    max_profile = 50
+
+    def resolution(self, dev):
+        """
+        Returns: smallest change of the value of the device
+
+        """
+        return self.value_unit
+
+    def find_device(self, serial=None):
+        """
+        Function to find an opened device
+        Args:
+            serial: serial number, None - first device
+
+        Returns: serial number, device dict
+
+        """
+        if not self.devices:
+            raise ValueError('No Vaunix {} is opened'.format(self.device_kind))
+        if serial is None:
+            serial = next(iter(self.devices))
+        if serial not in self.devices:
+            raise ValueError('Vaunix {} with serial number {} is not opened, available: {}'.format(
+                self.device_kind, serial, list(self.devices)))
+        return serial, self.devices[serial]
+
+    def __fn(self, name):
+        return getattr(self.vnx, self.vnx_prefix + name)
+
+    def __round(self, dev, values):
+        res = self.resolution(dev)
+        return np.round(np.asarray(values, dtype=float) / res) * res
+
+    def __units(self, value):
+        return int(round(float(value) / self.value_unit))
+
+    def __in_limits(self, dev, lo, hi):
+        return dev[self.value_limits[0]] <= lo and hi <= dev[self.value_limits[1]]
+
+    def ramp(self, start, stop, step, dwell, serial=None, repeat=False, idle=0., go=True):
+        """
+        Function to upload a ramp played by the device itself (no USB traffic per step)
+        Args:
+            start: first value, rounded to the device resolution
+            stop: last value, rounded to the device resolution
+            step: step, must be a multiple of the device resolution
+            dwell: time on every step in s (ms resolution)
+            serial: serial number, None - first device
+            repeat: start the ramp again after idle time
+            idle: pause between repeated ramps in s
+            go: start right away, otherwise call go() later
+
+        Returns: StepSchedule - model of the value at any time (None on failure)
+
+        """
+        serial, dev = self.find_device(serial)
+        res = self.resolution(dev)
+        n = float(step) / res
+        if n < 1 - 1e-9 or abs(n - round(n)) > 1e-6:
+            print('Failure on ramp step', step, '- must be a positive multiple of', res)
+            return None
+        step = round(n) * res
+        start, stop = self.__round(dev, [start, stop])
+        lo, hi = sorted([start, stop])
+        if not self.__in_limits(dev, lo, hi):
+            print("Failure on ramp", start, stop)
+            return None
+        h = dev['handle']
+        results = [self.__fn('SetRampStart')(h, self.__units(lo)),
+                   self.__fn('SetRampEnd')(h, self.__units(hi)),
+                   self.__fn(self.step_function)(h, self.__units(step)),
+                   self.__fn('SetDwellTime')(h, int(round(dwell * 1000))),
+                   self.__fn('SetIdleTime')(h, int(round(idle * 1000))),
+                   self.__fn('SetRampDirection')(h, True if stop >= start else False),
+                   self.__fn('SetRampMode')(h, True if repeat else False),
+                   self.__fn('SetRampBidirectional')(h, False)]
+        if np.any(results):
+            print('Ramp setup returned errors', results)
+            return None
+        values = np.arange(lo, hi + step / 2, step)
+        if stop < start:
+            values = values[::-1]
+        dev['schedule'] = StepSchedule(values, dwell, repeat=repeat, idle=idle)
+        dev['steps'] = 'ramp'
+        if go:
+            self.go(serial)
+        return dev['schedule']
+
+    def profile(self, values, dwell, serial=None, repeat=False, idle=0., go=True):
+        """
+        Function to upload an arbitrary list of values played by the device itself
+        Args:
+            values: values in the order to play (up to max_profile), rounded to the device resolution
+            dwell: time on every value in s (ms resolution)
+            serial: serial number, None - first device
+            repeat: start the profile again after idle time
+            idle: pause between repeated profiles in s
+            go: start right away, otherwise call go() later
+
+        Returns: StepSchedule - model of the value at any time (None on failure)
+
+        """
+        serial, dev = self.find_device(serial)
+        values = self.__round(dev, values)
+        if not 0 < len(values) <= self.max_profile:
+            print('Failure on profile: {} values, the device takes 1 to {}'.format(len(values), self.max_profile))
+            return None
+        if not self.__in_limits(dev, np.min(values), np.max(values)):
+            print("Failure on profile values")
+            return None
+        h = dev['handle']
+        results = [self.__fn('SetProfileElement')(h, i, self.__units(v)) for i, v in enumerate(values)]
+        results += [self.__fn('SetProfileCount')(h, len(values)),
+                    self.__fn('SetProfileDwellTime')(h, int(round(dwell * 1000))),
+                    self.__fn('SetProfileIdleTime')(h, int(round(idle * 1000)))]
+        if np.any(results):
+            print('Profile setup returned errors', results)
+            return None
+        dev['schedule'] = StepSchedule(values, dwell, repeat=repeat, idle=idle)
+        dev['steps'] = 'profile'
+        if go:
+            self.go(serial)
+        return dev['schedule']
+
+    def go(self, serial=None):
+        """
+        Function to start uploaded ramp or profile
+        Args:
+            serial: serial number, None - first device
+
+        Returns: StepSchedule with start time set to now
+
+        """
+        serial, dev = self.find_device(serial)
+        schedule = dev['schedule']
+        if dev['steps'] == 'ramp':
+            result = self.__fn('StartRamp')(dev['handle'], True)
+        else:
+            result = self.__fn('StartProfile')(dev['handle'], 2 if schedule.repeat else 1)
+        schedule.t_start = time.time()
+        if result != 0:
+            print('Start returned error', result)
+        return schedule
+
+    def stop(self, serial=None):
+        """
+        Function to stop ramp or profile
+        Args:
+            serial: serial number, None - first device
+
+        Returns: None
+
+        """
+        serial, dev = self.find_device(serial)
+        if dev.get('steps') == 'ramp':
+            self.__fn('StartRamp')(dev['handle'], False)
+        elif dev.get('steps') == 'profile':
+            self.__fn('StartProfile')(dev['handle'], 0)
+
+    def is_stepping(self, serial=None):
+        """
+        Function to poll the device: is ramp or profile still playing.
+        For profiles the schedule is corrected with the index reported by the device.
+        Args:
+            serial: serial number, None - first device
+
+        Returns: True if playing
+
+        """
+        serial, dev = self.find_device(serial)
+        status = self.__fn('GetDeviceStatus')(dev['handle'])
+        if dev.get('steps') == 'profile' and status & profile_active:
+            dev['schedule'].resync(self.__fn('GetProfileIndex')(dev['handle']))
+        return (status & (sweep_active | profile_active)) != 0
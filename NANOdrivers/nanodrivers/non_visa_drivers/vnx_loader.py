@@ -0,0 +1,251 @@
+import os
+import sys
+import time
+from ctypes import cdll
+
+from nanodrivers.non_visa_drivers.vaunix_steps import StepSchedule
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Vendor library per device family: folder in the package, file names to try on this platform
+library_files = {
+    'LDA': ('dAttenuator_dll', ['VNX_atten64.dll'] if sys.platform == 'win32' else ['libVNX_LDA.so', 'libLDAhid.so']),
+    'LPS': ('dPhaseShifter_dll', ['VNX_dps64.dll'] if sys.platform == 'win32' else ['libVNX_LPS.so', 'libLPShid.so'])}
+
+# Path of the library set by user, overrides environment and package data. 'stub' - simulated devices
+library_paths = {'LDA': None, 'LPS': None}
+
+# Environment variables with the path of the library (or 'stub')
+library_env = {'LDA': 'NANODRIVERS_VNX_LDA', 'LPS': 'NANODRIVERS_VNX_LPS'}
+
+
+def find_vnx(kind):
+    """
+    Function to find the vendor library: library_paths, then environment variable, then package folder
+    Args:
+        kind: 'LDA' - attenuators, 'LPS' - phase shifters
+
+    Returns: path, 'stub' or None if nothing is found
+
+    """
+    path = library_paths[kind] or os.environ.get(library_env[kind])
+    if path:
+        return path
+    folder, names = library_files[kind]
+    for name in names:
+        path = os.path.join(this_dir, folder, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_vnx(kind, dll=None):
+    """
+    Function to load Vaunix library. Simulated devices (VnxStub) are used when asked for ('stub' as path,
+    in library_paths or in the environment variable) and, with a message, when no library is found
+    on Linux or macOS, where the vendor library is usually not installed. On Windows a missing library
+    is an error: a measurement must not run with devices that are not switched.
+    Args:
+        kind: 'LDA' - attenuators, 'LPS' - phase shifters
+        dll: path of the library, 'stub' or None - see find_vnx
+
+    Returns: library object with fnLDA_* / fnLPS_* functions
+
+    """
+    path = dll or find_vnx(kind)
+    if path == 'stub':
+        return VnxStub(kind)
+    if path is None:
+        if sys.platform == 'win32':
+            raise OSError("Vaunix {} library not found, set vnx_loader.library_paths['{}'] or {} "
+                          "(path, or 'stub' for simulated devices)".format(kind, kind, library_env[kind]))
+        print('Vaunix {} library not found, using simulated devices'.format(kind))
+        return VnxStub(kind)
+    try:
+        return cdll.LoadLibrary(path)
+    except (OSError, TypeError) as err:
+        raise OSError('Vaunix {} library {} can not be loaded: {}'.format(kind, path, err))
+
+
+# Simulated device parameters in library units (100 kHz, 0.25 dB or degrees)
+stub_devices = {
+    'LDA': dict(min_freq=2000, max_freq=60000, min_value=0, max_value=252, min_step=2, max_profile=1000),  # LDA-602
+    'LPS': dict(min_freq=40000, max_freq=80000, min_value=0, max_value=360, min_step=1, max_profile=50)}   # LPS-802
+
+# GetDeviceStatus bits
+dev_connected = 0x00000001
+dev_opened = 0x00000002
+sweep_active = 0x00000004
+profile_active = 0x00000040
+
+
+class VnxStub:
+    """
+    Pure Python replacement of Vaunix LDA/LPS library with simulated devices.
+    Functions have the names and units of the vendor library, every call takes the time
+    of the real one (commands are sent as USB HID reports, getters are answered from the library cache),
+    so the overhead of the drivers can be measured without hardware.
+    Ramps and profiles are played in time: GetAttenuation/GetPhaseAngle, GetDeviceStatus and
+    GetProfileIndex follow them.
+
+    Example:
+        from nanodrivers.non_visa_drivers import vnx_loader
+        vnx_loader.library_paths['LDA'] = 'stub'
+        att = DigAtt()
+        print(att.vnx.calls)
+
+     Args:
+         kind:
+             'LDA' or 'LPS'
+         n_devices:
+             number of simulated devices
+         set_latency:
+             time of a command in s
+         get_latency:
+             time of a query in s
+         init_latency:
+             time of InitDevice in s
+     """
+    def __init__(self, kind, n_devices=1, set_latency=2e-3, get_latency=2e-5, init_latency=0.05):
+        self.kind = kind
+        self.set_latency = set_latency
+        self.get_latency = get_latency
+        self.init_latency = init_latency
+        self.calls = 0
+        self.devices = dict()
+        for handle in range(1, n_devices + 1):
+            dev = dict(stub_devices[kind], serial=10000 + handle, opened=False, test_mode=False)
+            dev.update(freq=dev['min_freq'], value=dev['min_value'], ramp_start=dev['min_value'],
+                       ramp_end=dev['max_value'], ramp_step=dev['min_step'], dwell=1000, idle=0,
+                       up=True, repeat=False, profile=dict(), profile_count=0, profile_dwell=1000,
+                       profile_idle=0, schedule=None, steps=None)
+            self.devices[handle] = dev
+
+        names = {'LDA': dict(value='Attenuation', min='MinAttenuation', max='MaxAttenuation',
+                             min_step='AttenuationStep', step='AttenuationStep'),
+                 'LPS': dict(value='PhaseAngle', min='MinPhaseShift', max='MaxPhaseShift',
+                             min_step='MinPhaseStep', step='PhaseAngleStep')}[kind]
+        functions = {
+            'SetTestMode': (self.set_latency, self.__set_test_mode),
+            'GetNumDevices': (self.get_latency, lambda: len(self.devices)),
+            'GetDevInfo': (self.get_latency, self.__get_dev_info),
+            'GetSerialNumber': (self.get_latency, lambda h: self.devices[h]['serial']),
+            'InitDevice': (self.init_latency, lambda h: self.__set(h, 'opened', True)),
+            'CloseDevice': (self.set_latency, lambda h: self.__set(h, 'opened', False)),
+            'GetDeviceStatus': (self.get_latency, self.__status),
+            'GetMinWorkingFrequency': (self.get_latency, lambda h: self.devices[h]['min_freq']),
+            'GetMaxWorkingFrequency': (self.get_latency, lambda h: self.devices[h]['max_freq']),
+            'GetWorkingFrequency': (self.get_latency, lambda h: self.devices[h]['freq']),
+            'SetWorkingFrequency': (self.set_latency, self.__set_freq),
+            'Get' + names['min']: (self.get_latency, lambda h: self.devices[h]['min_value']),
+            'Get' + names['max']: (self.get_latency, lambda h: self.devices[h]['max_value']),
+            'Get' + names['min_step']: (self.get_latency, lambda h: self.devices[h]['min_step']),
+            'Get' + names['value']: (self.get_latency, self.__get_value),
+            'Set' + names['value']: (self.set_latency, self.__set_value),
+            'Set' + names['step']: (self.set_latency, lambda h, v: self.__set(h, 'ramp_step', v)),
+            'SetRampStart': (self.set_latency, lambda h, v: self.__set(h, 'ramp_start', v)),
+            'SetRampEnd': (self.set_latency, lambda h, v: self.__set(h, 'ramp_end', v)),
+            'SetDwellTime': (self.set_latency, lambda h, v: self.__set(h, 'dwell', v)),
+            'SetIdleTime': (self.set_latency, lambda h, v: self.__set(h, 'idle', v)),
+            'SetHoldTime': (self.set_latency, lambda h, v: 0),
+            'SetRampDirection': (self.set_latency, lambda h, v: self.__set(h, 'up', v)),
+            'SetRampMode': (self.set_latency, lambda h, v: self.__set(h, 'repeat', v)),
+            'SetRampBidirectional': (self.set_latency, lambda h, v: 0),
+            'StartRamp': (self.set_latency, self.__start_ramp),
+            'SetProfileElement': (self.set_latency, self.__set_profile_element),
+            'SetProfileCount': (self.set_latency, lambda h, v: self.__set(h, 'profile_count', v)),
+            'SetProfileDwellTime': (self.set_latency, lambda h, v: self.__set(h, 'profile_dwell', v)),
+            'SetProfileIdleTime': (self.set_latency, lambda h, v: self.__set(h, 'profile_idle', v)),
+            'StartProfile': (self.set_latency, self.__start_profile),
+            'GetProfileIndex': (self.get_latency, self.__profile_index)}
+        for name, (latency, func) in functions.items():
+            setattr(self, 'fn{}_{}'.format(kind, name), self.__timed(latency, func))
+
+    def __timed(self, latency, func):
+        def call(*args):
+            self.calls += 1
+            time.sleep(latency)
+            return func(*args)
+        return call
+
+    def __set(self, handle, key, value):
+        self.devices[handle][key] = value
+        return 0
+
+    def __set_test_mode(self, mode):
+        for dev in self.devices.values():
+            dev['test_mode'] = mode
+        return 0
+
+    def __get_dev_info(self, array):
+        for i, handle in enumerate(self.devices):
+            array[i] = handle
+        return len(self.devices)
+
+    def __status(self, handle):
+        dev = self.devices[handle]
+        status = dev_connected | (dev_opened if dev['opened'] else 0)
+        if self.__playing(dev):
+            status |= sweep_active if dev['steps'] == 'ramp' else profile_active
+        return status
+
+    def __set_freq(self, handle, freq):
+        dev = self.devices[handle]
+        if not dev['min_freq'] <= freq <= dev['max_freq']:
+            return -1
+        dev['freq'] = freq
+        return 0
+
+    def __set_value(self, handle, value):
+        dev = self.devices[handle]
+        if not dev['min_value'] <= value <= dev['max_value']:
+            return -1
+        dev['schedule'], dev['steps'] = None, None
+        dev['value'] = value
+        return 0
+
+    def __playing(self, dev):
+        return dev['schedule'] is not None and time.time() < dev['schedule'].t_end
+
+    def __get_value(self, handle):
+        dev = self.devices[handle]
+        if dev['schedule'] is not None:
+            dev['value'] = int(dev['schedule'].value_at(time.time()))
+        return dev['value']
+
+    def __start_ramp(self, handle, go):
+        dev = self.devices[handle]
+        if not go:
+            self.__get_value(handle)
+            dev['schedule'], dev['steps'] = None, None
+            return 0
+        values = list(range(dev['ramp_start'], dev['ramp_end'] + 1, dev['ramp_step']))
+        if not dev['up']:
+            values = values[::-1]
+        dev['schedule'] = StepSchedule(values, dev['dwell'] / 1000, repeat=dev['repeat'], idle=dev['idle'] / 1000)
+        dev['steps'] = 'ramp'
+        return 0
+
+    def __set_profile_element(self, handle, index, value):
+        if not 0 <= index < self.devices[handle]['max_profile']:
+            return -1
+        self.devices[handle]['profile'][index] = value
+        return 0
+
+    def __start_profile(self, handle, mode):
+        dev = self.devices[handle]
+        if mode == 0:
+            self.__get_value(handle)
+            dev['schedule'], dev['steps'] = None, None
+            return 0
+        values = [dev['profile'].get(i, 0) for i in range(dev['profile_count'])]
+        dev['schedule'] = StepSchedule(values, dev['profile_dwell'] / 1000, repeat=(mode == 2),
+                                       idle=dev['profile_idle'] / 1000)
+        dev['steps'] = 'profile'
+        return 0
+
+    def __profile_index(self, handle):
+        dev = self.devices[handle]
+        if dev['steps'] != 'profile':
+            return -1
+        return dev['schedule'].index_at(time.time())
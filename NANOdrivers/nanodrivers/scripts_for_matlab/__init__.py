@@ -1 +1,2 @@
-from .dig_att import *
\ No newline at end of file
+from .dig_att import *
+from .att_server import *
\ No newline at end of file
@@ -0,0 +1,31 @@
+% Client for the persistent attenuator server (att_server.py).
+% Start the server once, in a terminal or from MATLAB:
+%     system('start python -m nanodrivers.scripts_for_matlab.att_server --port 50007');   % Windows
+%     system('python -m nanodrivers.scripts_for_matlab.att_server --port 50007 &');       % Linux
+% Then every set is one localhost round trip instead of a new Python process.
+
+att = tcpclient('127.0.0.1', 50007, 'Timeout', 5);
+configureTerminator(att, 'LF');
+
+% one command, one answer line
+writeline(att, 'set 6 10');            % frequency 6 GHz, attenuation 10 dB
+assert(str2double(readline(att)) == 0);
+
+writeline(att, 'get');
+fprintf('attenuation %s dB\n', readline(att));
+
+% sweep: only attenuation is sent, frequency stays
+for a = 0:0.5:30
+    writeline(att, sprintf('att %g', a));
+    if str2double(readline(att)) ~= 0
+        error('attenuation %g dB was not set', a);
+    end
+    % ... measurement ...
+end
+
+% batch: several commands in one line, answers come back in one line separated by ';'
+writeline(att, 'freq 5;att 3;get');
+answers = split(readline(att), ';');
+
+writeline(att, 'quit');
+clear att
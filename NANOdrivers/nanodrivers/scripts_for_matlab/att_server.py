@@ -0,0 +1,152 @@
+import sys
+import threading
+import argparse
+import socketserver
+
+from nanodrivers.non_visa_drivers import Dig_Attenuator
+
+default_host = '127.0.0.1'
+default_port = 50007
+
+
+class AttServer:
+    """
+    Persistent attenuator server for MATLAB. Python, numpy, the library and the USB
+    session are loaded once, so one command costs a library call and a localhost round trip
+    instead of a new Python process.
+
+    Line protocol, one answer line per request line. Several commands can be sent in one line
+    separated by ';', the answers come back in one line separated by ';'.
+
+        set <freq GHz> <att dB> [serial]   -> 0 / 1   (frequency is sent only if changed)
+        att <att dB> [serial]              -> 0 / 1
+        freq <freq GHz> [serial]           -> 0 / 1
+        get [serial]                       -> attenuation in dB
+        limits [serial]                    -> min_freq max_freq (MHz) min_att max_att step (dB)
+        list                               -> serial numbers
+        ping                               -> ok
+        quit                               -> closes the connection (stdin mode: stops the server)
+
+    Unknown commands and wrong arguments give 'error <message>'.
+
+    Example (terminal):
+        python -m nanodrivers.scripts_for_matlab.att_server --port 50007
+    MATLAB side: see att_client.m
+
+     Args:
+         dll:
+             path of the library, see Dig_Attenuator.DigAtt
+     """
+    def __init__(self, dll=Dig_Attenuator.address_dll):
+        self.att = Dig_Attenuator.DigAtt(dll)
+        self.lock = threading.Lock()  # several MATLAB sessions may be connected
+        self.commands = {'set': self.__set, 'att': self.__att, 'freq': self.__freq, 'get': self.__get,
+                         'limits': self.__limits, 'list': self.__list, 'ping': lambda: 'ok'}
+
+    def __serial(self, serial):
+        return None if serial is None else int(serial)
+
+    def __set(self, freq, atten, serial=None):
+        return self.att.set_att(float(freq), float(atten), self.__serial(serial))
+
+    def __att(self, atten, serial=None):
+        return self.att.set_attenuation(float(atten), self.__serial(serial))
+
+    def __freq(self, freq, serial=None):
+        return self.att.set_frequency(float(freq), self.__serial(serial))
+
+    def __get(self, serial=None):
+        return self.att.get_attenuation(self.__serial(serial))
+
+    def __limits(self, serial=None):
+        limits = self.att.get_limits(self.__serial(serial))
+        return ' '.join(str(limits[k]) for k in ['min_freq', 'max_freq', 'min_att', 'max_att', 'step'])
+
+    def __list(self):
+        return ' '.join(str(s) for s in self.att.devices)
+
+    def execute(self, line):
+        """
+        Function to execute one request line
+        Args:
+            line: one or several commands separated by ';'
+
+        Returns: answer line (without new line character)
+
+        """
+        answers = []
+        with self.lock:
+            for command in line.split(';'):
+                words = command.split()
+                if not words:
+                    continue
+                func = self.commands.get(words[0].lower())
+                if func is None:
+                    answers.append('error unknown command ' + words[0])
+                    continue
+                try:
+                    answers.append(str(func(*words[1:])))
+                except (TypeError, ValueError, KeyError, StopIteration) as err:
+                    answers.append('error {}'.format(err or type(err).__name__))
+        return ';'.join(answers)
+
+    def serve_stdin(self, stdin=sys.stdin, stdout=sys.stdout):
+        """
+        Function to serve requests from stdin (for a MATLAB process started with pipes)
+        Returns: None
+
+        """
+        for line in stdin:
+            if line.strip().lower() == 'quit':
+                break
+            stdout.write(self.execute(line) + '\n')
+            stdout.flush()
+
+    def serve_tcp(self, host=default_host, port=default_port):
+        """
+        Function to serve requests on TCP socket until KeyboardInterrupt
+        Args:
+            host: address to listen on, keep localhost: there is no authentication
+            port: port number
+
+        Returns: None
+
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True  # answers are tiny, do not wait to fill a packet
+
+            def handle(self):
+                for line in self.rfile:
+                    line = line.decode('ascii', 'replace')
+                    if line.strip().lower() == 'quit':
+                        break
+                    self.wfile.write((server.execute(line) + '\n').encode('ascii'))
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        with Server((host, port), Handler) as tcp:
+            print('Attenuator server on {}:{}, devices {}{}'.format(host, port, list(self.att.devices),
+                                                                   ' (simulated)' if self.att.simulated else ''))
+            try:
+                tcp.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        self.att.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Vaunix attenuator server for MATLAB')
+    parser.add_argument('--host', default=default_host)
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--stdin', action='store_true', help='serve stdin/stdout instead of TCP')
+    parser.add_argument('--dll', default=Dig_Attenuator.address_dll, help="library path or 'stub'")
+    args = parser.parse_args()
+    if args.stdin:
+        out, sys.stdout = sys.stdout, sys.stderr  # driver messages must not get into the answers
+        AttServer(args.dll).serve_stdin(stdout=out)
+    else:
+        AttServer(args.dll).serve_tcp(args.host, args.port)
@@ -1,10 +1,12 @@
 from nanodrivers.non_visa_drivers.Dig_Attenuator import *
+from nanodrivers.non_visa_drivers.vnx_loader import load_vnx
 import ctypes
 import os
 import sys
 
 class DigAtt(object):
-    """Class for Vaunix digital attenuator """
+    """Class for Vaunix digital attenuator.
+    Every call from MATLAB starts a new Python process, for sweeps use att_server.py and att_client.m"""
 
     def set_att(self, raw_freq, raw_atten):
         """ Function to set attenuation
@@ -14,9 +16,7 @@ class DigAtt(object):
                  raw_atten:
                     Attenuation in dB
              """
-        address_dll = r"C:\Users\Demag\PycharmProjects\ColdMeasurements\nanodrivers\nanodrivers\non_visa_drivers\dAttenuator_dll\VNX_atten64.dll"
-        this_dir = os.path.abspath("")  # <-- Path to file her
-        vnx = cdll.LoadLibrary(os.path.join(this_dir, address_dll))
+        vnx = load_vnx('LDA')
         vnx.fnLDA_SetTestMode(False)
         DeviceIDArray = c_int * 20
         Devices = DeviceIDArray()
@@ -0,0 +1,7 @@
+from .schedulers import *
+from .sweep import *
+from .checkpoint import *
+from .adaptive import *
+from .optimize import *
+from .progress import *
+from .live import *
\ No newline at end of file
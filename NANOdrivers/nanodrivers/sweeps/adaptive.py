@@ -0,0 +1,189 @@
+import time
+import numpy as np
+from scipy.interpolate import griddata
+from scipy.spatial import cKDTree
+
+
+class AdaptiveSampler:
+    """
+    Adaptive refinement of a sweep grid. The sweep starts from a coarse subgrid, the measured map
+    of 'target' is interpolated on the full grid and new points are measured where the score is largest:
+
+        score = (w_grad * |gradient| + w_curv * |curvature| + w_value * predicted value) * spacing
+
+    All terms are normalised to 0..1 over the grid, gradient and curvature are taken in grid steps.
+    'spacing' grows from 0 at measured points to 1 at 'min_dist' grid steps, so points are not repeated.
+    Points are measured by sweep.point, so results stay in the grid positions and hooks (checkpoint,
+    progress) work as usual. Each batch is measured in row-major order of the sweep axes.
+
+    Example (thin gain ridges of TWPA):
+        sw = Sweep([Axis('pow', pows, ...), Axis('freq', freqs, ...)], [Readout(vna.get_data, 'gain', post=...)])
+        ad = AdaptiveSampler(sw, 'gain', budget=600)
+        points, values, dense = ad.run()
+
+     Args:
+         sweep:
+             Sweep object, its grid is the set of candidate points
+         target:
+             name of a scalar result to refine on
+         budget:
+             max number of measured points (coarse grid included)
+         coarse:
+             number of coarse points per axis
+         batch:
+             points measured between model updates
+         weights:
+             (w_grad, w_curv, w_value)
+         maximize:
+             True - high values are interesting (gain), False - low values
+         min_dist:
+             spacing in grid steps, see above
+     """
+    def __init__(self, sweep, target, budget=500, coarse=5, batch=10, weights=(1., 1., 1.), maximize=True,
+                 min_dist=1.5):
+        self.sweep = sweep
+        self.target = target
+        self.budget = budget
+        self.coarse = coarse
+        self.batch = batch
+        self.weights = weights
+        self.maximize = maximize
+        self.min_dist = min_dist
+        self.dense_map = None
+        self.score = None
+        self.history = []  # (number of points, time of the model update)
+
+    def coarse_points(self):
+        """
+        Returns: (points, axes) grid indices of the coarse subgrid
+
+        """
+        axes = [np.unique(np.round(np.linspace(0, n - 1, min(self.coarse, n))).astype(int)) for n in self.sweep.shape]
+        return np.array(np.meshgrid(*axes, indexing='ij')).reshape(len(axes), -1).T
+
+    def samples(self):
+        """
+        Returns: grid indices of measured points (points, axes), values of the target
+
+        """
+        idx = np.argwhere(self.sweep.done)
+        return idx, self.sweep.results[self.target][tuple(idx.T)]
+
+    def interpolate(self):
+        """
+        Function to interpolate measured target on the full grid (linear inside the measured points,
+        nearest outside)
+        Returns: array of grid shape
+
+        """
+        idx, values = self.samples()
+        grid = np.indices(self.sweep.shape).reshape(len(self.sweep.shape), -1).T
+        ok = np.isfinite(values)
+        idx, values = idx[ok], values[ok]
+        dense = np.full(len(grid), np.nan)
+        if len(values) > len(self.sweep.shape):
+            try:
+                dense = griddata(idx, values, grid, method='linear')
+            except Exception:  # points in a plane (coarse grid with one value on an axis): no triangulation
+                pass
+        nan = np.isnan(dense)
+        if nan.any() and len(values):
+            dense[nan] = griddata(idx, values, grid[nan], method='nearest')
+        self.dense_map = dense.reshape(self.sweep.shape)
+        return self.dense_map
+
+    def __scores(self):
+        dense = self.interpolate()
+
+        def norm(a):
+            a = np.nan_to_num(a)
+            span = a.max() - a.min()
+            return (a - a.min()) / span if span > 0 else np.zeros_like(a)
+
+        axes = [k for k, n in enumerate(self.sweep.shape) if n > 1]
+        grads = np.gradient(dense, axis=axes)
+        grads = grads if isinstance(grads, (list, tuple)) else [grads]
+        grad = np.sqrt(sum(g ** 2 for g in grads))
+        curv = sum(np.abs(np.gradient(g, axis=k)) for g, k in zip(grads, axes))
+        value = dense if self.maximize else -dense
+        w_grad, w_curv, w_value = self.weights
+        score = w_grad * norm(grad) + w_curv * norm(curv) + w_value * norm(value)
+
+        idx, _ = self.samples()
+        grid = np.indices(self.sweep.shape).reshape(len(self.sweep.shape), -1).T
+        dist, _ = cKDTree(idx).query(grid)
+        score = score.ravel() * np.clip(dist / self.min_dist, 0, 1)
+        score[self.sweep.done.ravel()] = -1
+        self.score = score.reshape(self.sweep.shape)
+        return self.score
+
+    def next_points(self, n):
+        """
+        Function to choose next points: highest score, at least min_dist apart from each other
+        Args:
+            n: number of points
+
+        Returns: (points, axes) grid indices in row-major order
+        """
+        score = self.__scores().ravel()
+        chosen = []
+        for flat in np.argsort(score)[::-1]:
+            if score[flat] <= 0 or len(chosen) == n:
+                break
+            p = np.array(np.unravel_index(flat, self.sweep.shape))
+            if all(np.linalg.norm(p - q) >= self.min_dist for q in chosen):
+                chosen.append(p)
+        if not chosen:
+            return np.empty((0, len(self.sweep.shape)), dtype=int)
+        chosen = np.array(chosen)
+        return chosen[np.lexsort(chosen.T[::-1])]
+
+    def run(self, verbose=False):
+        """
+        Function to measure the coarse grid and refine until the budget is spent
+        Args:
+            verbose: print progress after every batch
+
+        Returns: axis values of measured points (points, axes), target values, interpolated map of grid shape
+
+        """
+        # hooks start first: checkpoint may load done points and replace sweep.done
+        self.sweep.begin(min(self.budget, self.sweep.size))
+        try:
+            for idx in self.coarse_points():
+                if self.sweep.done.sum() >= self.budget:
+                    break
+                if not self.sweep.done[tuple(idx)]:
+                    self.sweep.point(idx)
+            while self.sweep.done.sum() < min(self.budget, self.sweep.size):
+                t = time.perf_counter()
+                points = self.next_points(min(self.batch, self.budget - int(self.sweep.done.sum())))
+                self.history.append((int(self.sweep.done.sum()), time.perf_counter() - t))
+                if len(points) == 0:
+                    break
+                for idx in points:
+                    self.sweep.point(idx)
+                if verbose:
+                    print('{} of {} points, best {} = {:.4g}'.format(
+                        int(self.sweep.done.sum()), self.budget, self.target, self.best()[1]))
+        finally:
+            self.sweep.end()
+        return self.scattered() + (self.interpolate(),)
+
+    def scattered(self):
+        """
+        Returns: axis values of measured points (points, axes), target values
+
+        """
+        idx, values = self.samples()
+        coords = np.column_stack([a.values[idx[:, k]] for k, a in enumerate(self.sweep.axes)])
+        return coords, values
+
+    def best(self):
+        """
+        Returns: axis values of the best measured point, its target value
+
+        """
+        coords, values = self.scattered()
+        k = np.nanargmax(values) if self.maximize else np.nanargmin(values)
+        return coords[k], values[k]
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import numpy as np
+
+from nanodrivers.sweeps.sweep import Sweep
+
+
+class Checkpoint:
+    """
+    Sweep hook that keeps results on disk while the sweep runs. Every result array, and the mask
+    of done points (the cursor), is a memory-mapped .npy file in 'folder'. Points are written
+    straight into the files, the operating system flushes them and a full flush is forced
+    every 'flush_period' seconds, so a crash loses at most the last few points.
+
+    Files can be opened by another process while the sweep is running, see load_checkpoint.
+
+    Layout of the folder:
+        meta.json       axis names, shape, result names, shapes and dtypes, time of the last flush
+        axes.npz        axis values
+        done.npy        bool array of grid shape, True - point is measured
+        <result>.npy    one file per result, grid shape + shape of the value, nan - not measured
+
+    Example:
+        sw = Sweep(axes, readouts, hooks=[Checkpoint(r'D:\\data\\gain_map')])
+        sw.run()
+        ...after a crash, with the same axes and readouts:
+        sw = resume(r'D:\\data\\gain_map', axes, readouts)
+
+     Args:
+         folder:
+             folder of the dataset, created if needed
+         flush_period:
+             time between forced flushes to disk in s
+         setup:
+             function called before the sweep starts or resumes (for example switching sources on),
+             axes are set by the sweep itself on the first point
+     """
+    def __init__(self, folder, flush_period=10., setup=None):
+        self.folder = folder
+        self.flush_period = flush_period
+        self.setup = setup
+        self.t_flush = 0.
+        self.done = None
+
+    def __file(self, name):
+        return os.path.join(self.folder, name + '.npy')
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.folder, 'meta.json'))
+
+    def load(self, sweep):
+        """
+        Function to load results and done mask of an existing dataset into the sweep (files stay mapped)
+        Args:
+            sweep: Sweep with the same axes and readouts
+
+        Returns: number of done points
+
+        """
+        meta, coords = read_meta(self.folder)
+        if meta['axes'] != [a.name for a in sweep.axes] or \
+                any(not np.array_equal(coords[a.name], a.values) for a in sweep.axes):
+            raise ValueError('Axes of the sweep differ from the axes stored in ' + self.folder)
+        self.done = np.load(self.__file('done'), mmap_mode='r+')
+        sweep.done = self.done
+        for name in meta['results']:
+            sweep.results[name] = np.load(self.__file(name), mmap_mode='r+')
+        return int(self.done.sum())
+
+    def start(self, sweep):
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        if self.done is None:
+            if self.exists():
+                self.load(sweep)
+            else:
+                np.savez(os.path.join(self.folder, 'axes.npz'), **sweep.coords())
+                self.done = np.lib.format.open_memmap(self.__file('done'), mode='w+', dtype=bool,
+                                                      shape=sweep.shape)
+                self.done[...] = sweep.done
+                sweep.done = self.done
+                self.__write_meta(sweep)
+        if self.setup is not None:
+            self.setup()
+        self.t_flush = time.monotonic()
+
+    def point(self, sweep, idx):
+        if any(not isinstance(a, np.memmap) for a in sweep.results.values()):
+            self.__map_results(sweep)
+        if time.monotonic() - self.t_flush > self.flush_period:
+            self.flush(sweep)
+
+    def finish(self, sweep):
+        self.flush(sweep)
+
+    def flush(self, sweep):
+        """
+        Function to write all changes to disk
+        Returns: None
+
+        """
+        for array in sweep.results.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+        if self.done is not None:
+            self.done.flush()
+            self.__write_meta(sweep)
+        self.t_flush = time.monotonic()
+
+    def __map_results(self, sweep):
+        # results are allocated by the sweep on the first point, here they are moved to files
+        for name, array in list(sweep.results.items()):
+            if isinstance(array, np.memmap):
+                continue
+            mapped = np.lib.format.open_memmap(self.__file(name), mode='w+', dtype=array.dtype, shape=array.shape)
+            mapped[...] = array
+            sweep.results[name] = mapped
+        self.__write_meta(sweep)
+
+    def __write_meta(self, sweep):
+        meta = dict(axes=[a.name for a in sweep.axes], shape=list(sweep.shape),
+                    results={name: dict(shape=list(a.shape), dtype=str(a.dtype)) for name, a in sweep.results.items()},
+                    done=int(self.done.sum()), updated=time.strftime('%Y-%m-%d %H:%M:%S'))
+        tmp = os.path.join(self.folder, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp, os.path.join(self.folder, 'meta.json'))  # readers never see half written file
+
+
+def read_meta(folder):
+    """
+    Function to read description of a dataset
+    Args:
+        folder: dataset folder
+
+    Returns: meta dict, dict of axis values
+
+    """
+    with open(os.path.join(folder, 'meta.json')) as f:
+        meta = json.load(f)
+    with np.load(os.path.join(folder, 'axes.npz')) as axes:
+        coords = {name: axes[name] for name in meta['axes']}
+    return meta, coords
+
+
+def load_checkpoint(folder):
+    """
+    Function to open a dataset written by Checkpoint, also while the sweep is running.
+    Arrays are read-only memory maps, only the parts that are used are read from disk.
+    Args:
+        folder: dataset folder
+
+    Returns: dict with axis values, results and 'done' mask
+
+    """
+    meta, data = read_meta(folder)
+    data['done'] = np.load(os.path.join(folder, 'done.npy'), mmap_mode='r')
+    for name in meta['results']:
+        data[name] = np.load(os.path.join(folder, name + '.npy'), mmap_mode='r')
+    return data
+
+
+def resume(folder, axes, readouts, scheduler=None, hooks=(), setup=None, flush_period=10., run=True):
+    """
+    Function to continue a sweep saved by Checkpoint: done points are skipped,
+    all axes are set again on the first remaining point and setup() is called before that.
+    Args:
+        folder: dataset folder
+        axes: list of Axis, same as in the interrupted sweep
+        readouts: list of Readout
+        scheduler: scheduler, see Sweep
+        hooks: other hooks (progress, live data...)
+        setup: function to bring instruments to the measurement state, see Checkpoint
+        flush_period: see Checkpoint
+        run: run the sweep right away
+
+    Returns: Sweep
+
+    """
+    checkpoint = Checkpoint(folder, flush_period, setup)
+    sweep = Sweep(axes, readouts, scheduler, [checkpoint] + list(hooks))
+    n = checkpoint.load(sweep)
+    print('Resuming {}: {} of {} points done'.format(folder, n, sweep.size))
+    if run:
+        sweep.run()
+    return sweep
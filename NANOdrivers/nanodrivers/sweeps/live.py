@@ -0,0 +1,430 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+default_feed = 'nanodrivers_live'
+meta_size = 1 << 20  # bytes reserved for the json description of the feed
+
+# control block: sequence counter (odd while a point is written), points written, flat index of the last point,
+# version of the layout (changes when buffers are created again), 1 when the run is finished,
+# process id and random id of the feed that owns the block
+control_fields = ['seq', 'points', 'last', 'version', 'finished', 'pid', 'owner']
+
+created = set()  # blocks created by feeds of this process
+
+
+def attach(name):
+    """
+    Function to open an existing shared memory block without taking ownership
+    (the block is not removed when the reading process exits)
+    Returns: SharedMemory
+
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13: attached blocks are registered and would be unlinked at exit
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix' and name not in created:  # windows has no tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def process_alive(pid):
+    """
+    Function to check if a process exists (posix only, on windows True: blocks of a crashed
+    process are removed by the system, the check is not needed)
+    Returns: bool
+
+    """
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    return True
+
+
+class LiveFeed:
+    """
+    Sweep hook publishing results to shared memory for live plotting in other processes (see LiveView
+    and view). Scalar results are published as whole maps of the grid, array results (traces, spectra)
+    only as the value of the last point. At every point only the new values are copied into the
+    shared buffers around a sequence counter (seqlock): the sweep never waits for readers,
+    readers retry when they catch a point being written. At the end of the run the feed is marked
+    finished and the shared memory is removed (viewers keep the last picture), unless 'keep' is set.
+    A feed of a sweep that is still running is never replaced: start raises ValueError, use another name.
+
+    Example:
+        feed = LiveFeed('twpa')
+        sw = Sweep(axes, readouts, hooks=[feed])
+        feed.start_viewer()          # separate process, or in a terminal: python -m nanodrivers.sweeps.live twpa
+        sw.run()
+
+     Args:
+         name:
+             name of the feed, viewers attach to it by name
+         targets:
+             names of the results to publish, default all
+         keep:
+             keep the shared memory after the run (LiveView can attach later), remove it with close
+     """
+    def __init__(self, name=default_feed, targets=None, keep=False):
+        self.name = name
+        self.targets = targets
+        self.keep = keep
+        self.blocks = []  # data blocks, created again when the results change
+        self.control_block = None
+        self.control = None
+        self.buffers = dict()  # result name: (shared array, True if the whole map is published)
+        self.done = None
+        self.owner = int.from_bytes(os.urandom(7), 'little')
+
+    def __check_free(self):
+        try:
+            shm = attach(self.name + '_control')
+        except FileNotFoundError:
+            return
+        try:
+            if shm.size >= 8 * len(control_fields):
+                control = np.ndarray(len(control_fields), np.int64, buffer=shm.buf)
+                finished, pid = int(control[4]), int(control[5])
+                del control  # the block can not be closed while an array uses its buffer
+                if not finished and process_alive(pid):
+                    raise ValueError('Feed {} is used by a running sweep (process {}), use another name'.format(
+                        self.name, pid))
+        finally:
+            shm.close()
+
+    def __open_control(self):
+        self.__check_free()
+        self.control_block = self.__block('control', 8 * len(control_fields))
+        self.control = np.ndarray(len(control_fields), np.int64, buffer=self.control_block.buf)
+        self.control[:] = [0, 0, -1, 0, 0, os.getpid(), self.owner]
+
+    def __block(self, suffix, nbytes):
+        name = '{}_{}'.format(self.name, suffix)
+        try:  # left over from a crashed or finished run (see __check_free)
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+        except FileNotFoundError:
+            pass
+        created.add(name)
+        return shared_memory.SharedMemory(name=name, create=True, size=max(int(nbytes), 1))
+
+    def __names(self, sweep):
+        return [n for n in sweep.results if self.targets is None or n in self.targets]
+
+    def __release(self, unlink=True):
+        self.buffers = dict()
+        self.done = None
+        for shm in self.blocks:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        self.blocks = []
+
+    def __owned(self):
+        # a kept feed may have been replaced after its run: the names belong to the new feed then
+        try:
+            shm = attach(self.name + '_control')
+        except FileNotFoundError:
+            return False
+        owner = int(np.frombuffer(shm.buf, np.int64, len(control_fields))[6])
+        shm.close()
+        return owner == self.owner
+
+    def __create(self, sweep):
+        # the control block stays, so attached viewers see the new version and map the new blocks
+        if self.control_block is None:
+            self.__open_control()
+        self.__release()
+        names = self.__names(sweep)
+        meta = dict(axes={a.name: np.asarray(a.values, dtype=float).tolist() for a in sweep.axes},
+                    shape=list(sweep.shape), results=dict())
+        for k, name in enumerate(names):
+            array = sweep.results[name]
+            full = array.ndim == len(sweep.shape)
+            shape = array.shape if full else array.shape[len(sweep.shape):]
+            dtype = array.dtype
+            shm = self.__block(k, int(np.prod(shape)) * dtype.itemsize)
+            self.blocks.append(shm)
+            buffer = np.ndarray(shape, dtype, buffer=shm.buf)
+            buffer[...] = array if full else np.nan
+            self.buffers[name] = (buffer, full)
+            meta['results'][name] = dict(block=shm.name, shape=list(shape), dtype=dtype.str, full=full)
+        shm = self.__block('done', int(np.prod(sweep.shape)))
+        self.blocks.append(shm)
+        self.done = np.ndarray(sweep.shape, bool, buffer=shm.buf)
+        self.done[...] = sweep.done
+        meta['done'] = shm.name
+        text = json.dumps(meta).encode()
+        if len(text) + 8 > meta_size:
+            raise ValueError('Description of the feed is too long (axes with too many values)')
+        shm = self.__block('meta', meta_size)
+        self.blocks.append(shm)
+        shm.buf[:8] = np.int64(len(text)).tobytes()
+        shm.buf[8:8 + len(text)] = text
+        self.control[1:3] = [int(sweep.done.sum()), -1]
+        self.control[4] = 0
+        self.control[3] += 1  # last: readers map the blocks after the version changes
+
+    def start(self, sweep):
+        if self.control is None:
+            self.__open_control()  # claims the name before the first point
+        self.control[4] = 0
+
+    def point(self, sweep, idx):
+        if not self.blocks or len(self.buffers) != len(self.__names(sweep)):
+            self.__create(sweep)
+        control = self.control
+        control[0] += 1  # odd: writing
+        for name, (buffer, full) in self.buffers.items():
+            buffer[idx if full else ...] = sweep.results[name][idx]
+        self.done[idx] = True
+        control[1] += 1
+        control[2] = np.ravel_multi_index(idx, sweep.shape)
+        control[0] += 1
+
+    def finish(self, sweep):
+        if self.control is not None:
+            self.control[4] = 1
+            self.control[0] += 2  # readers see a change
+        if not self.keep:
+            self.close()
+
+    def start_viewer(self, fps=5., max_pixels=500):
+        """
+        Function to start the viewer in a separate process (see view)
+        Returns: subprocess.Popen
+
+        """
+        return subprocess.Popen([sys.executable, '-m', 'nanodrivers.sweeps.live', self.name,
+                                 '--fps', str(fps), '--max-pixels', str(max_pixels)])
+
+    def close(self):
+        """
+        Function to remove the shared memory of the feed (viewers stop updating)
+        Returns: None
+
+        """
+        owned = self.control_block is not None and self.__owned()
+        self.__release(owned)
+        self.control = None
+        if self.control_block is not None:
+            self.control_block.close()
+            if owned:
+                self.control_block.unlink()
+            self.control_block = None
+
+
+class LiveView:
+    """
+    Reader of a LiveFeed, in any process.
+
+    Example:
+        live = LiveView('twpa')
+        seq, data = live.snapshot()     # copies of the published arrays and 'done' mask
+
+     Args:
+         name:
+             name of the feed
+         timeout:
+             time to wait for the feed to appear in s
+     """
+    def __init__(self, name=default_feed, timeout=60.):
+        self.name = name
+        self.blocks = []
+        t_end = time.monotonic() + timeout
+        while True:
+            try:
+                control = attach(name + '_control')
+                break
+            except FileNotFoundError:
+                if time.monotonic() > t_end:
+                    raise
+                time.sleep(0.2)
+        self.blocks.append(control)
+        self.control = np.ndarray(len(control_fields), np.int64, buffer=control.buf)
+        self.version = None
+        self.meta = None
+        self.arrays = dict()
+        self.done = None
+
+    def __map(self):
+        for shm in self.blocks[1:]:
+            shm.close()
+        self.blocks = self.blocks[:1]
+        self.version = int(self.control[3])
+        meta_block = attach(self.name + '_meta')
+        self.blocks.append(meta_block)
+        n = int(np.frombuffer(meta_block.buf[:8], np.int64)[0])
+        self.meta = json.loads(bytes(meta_block.buf[8:8 + n]).decode())
+        self.arrays = dict()
+        for name, r in self.meta['results'].items():
+            shm = attach(r['block'])
+            self.blocks.append(shm)
+            self.arrays[name] = np.ndarray(r['shape'], np.dtype(r['dtype']), buffer=shm.buf)
+        shm = attach(self.meta['done'])
+        self.blocks.append(shm)
+        self.done = np.ndarray(self.meta['shape'], bool, buffer=shm.buf)
+
+    @property
+    def seq(self):
+        return int(self.control[0])
+
+    @property
+    def finished(self):
+        return bool(self.control[4])
+
+    @property
+    def published(self):
+        return int(self.control[3]) > 0  # at least one point
+
+    def snapshot(self, retries=10, timeout=1.):
+        """
+        Function to copy the published data (retried if a point was being written)
+        Args:
+            retries: number of attempts to get a consistent copy, after that the last copy is returned
+            timeout: time to wait for the first point (or for new blocks of the feed) in s
+
+        Returns: sequence number, dict with copies of results, 'done' mask, 'last' point index (tuple or None);
+                 data is None if nothing is published within timeout
+
+        """
+        t_end = time.monotonic() + timeout
+        while self.version is None or self.version != int(self.control[3]):
+            if time.monotonic() > t_end:
+                return self.seq, None
+            if not self.published:
+                time.sleep(0.01)
+                continue
+            try:
+                self.__map()
+            except (FileNotFoundError, ValueError):  # the feed is creating new blocks
+                if self.finished:  # or it was removed at the end of the run
+                    raise FileNotFoundError('Feed {} is finished and removed'.format(self.name))
+                time.sleep(0.01)
+                self.version = None
+        for k in range(retries):
+            seq = self.seq
+            data = {name: a.copy() for name, a in self.arrays.items()}
+            data['done'] = self.done.copy()
+            last = int(self.control[2])
+            if seq % 2 == 0 and self.seq == seq:
+                break
+            time.sleep(1e-4)
+        data['last'] = np.unravel_index(last, self.meta['shape']) if last >= 0 else None
+        return seq, data
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+        self.blocks = []
+
+
+def decimate(array, max_pixels):
+    """
+    Function to reduce an array to at most max_pixels along every axis (every n-th element)
+    Returns: view of the array, steps
+
+    """
+    steps = tuple(int(np.ceil(n / max_pixels)) if n > max_pixels else 1 for n in array.shape)
+    return array[tuple(slice(None, None, s) for s in steps)], steps
+
+
+def view(name=default_feed, fps=5., max_pixels=500):
+    """
+    Function to plot a LiveFeed until the window is closed. The window is redrawn only when new points
+    arrived and at most fps times per second. Maps of scalar results are shown for the last two axes
+    at the current position of the outer axes (line for one axis), array results as the last trace,
+    one line per row for 2-D arrays (e.g. magnitude and phase). Arrays are decimated to max_pixels per axis.
+    When the run is finished the last picture stays until the feed is published again.
+    Returns: None
+
+    """
+    import matplotlib.pyplot as plt  # only the viewer process needs matplotlib
+
+    live = LiveView(name)
+    fig = plt.figure()
+    version, last_seq, artists, subplots = None, None, dict(), dict()
+    while plt.fignum_exists(fig.number):
+        t = time.monotonic()
+        if live.finished:  # the feed may be removed and created again by the next run
+            try:
+                new = LiveView(name, timeout=0.)
+            except FileNotFoundError:
+                new = None
+            if new is not None and new.finished:  # same feed, kept after the run
+                new.close()
+            elif new is not None:
+                live.close()
+                live, version, last_seq = new, None, None
+        seq = live.seq
+        if seq != last_seq and seq % 2 == 0 and live.published and not (live.finished and live.version is None):
+            new_seq, data = live.snapshot()
+            if data is not None:  # None: the feed is creating new blocks, next frame
+                last_seq = new_seq
+                if live.version != version:  # new sweep or new results: new axes
+                    version = live.version
+                    fig.clf()
+                    artists, subplots = dict(), dict()
+                names = list(live.meta['results'])
+                coords = {k: np.asarray(v) for k, v in live.meta['axes'].items()}
+                axis_names = list(coords)
+                outer = tuple(data['last'][:-2]) if data['last'] is not None else ()
+                for k, result in enumerate(names):
+                    r = live.meta['results'][result]
+                    value = np.real(data[result]) if np.iscomplexobj(data[result]) else data[result]
+                    if result not in subplots:
+                        subplots[result] = fig.add_subplot(1, len(names), k + 1)
+                    ax = subplots[result]
+                    if r['full'] and value.ndim >= 2:
+                        value, steps = decimate(value[outer] if outer else value, max_pixels)
+                        value = np.ma.masked_invalid(value)
+                        if result not in artists:
+                            artists[result] = ax.pcolormesh(coords[axis_names[-1]][::steps[1]],
+                                                            coords[axis_names[-2]][::steps[0]], value,
+                                                            shading='nearest')
+                            fig.colorbar(artists[result], ax=ax)
+                            ax.set_xlabel(axis_names[-1])
+                            ax.set_ylabel(axis_names[-2])
+                        else:
+                            artists[result].set_array(value.ravel())
+                            artists[result].autoscale()
+                    else:
+                        value = np.atleast_1d(value)
+                        rows, steps = decimate(value.reshape(-1, value.shape[-1]), max_pixels)  # one line per row
+                        x = coords[axis_names[-1]][::steps[1]] if r['full'] else np.arange(rows.shape[1]) * steps[1]
+                        if result not in artists:
+                            artists[result] = ax.plot(x, rows.T)
+                            ax.set_xlabel(axis_names[-1] if r['full'] else 'index')
+                            if 1 < len(rows) <= 10:
+                                ax.legend([str(n * steps[0]) for n in range(len(rows))], title='row')
+                        else:
+                            for line, row in zip(artists[result], rows):
+                                line.set_data(x, row)
+                            ax.relim()
+                            ax.autoscale_view()
+                    ax.set_title('{} ({}/{} points{})'.format(result, int(data['done'].sum()), data['done'].size,
+                                                             ', finished' if live.finished else ''))
+                fig.canvas.draw_idle()
+        plt.pause(max(1. / fps - (time.monotonic() - t), 1e-3))
+    live.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Live plot of a sweep feed')
+    parser.add_argument('name', nargs='?', default=default_feed)
+    parser.add_argument('--fps', type=float, default=5.)
+    parser.add_argument('--max-pixels', type=int, default=500)
+    args = parser.parse_args()
+    view(args.name, args.fps, args.max_pixels)
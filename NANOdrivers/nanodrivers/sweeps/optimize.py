@@ -0,0 +1,300 @@
+import time
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.stats import norm
+
+
+class GP:
+    """
+    Gaussian process regression with squared exponential kernel (one length per dimension)
+    and white noise. Inputs are expected in 0..1, outputs are normalised inside.
+    Hyperparameters are fitted by maximum marginal likelihood.
+    """
+    def __init__(self, dim):
+        self.dim = dim
+        self.log_params = np.concatenate([np.log(np.full(dim, 0.3)), [0., np.log(0.1)]])  # lengths, sf, noise
+        # noise can not explain all the spread of the data, otherwise a flat noisy start stops exploration
+        self.bounds = [(np.log(0.02), np.log(5.))] * dim + [(np.log(0.5), np.log(10.)), (np.log(1e-3), np.log(0.5))]
+        self.x = None
+        self.y = None
+
+    def __kernel(self, a, b, log_params):
+        lengths = np.exp(log_params[:self.dim])
+        d = (a[:, None, :] - b[None, :, :]) / lengths
+        return np.exp(2 * log_params[self.dim]) * np.exp(-0.5 * np.sum(d ** 2, axis=2))
+
+    def __nll(self, log_params, x, y):
+        k = self.__kernel(x, x, log_params) + (np.exp(2 * log_params[-1]) + 1e-8) * np.eye(len(x))
+        try:
+            c = cho_factor(k, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e10
+        alpha = cho_solve(c, y)
+        return 0.5 * y @ alpha + np.sum(np.log(np.diag(c[0])))
+
+    def fit(self, x, y, optimize=True):
+        """
+        Function to condition the model on data
+        Args:
+            x: (points, dim) inputs in 0..1
+            y: outputs
+            optimize: fit hyperparameters (otherwise the previous ones are used)
+
+        Returns: None
+
+        """
+        self.x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.mean, self.std = y.mean(), (y.std() if y.std() > 0 else 1.)
+        self.y = (y - self.mean) / self.std
+        if optimize and len(y) > 2:
+            starts = [self.log_params] + [np.concatenate([np.log(np.full(self.dim, length)), [0., np.log(0.05)]])
+                                          for length in (0.1, 1.)]
+            best = min((minimize(self.__nll, s, args=(self.x, self.y), method='L-BFGS-B', bounds=self.bounds)
+                        for s in starts), key=lambda r: r.fun)
+            self.log_params = best.x
+        k = self.__kernel(self.x, self.x, self.log_params) + \
+            (np.exp(2 * self.log_params[-1]) + 1e-8) * np.eye(len(self.x))
+        self.chol = cho_factor(k, lower=True)
+        self.alpha = cho_solve(self.chol, self.y)
+
+    def predict(self, x):
+        """
+        Function to predict outputs
+        Args:
+            x: (points, dim) inputs in 0..1
+
+        Returns: mean, standard deviation (without measurement noise)
+
+        """
+        x = np.atleast_2d(x)
+        ks = self.__kernel(x, self.x, self.log_params)
+        mu = ks @ self.alpha
+        v = cho_solve(self.chol, ks.T)
+        var = np.exp(2 * self.log_params[self.dim]) - np.sum(ks * v.T, axis=1)
+        return mu * self.std + self.mean, np.sqrt(np.clip(var, 1e-12, None)) * self.std
+
+    @property
+    def noise(self):
+        return np.exp(self.log_params[-1]) * self.std
+
+
+class SurrogateOptimizer:
+    """
+    Optimiser for expensive and noisy measurements (for example gain of TWPA versus pump power,
+    pump frequency and bias). A Gaussian process is fitted to all measured points and the next
+    points are the ones with the largest expected improvement. Measurements are cached by set-point
+    rounded to 'resolution', so a point is never measured twice. Several points can be proposed
+    at once (batch), they are measured in the order of the first coordinate (the slowest instrument
+    is changed the least). Noise is handled by the model: the best point is the one with the best
+    predicted mean, not the luckiest single measurement.
+
+    Stops after 'max_evals' measurements or when the expected improvement stays below
+    tol * (spread of measured values) for 'patience' iterations.
+
+    Example:
+        func, bounds = sweep_objective(sw, 'gain')          # sw - Sweep with pump power, frequency, bias axes
+        opt = SurrogateOptimizer(func, bounds, resolution=[0.01, 1e5, 1e-3], batch=4)
+        x_best, gain_best = opt.run()
+
+     Args:
+         func:
+             function(x) -> value, x - array of coordinates
+         bounds:
+             list of (min, max) per coordinate
+         resolution:
+             set-point resolution per coordinate, used for rounding and caching (default 1e-3 of the range)
+         maximize:
+             True - look for maximum
+         batch:
+             points per iteration
+         func_batch:
+             function(X) -> values for a batch of points, used instead of func if given
+         n_init:
+             number of initial points (latin hypercube), default 2 * dim + 2; for narrow features
+             (a gain ridge a few % of the range wide) use more, for example 10 * dim
+         max_evals:
+             max number of measurements
+         tol:
+             convergence threshold of expected improvement, relative to the spread of measured values
+         patience:
+             iterations below tol before stopping
+         explore:
+             every explore-th proposed point is the one with the largest uncertainty (0 - never),
+             so a noisy flat start does not trap the search around one point
+         seed:
+             random seed
+     """
+    def __init__(self, func, bounds, resolution=None, maximize=True, batch=1, func_batch=None, n_init=None,
+                 max_evals=50, tol=1e-3, patience=3, explore=4, seed=None):
+        self.func = func
+        self.func_batch = func_batch
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.dim = len(self.bounds)
+        span = self.bounds[:, 1] - self.bounds[:, 0]
+        self.resolution = span * 1e-3 if resolution is None else np.asarray(resolution, dtype=float)
+        self.maximize = maximize
+        self.batch = batch
+        self.n_init = 2 * self.dim + 2 if n_init is None else n_init
+        self.max_evals = max_evals
+        self.tol = tol
+        self.patience = patience
+        self.explore = explore
+        self.n_proposed = 0
+        self.rng = np.random.default_rng(seed)
+        self.gp = GP(self.dim)
+        self.cache = dict()  # rounded set-point: measured value
+        self.x = []
+        self.y = []
+        self.history = []  # per iteration: number of evaluations, best predicted value, max expected improvement
+
+    def __unit(self, x):
+        return (np.asarray(x) - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def __real(self, u):
+        return self.bounds[:, 0] + np.asarray(u) * (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def __key(self, x):
+        return tuple(np.round(np.asarray(x) / self.resolution).astype(np.int64))
+
+    def snap(self, x):
+        """
+        Function to round a point to the resolution grid
+        Returns: rounded point (inside bounds)
+
+        """
+        x = np.round(np.asarray(x) / self.resolution) * self.resolution
+        return np.clip(x, self.bounds[:, 0], self.bounds[:, 1])
+
+    def evaluate(self, points):
+        """
+        Function to measure points (cached values are not measured again)
+        Args:
+            points: (points, dim) array
+
+        Returns: values
+        """
+        points = np.array([self.snap(p) for p in np.atleast_2d(points)])
+        new = [p for p in points if self.__key(p) not in self.cache]
+        new = sorted({self.__key(p): p for p in new}.values(), key=tuple)  # first coordinate changes least
+        if new:
+            values = self.func_batch(np.array(new)) if self.func_batch is not None else [self.func(p) for p in new]
+            for p, v in zip(new, values):
+                self.cache[self.__key(p)] = float(v)
+                self.x.append(p)
+                self.y.append(float(v))
+        return np.array([self.cache[self.__key(p)] for p in points])
+
+    def __sign(self):
+        return 1. if self.maximize else -1.
+
+    def expected_improvement(self, u, best):
+        """
+        Args:
+            u: (points, dim) array of points in 0..1 units
+            best: best predicted value so far (in the direction of optimisation)
+
+        Returns: expected improvement of every point
+        """
+        mu, sigma = self.gp.predict(u)
+        imp = self.__sign() * mu - best
+        z = imp / sigma
+        return imp * norm.cdf(z) + sigma * norm.pdf(z)
+
+    def __candidates(self, n=2000):
+        u = self.rng.random((n, self.dim))
+        x = np.array(self.x)
+        best = self.__unit(x[np.argmax(self.__sign() * self.gp.predict(self.__unit(x))[0])])
+        local = np.clip(best + 0.05 * self.rng.standard_normal((n // 2, self.dim)), 0, 1)
+        return np.vstack([u, local])
+
+    def propose(self):
+        """
+        Function to choose the next batch of points (kriging believer: every chosen point is added
+        to the model with its predicted value before choosing the next one)
+        Returns: (batch, dim) array of points, max expected improvement
+        """
+        x_u = self.__unit(np.array(self.x))
+        y = np.array(self.y)
+        best = np.max(self.__sign() * self.gp.predict(x_u)[0])
+        chosen, ei_max = [], 0.
+        cand = self.__candidates()
+        for k in range(self.batch):
+            ei = self.expected_improvement(cand, best)
+            if k == 0:
+                ei_max = np.max(ei)
+            self.n_proposed += 1
+            if self.explore and self.n_proposed % self.explore == 0:  # exploration point: largest uncertainty
+                ei = self.gp.predict(cand)[1]
+            for i in np.argsort(ei)[::-1]:
+                p = self.snap(self.__real(cand[i]))
+                if self.__key(p) not in self.cache and all(self.__key(p) != self.__key(q) for q in chosen):
+                    break
+            else:
+                break
+            chosen.append(p)
+            if k < self.batch - 1:  # believe the prediction and update the model without refitting
+                x_u = np.vstack([x_u, self.__unit(p)])
+                y = np.append(y, self.gp.predict(self.__unit(p)[None])[0])
+                self.gp.fit(x_u, y, optimize=False)
+        if self.batch > 1:
+            self.gp.fit(self.__unit(np.array(self.x)), np.array(self.y), optimize=False)
+        return np.array(chosen), ei_max
+
+    def best(self):
+        """
+        Returns: measured point with the best predicted value, predicted value
+        """
+        x = np.array(self.x)
+        mu = self.gp.predict(self.__unit(x))[0]
+        k = np.argmax(self.__sign() * mu)
+        return x[k], mu[k]
+
+    def run(self, verbose=True):
+        """
+        Function to run the optimisation
+        Args:
+            verbose: print every iteration
+
+        Returns: best point, its predicted value
+        """
+        if len(self.x) < self.n_init:
+            n = self.n_init - len(self.x)
+            lhs = (np.argsort(self.rng.random((self.dim, n)), axis=1).T + self.rng.random((n, self.dim))) / n
+            self.evaluate(self.__real(lhs))
+        calm = 0
+        while len(self.x) < self.max_evals:
+            t = time.perf_counter()
+            self.gp.fit(self.__unit(np.array(self.x)), np.array(self.y))
+            points, ei = self.propose()
+            spread = np.ptp(self.y) or 1.
+            x_best, y_best = self.best()
+            self.history.append((len(self.x), y_best, ei))
+            if verbose:
+                print('{} evaluations, best {:.4g} at {}, EI {:.3g}, model {:.2f} s'.format(
+                    len(self.x), y_best, x_best, ei, time.perf_counter() - t))
+            calm = calm + 1 if ei < self.tol * spread else 0
+            if calm >= self.patience or len(points) == 0:
+                break
+            self.evaluate(points[:self.max_evals - len(self.x)])
+        self.gp.fit(self.__unit(np.array(self.x)), np.array(self.y))
+        return self.best()
+
+
+def sweep_objective(sweep, target):
+    """
+    Function to use the axes and readouts of a sweep as the objective of the optimiser
+    (axes are set to any value inside their range, not only to grid points)
+    Args:
+        sweep: Sweep object
+        target: name of a scalar result
+
+    Returns: function(x) -> value, bounds from the axis values
+    """
+    def func(x):
+        sweep.set_values(x)
+        return float(sweep.measure()[target])
+
+    bounds = [(np.min(a.values), np.max(a.values)) for a in sweep.axes]
+    return func, bounds
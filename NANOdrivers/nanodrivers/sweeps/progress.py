@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+from nanodrivers.sweeps.sweep import owner
+from nanodrivers.sweeps.schedulers import axis_changes
+
+monitor_phases = ['set', 'settle', 'acquire', 'transfer', 'parse', 'save']
+
+
+def format_time(seconds):
+    """
+    Function to format duration as h:mm:ss
+    Returns: string
+
+    """
+    if seconds is None or not np.isfinite(seconds):
+        return '--:--:--'
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class Progress:
+    """
+    Sweep hook reporting throughput and remaining time. After every point the duration of each
+    phase is averaged with an exponential moving average (weight 'alpha' of the last point):
+
+        set, settle       - from the sweep
+        acquire           - readouts, without transfer and parse
+        transfer, parse   - from 'last_timing' of the devices of the readouts (see VNA.get_data),
+                            0 for devices that do not report them
+        save              - storing the point and other hooks
+
+    For sweeps run in a fixed order (Sweep.run) the ETA follows the remaining order, as estimate does:
+    changes of every axis times its measured setter time, settling of the device models scaled by
+    measured / modelled settling of the points done, and the averages of the other phases per point,
+    so slow axes, which change once per row, count only where they change (the changes are found
+    once, at the first point). For samplers choosing the points during the run,
+    ETA = remaining points * average time of a point.
+
+    The report (see status) is produced at most once per 'period' seconds and at the end of the sweep:
+    it is passed to the callback, printed as one updating line and written to the status file
+    (json, replaced atomically, so it can be read by another process at any time).
+    Nothing is done between reports except the averaging.
+
+    Example:
+        sw = Sweep(axes, readouts, hooks=[Checkpoint(folder), Progress(status_file=folder + '\\status.json')])
+        sw.run()
+
+     Args:
+         callback:
+             function(status dict), called on every report
+         period:
+             min time between reports in s
+         status_file:
+             path of the json status file, None - no file
+         line:
+             print the progress line
+         alpha:
+             weight of the last point in the moving averages
+         total:
+             number of points the run will measure, default all points that are not done
+             (or up to sweep.planned, the budget set by AdaptiveSampler)
+     """
+    def __init__(self, callback=None, period=2., status_file=None, line=True, alpha=0.1, total=None):
+        self.callback = callback
+        self.period = period
+        self.status_file = status_file
+        self.line = line
+        self.alpha = alpha
+        self.total = total
+        self.ema = dict.fromkeys(monitor_phases, None)
+        self.t_start = None
+        self.t_report = 0.
+        self.n_done = 0  # points measured in this run
+        self.n_total = 0
+        self.devices = []
+        self.plan = None  # first point of the plan, changes of every axis and model settling from every point on
+        self.settle_sum = 0.  # measured settling in this run in s
+
+    def start(self, sweep):
+        self.t_start = time.monotonic()
+        self.t_report = self.t_start
+        self.n_done = 0
+        planned = sweep.size if getattr(sweep, 'planned', None) is None else sweep.planned
+        self.n_total = max(int(planned - sweep.done.sum()), 0) if self.total is None else self.total
+        self.devices = [d for d in (owner(r.getter) for r in sweep.readouts) if hasattr(d, 'last_timing')]
+        self.plan = None
+        self.settle_sum = 0.
+
+    def __plan(self, sweep):
+        # remaining points of the run, from the axis values set now
+        changed, settle = axis_changes(sweep, sweep.run_order[self.n_done:])
+        n_changes = np.zeros((len(changed) + 1, len(sweep.axes)), dtype=int)  # last row: nothing left
+        n_changes[:-1] = np.cumsum(changed[::-1], axis=0)[::-1]
+        settle = np.append(np.cumsum(settle[::-1])[::-1], 0.)
+        self.plan = (self.n_done, self.settle_sum, n_changes, settle)
+        if self.total is None:
+            self.n_total = self.n_done + len(changed)
+
+    def __eta(self, sweep):
+        first, settle_first, n_changes, settle = self.plan
+        k = min(self.n_done - first, len(settle) - 1)
+        set_time = sum(axis.set_time * n_changes[k, j] for j, axis in enumerate(sweep.axes))
+        modelled, measured = settle[0] - settle[k], self.settle_sum - settle_first
+        if settle[0] > 0:
+            settle_time = settle[k] * (measured / modelled if modelled > 0 else 1.)
+        else:  # no models: measured average
+            settle_time = (len(settle) - 1 - k) * (measured / k if k else 0.)
+        other = sum(self.ema[phase] or 0. for phase in monitor_phases if phase not in ('set', 'settle'))
+        return float(set_time + settle_time + (len(settle) - 1 - k) * other)
+
+    def point(self, sweep, idx):
+        timing = dict(sweep.last_timing)
+        timing['transfer'] = timing['parse'] = 0.
+        for device in self.devices:
+            timing['transfer'] += device.last_timing.get('transfer', 0.)
+            timing['parse'] += device.last_timing.get('parse', 0.)
+        timing['acquire'] = np.clip(timing['acquire'] - timing['transfer'] - timing['parse'], 0., None)
+        # save of this point is not finished yet, the one of the previous point is used
+        for phase in monitor_phases:
+            old = self.ema[phase]
+            self.ema[phase] = timing[phase] if old is None else (1 - self.alpha) * old + self.alpha * timing[phase]
+        self.n_done += 1
+        self.settle_sum += timing['settle']
+        if self.plan is None and getattr(sweep, 'run_order', None) is not None and sweep.planned is None:
+            self.__plan(sweep)
+        if time.monotonic() - self.t_report >= self.period:
+            self.report(sweep)
+
+    def finish(self, sweep):
+        self.report(sweep, final=True)
+
+    def status(self, sweep):
+        """
+        Function to get the current state of the run
+        Returns: dict with done and total points, points_per_s (moving average and from the start),
+                 elapsed and eta in s, finish time, average time of every phase in s
+
+        """
+        elapsed = time.monotonic() - self.t_start if self.t_start is not None else 0.
+        point_time = sum(v for v in self.ema.values() if v is not None)
+        remaining = max(self.n_total - self.n_done, 0)
+        if self.plan is not None:
+            eta = self.__eta(sweep)
+        else:
+            eta = remaining * point_time if self.n_done else None
+        return dict(sweep=repr(sweep), running=sweep.running, done=self.n_done, total=self.n_total,
+                    points_per_s=1. / point_time if point_time > 0 else None,
+                    average_points_per_s=self.n_done / elapsed if elapsed > 0 else None,
+                    elapsed=elapsed, eta=eta,
+                    finish=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() + eta))
+                    if eta is not None else None,
+                    phases={phase: v for phase, v in self.ema.items() if v is not None})
+
+    def report(self, sweep, final=False):
+        """
+        Function to pass the status to the callback, progress line and status file
+        Returns: status dict
+
+        """
+        self.t_report = time.monotonic()
+        status = self.status(sweep)
+        if self.callback is not None:
+            self.callback(status)
+        if self.line:
+            rate = status['points_per_s']
+            sys.stdout.write('\r{}/{} points, {} points/s, elapsed {}, ETA {} ({})  '.format(
+                status['done'], status['total'], '{:.3g}'.format(rate) if rate else '-',
+                format_time(status['elapsed']), format_time(status['eta']), status['finish']))
+            if final:
+                sys.stdout.write('\n')
+            sys.stdout.flush()
+        if self.status_file is not None:
+            tmp = self.status_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(status, f, indent=1)
+            os.replace(tmp, self.status_file)
+        return status
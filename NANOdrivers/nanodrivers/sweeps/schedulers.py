@@ -0,0 +1,192 @@
+import itertools
+import numpy as np
+
+
+class RowMajor:
+    """
+    Scheduler visiting the grid in the order of nested loops: the last axis is the inner loop
+    """
+    def order(self, sweep):
+        """
+        Function to get the order of points
+        Args:
+            sweep: Sweep object (only sweep.shape is used)
+
+        Returns: (points, axes) array of grid indices
+
+        """
+        return np.indices(sweep.shape).reshape(len(sweep.shape), -1).T
+
+
+def snake(shape):
+    """
+    Function to get serpentine (boustrophedon) order of a grid: every inner axis changes direction
+    instead of jumping back, so between consecutive points exactly one axis moves by one step
+    (reflected mixed-radix Gray code).
+    Args:
+        shape: grid shape, the first axis is the outer one
+
+    Returns: (points, axes) array of grid indices
+
+    """
+    raw = np.indices(shape).reshape(len(shape), -1).T
+    idx = raw.copy()
+    passes = raw[:, 0].copy()  # number of completed passes of the next axis (row-major counter of the outer axes)
+    for k in range(1, len(shape)):
+        odd = passes % 2 == 1
+        idx[odd, k] = shape[k] - 1 - raw[odd, k]
+        passes = passes * shape[k] + raw[:, k]
+    return idx
+
+
+class Serpentine:
+    """
+    Scheduler with serpentine order: fast axes go back and forth instead of jumping back to the start.
+
+     Args:
+         nesting:
+             axis numbers from the outer (slowest changing) to the inner loop, default order of the axes
+     """
+    def __init__(self, nesting=None):
+        self.nesting = nesting
+
+    def order(self, sweep):
+        nesting = list(range(len(sweep.shape))) if self.nesting is None else list(self.nesting)
+        idx = snake([sweep.shape[k] for k in nesting])
+        order = np.empty_like(idx)
+        order[:, nesting] = idx
+        return order
+
+
+class CostWeighted:
+    """
+    Scheduler that nests the axes by the cost of their changes (see Axis.cost: setter time and settling):
+    the most expensive axis becomes the outer loop, so it changes the least number of times,
+    and the inner loops go serpentine. With search=True every nesting is estimated (see estimate)
+    and the cheapest one is used.
+
+    Example:
+        print(compare(sw))                 # dry run
+        sw.run(CostWeighted())
+
+     Args:
+         search:
+             try all nestings (only for up to 4 axes, otherwise the axes are sorted by average step cost)
+         serpentine:
+             False - inner loops in row-major order
+     """
+    def __init__(self, search=True, serpentine=True):
+        self.search = search
+        self.serpentine = serpentine
+        self.nesting = None
+
+    def __scheduler(self, nesting):
+        if self.serpentine:
+            return Serpentine(nesting)
+        return Nested(nesting)
+
+    def order(self, sweep):
+        if self.search and len(sweep.shape) <= 4:
+            costs = {nesting: estimate(sweep, self.__scheduler(nesting))['total']
+                     for nesting in itertools.permutations(range(len(sweep.shape)))}
+            self.nesting = min(costs, key=costs.get)
+        else:
+            step_cost = [np.mean([a.cost(x, y) for x, y in zip(a.values[:-1], a.values[1:])]) if len(a) > 1 else 0.
+                         for a in sweep.axes]
+            self.nesting = tuple(np.argsort(step_cost)[::-1])
+        return self.__scheduler(self.nesting).order(sweep)
+
+
+class Nested:
+    """
+    Scheduler with nested loops in a chosen nesting, without direction changes
+
+     Args:
+         nesting:
+             axis numbers from the outer to the inner loop
+     """
+    def __init__(self, nesting):
+        self.nesting = list(nesting)
+
+    def order(self, sweep):
+        shape = [sweep.shape[k] for k in self.nesting]
+        idx = np.indices(shape).reshape(len(shape), -1).T
+        order = np.empty_like(idx)
+        order[:, self.nesting] = idx
+        return order
+
+
+def axis_changes(sweep, order):
+    """
+    Function to find the axes set at every point of an order and the settling time of the point
+    (the sweep waits once for the longest settling), starting from the current values of the axes
+    Args:
+        sweep: Sweep object
+        order: (points, axes) array of grid indices
+
+    Returns: (points, axes) bool array of changed axes, (points,) settling times in s
+
+    """
+    n = len(order)
+    changed = np.zeros((n, len(sweep.axes)), dtype=bool)
+    settle = np.zeros(n)
+    for k, axis in enumerate(sweep.axes):
+        new = axis.values[order[:, k]]
+        changed[:, k] = True
+        changed[1:, k] = new[1:] != new[:-1]
+        start = sweep.current[k]
+        if n and start is not None and start == new[0]:
+            changed[0, k] = False
+        positions = np.flatnonzero(changed[:, k])
+        old = [start if p == 0 else new[p - 1] for p in positions]
+        times = np.array([axis.settle_time(o, new[p]) for o, p in zip(old, positions)])
+        if len(times):
+            settle[positions] = np.maximum(settle[positions], times)
+    return changed, settle
+
+
+def estimate(sweep, scheduler=None, acquire=None):
+    """
+    Function to estimate the duration of a sweep without touching instruments (dry run).
+    At every point the changed axes are set one after another and the sweep waits for the longest settling.
+    Args:
+        sweep: Sweep object
+        scheduler: scheduler to estimate, default the one of the sweep
+        acquire: time of readouts at one point in s, default measured average (0 if nothing measured)
+
+    Returns: dict with total, set, settle, acquire times in s and number of changes of every axis
+
+    """
+    order = sweep.order(scheduler)
+    order = order[~sweep.done[tuple(order.T)]]
+    n = len(order)
+    if acquire is None:
+        acquire = sweep.timing['acquire'] / sweep.n_points if sweep.n_points else 0.
+    changed, settle = axis_changes(sweep, order)
+    n_changes = changed.sum(axis=0)
+    set_time = sum(axis.set_time * n_changes[k] for k, axis in enumerate(sweep.axes))
+    result = dict(set=float(set_time), settle=float(settle.sum()), acquire=n * float(acquire))
+    result['total'] = result['set'] + result['settle'] + result['acquire']
+    result['points'] = n
+    result['changes'] = {axis.name: int(n_changes[k]) for k, axis in enumerate(sweep.axes)}
+    return result
+
+
+def compare(sweep, schedulers=None, acquire=None):
+    """
+    Function to compare estimated durations of several orders (dry run)
+    Args:
+        sweep: Sweep object
+        schedulers: dict {name: scheduler}, default row-major, serpentine and cost weighted
+        acquire: see estimate
+
+    Returns: dict {name: estimate dict}, printed as a table
+
+    """
+    if schedulers is None:
+        schedulers = {'row-major': RowMajor(), 'serpentine': Serpentine(), 'cost-weighted': CostWeighted()}
+    result = {name: estimate(sweep, s, acquire) for name, s in schedulers.items()}
+    for name, r in result.items():
+        print('{:>15}: {:10.1f} min (settle {:.1f} min), changes {}'.format(
+            name, r['total'] / 60, r['settle'] / 60, r['changes']))
+    return result
@@ -0,0 +1,413 @@
+import time
+import numpy as np
+from scipy.io import savemat
+
+from nanodrivers.utilities.settle import Deadline, SettleModel
+from nanodrivers.sweeps.schedulers import RowMajor
+
+phases = ['set', 'settle', 'acquire', 'save']
+
+
+def setter_name(func):
+    """
+    Function to find the name of the method behind a setter (bound method or functools.partial of it)
+    Returns: name or None
+
+    """
+    while func is not None:
+        if hasattr(func, '__self__'):
+            return getattr(func, '__name__', None)
+        func = getattr(func, 'func', None)
+    return None
+
+
+def owner(func):
+    """
+    Function to find the device a setter belongs to (bound method or functools.partial of it)
+    Returns: device or None
+
+    """
+    while func is not None:
+        if hasattr(func, '__self__'):
+            return func.__self__
+        func = getattr(func, 'func', None)
+    return None
+
+
+class Axis:
+    """
+    Swept parameter bound to a driver setter.
+
+    Example:
+        Axis('dc', np.linspace(2, 5, 76), dc.set_volt)
+        Axis('pump_power', np.linspace(-5, 15, 51), functools.partial(anapico.set_power, 1))
+        Axis('pump_freq', np.linspace(9e9, 13e9, 101), functools.partial(anapico.set_freq, 1), settle=0.01)
+
+    If the device of the setter has a settle model (device.settle, see utilities.settle),
+    the sweep waits for its deadline after the change, and the model of the parameter is used
+    in time estimates (the longer of it and 'settle').
+
+     Args:
+         name:
+             axis name, used as the name of the coordinate in results
+         values:
+             set points
+         setter:
+             function setting one value, setter(value)
+         settle:
+             extra time after every change in s, or SettleModel / function(step) -> time in s
+         device:
+             object with 'settle' attribute to wait for, default - owner of the setter
+         param:
+             name of the parameter in device.settle.models, default from the setter name
+             (set_volt -> 'volt', set_attenuation -> 'att')
+     """
+    def __init__(self, name, values, setter, settle=0., device=None, param=None):
+        self.name = name
+        self.values = np.asarray(values)
+        self.setter = setter
+        self.settle = settle
+        self.device = owner(setter) if device is None else device
+        self.param = param
+        self.set_time = 0.  # average duration of the setter call in s, updated by the sweep
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return 'Axis({}, {} points)'.format(self.name, len(self.values))
+
+    def settle_time(self, old, new, device=True):
+        """
+        Function to get settling time of a change
+        Args:
+            old: previous value (None - unknown)
+            new: new value
+            device: include the settle model of the device (False - only 'settle' of the axis)
+
+        Returns: time in s
+
+        """
+        step = None if old is None else float(new) - float(old)
+        if isinstance(self.settle, SettleModel):
+            extra = self.settle.time(step)
+        elif callable(self.settle):
+            extra = float(self.settle(step))
+        else:
+            extra = float(self.settle)
+        model = self.device_model() if device else None
+        return extra if model is None else max(extra, model.time(step))
+
+    def device_model(self):
+        """
+        Function to find the settle model of the device for this axis
+        Returns: SettleModel or None
+
+        """
+        models = getattr(getattr(self.device, 'settle', None), 'models', None)
+        if not models:
+            return None
+        param = self.param
+        if param is None:
+            name = setter_name(self.setter) or ''
+            name = name[4:] if name.startswith('set_') else name
+            param = name if name in models else next((p for p in models if name.startswith(p)), None)
+        return models.get(param)
+
+    def cost(self, old, new):
+        """
+        Function to estimate the time of a change: setter call and settling
+        Returns: time in s (0 if the value does not change)
+
+        """
+        if old is not None and old == new:
+            return 0.
+        return self.set_time + self.settle_time(old, new)
+
+    def deadline(self):
+        """
+        Returns: Deadline of the device settle model (already passed if the device has none)
+
+        """
+        settle = getattr(self.device, 'settle', None)
+        return getattr(settle, 'deadline', Deadline())
+
+
+class Readout:
+    """
+    Measurement done at every point of a sweep.
+
+    Example:
+        Readout(vna.get_data, ('gain', 'variance'), post=lambda mag, pha: (np.mean(mag), np.var(mag)))
+        Readout(lambda: ls.get_temp(6), 'temp')
+        Readout(sa.get_data, 'spectrum')    # arrays are stored as extra dimensions of the result
+
+     Args:
+         getter:
+             function without arguments
+         names:
+             name of the result, or tuple of names if the getter (or post) returns a tuple
+         post:
+             function applied to the output of the getter (tuple outputs are unpacked into arguments)
+     """
+    def __init__(self, getter, names='value', post=None):
+        self.getter = getter
+        self.names = (names,) if isinstance(names, str) else tuple(names)
+        self.post = post
+
+    def __repr__(self):
+        return 'Readout({})'.format(', '.join(self.names))
+
+    def read(self):
+        """
+        Function to do the measurement
+        Returns: dict {name: value}
+
+        """
+        out = self.getter()
+        if self.post is not None:
+            out = self.post(*out) if isinstance(out, tuple) else self.post(out)
+        if len(self.names) == 1:
+            out = (out,)
+        return dict(zip(self.names, out))
+
+
+class Sweep:
+    """
+    N-dimensional sweep: every point of the grid of the axes is set and all readouts are measured.
+    Result arrays are allocated on the first point, with shape grid shape + shape of the readout value.
+    Points are visited in the order given by the scheduler (see schedulers), results are always
+    stored in the grid position, so the order does not change the result arrays.
+    Only the axes whose value changes are set, the sweep waits once for the longest settling.
+
+    Hooks (checkpoint, progress, live data) are objects with any of the methods:
+        start(sweep), point(sweep, idx), finish(sweep)
+
+    Example (gain map of TWPA):
+        sw = Sweep([Axis('dc', dcs, dc.set_volt, settle=15),
+                    Axis('pow', pows, partial(anapico.set_power, 1)),
+                    Axis('freq', freqs, partial(anapico.set_freq, 1))],
+                   [Readout(vna.get_data, ('gain', 'variance'), post=lambda m, p: (np.mean(m), np.var(m)))])
+        sw.run()
+        sw.save_mat(file_name)
+        print(sw.timing)
+
+     Args:
+         axes:
+             list of Axis, the first is the outer one for row-major order
+         readouts:
+             list of Readout
+         scheduler:
+             object with order(sweep) method, default RowMajor()
+         hooks:
+             list of hook objects
+     """
+    def __init__(self, axes, readouts, scheduler=None, hooks=()):
+        self.axes = list(axes)
+        self.readouts = list(readouts)
+        self.scheduler = RowMajor() if scheduler is None else scheduler
+        self.hooks = list(hooks)
+        self.shape = tuple(len(a) for a in self.axes)
+        self.results = dict()
+        self.done = np.zeros(self.shape, dtype=bool)
+        self.current = [None] * len(self.axes)  # value of every axis as it is set on the device
+        self.timing = dict.fromkeys(phases, 0.)  # total time of every phase in s
+        self.last_timing = dict.fromkeys(phases, 0.)  # time of every phase at the last point
+        self.n_points = 0  # points measured by this object
+        self.running = False
+        self.planned = None  # number of done points the current run ends with, None - all points
+        self.run_order = None  # points of the current run in order, None - chosen during the run (samplers)
+
+    def __repr__(self):
+        return 'Sweep({}, {} done)'.format(' x '.join('{}[{}]'.format(a.name, len(a)) for a in self.axes),
+                                           int(self.done.sum()))
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def coords(self):
+        """
+        Returns: dict {axis name: values}
+
+        """
+        return {a.name: a.values for a in self.axes}
+
+    def allocate(self, outputs):
+        """
+        Function to allocate result arrays for values of one point (nan for not measured points)
+        Args:
+            outputs: dict {name: value}
+
+        Returns: None
+
+        """
+        for name, value in outputs.items():
+            if name in self.results:
+                continue
+            value = np.asarray(value)
+            dtype = value.dtype if np.issubdtype(value.dtype, np.inexact) else np.float64
+            self.results[name] = np.full(self.shape + value.shape, np.nan, dtype=dtype)
+
+    def set_point(self, idx):
+        """
+        Function to set all axes to the grid point and wait for settling
+        Args:
+            idx: tuple of indices, one per axis
+
+        Returns: None
+
+        """
+        self.set_values([axis.values[i] for axis, i in zip(self.axes, idx)])
+
+    def set_values(self, values):
+        """
+        Function to set all axes to any values (not only grid points) and wait for settling.
+        Only the axes whose value changes are set.
+        Args:
+            values: one value per axis
+
+        Returns: None
+
+        """
+        t0 = time.perf_counter()
+        deadlines = []
+        extra = 0.
+        for k, axis in enumerate(self.axes):
+            value = values[k]
+            old = self.current[k]
+            if old is not None and old == value:
+                continue
+            t = time.perf_counter()
+            axis.setter(value)
+            dt = time.perf_counter() - t
+            axis.set_time = dt if axis.set_time == 0 else 0.9 * axis.set_time + 0.1 * dt
+            self.current[k] = value
+            extra = max(extra, axis.settle_time(old, value, device=False))  # device deadline is waited below
+            deadlines.append(axis.deadline())
+        t1 = time.perf_counter()
+        Deadline.latest(Deadline(time.monotonic() + extra), *deadlines).wait()
+        t2 = time.perf_counter()
+        self.last_timing['set'] = t1 - t0
+        self.last_timing['settle'] = t2 - t1
+
+    def measure(self):
+        """
+        Function to run all readouts
+        Returns: dict {name: value}
+
+        """
+        t = time.perf_counter()
+        outputs = dict()
+        for readout in self.readouts:
+            outputs.update(readout.read())
+        self.last_timing['acquire'] = time.perf_counter() - t
+        return outputs
+
+    def store(self, idx, outputs):
+        """
+        Function to write values of one point into the result arrays
+        Returns: None
+
+        """
+        if len(self.results) < len(outputs):
+            self.allocate(outputs)
+        for name, value in outputs.items():
+            self.results[name][idx] = value
+        self.done[idx] = True
+
+    def point(self, idx):
+        """
+        Function to measure one grid point: set, settle, acquire, store, call hooks
+        Args:
+            idx: tuple of indices, one per axis
+
+        Returns: dict {name: value}
+
+        """
+        idx = tuple(int(i) for i in idx)
+        self.set_point(idx)
+        outputs = self.measure()
+        t = time.perf_counter()
+        self.store(idx, outputs)
+        for hook in self.hooks:
+            if hasattr(hook, 'point'):
+                hook.point(self, idx)
+        self.last_timing['save'] = time.perf_counter() - t
+        for phase in phases:
+            self.timing[phase] += self.last_timing[phase]
+        self.n_points += 1
+        return outputs
+
+    def order(self, scheduler=None):
+        """
+        Function to get the order of points
+        Returns: (points, axes) array of grid indices
+
+        """
+        return np.asarray((self.scheduler if scheduler is None else scheduler).order(self))
+
+    def run(self, scheduler=None, skip_done=True):
+        """
+        Function to run the sweep
+        Args:
+            scheduler: scheduler for this run, default self.scheduler
+            skip_done: do not measure points that are already done (for continuing a sweep)
+
+        Returns: dict of result arrays
+
+        """
+        self.begin()
+        try:
+            order = self.order(scheduler)
+            if skip_done:  # after begin: a checkpoint may have loaded done points
+                order = order[~self.done[tuple(order.T)]]
+            self.run_order = order
+            for idx in order:
+                self.point(tuple(idx))
+        finally:
+            self.end()
+            self.run_order = None
+        return self.results
+
+    def begin(self, planned=None):
+        """
+        Function to start a run: calls start of the hooks. Used by run and by samplers
+        that choose the points themselves (they call point between begin and end).
+        Args:
+            planned: number of done points at the end of the run (budget of a sampler), None - all points
+
+        Returns: None
+
+        """
+        self.running = True
+        self.planned = planned
+        for hook in self.hooks:
+            if hasattr(hook, 'start'):
+                hook.start(self)
+
+    def end(self):
+        """
+        Function to finish a run: calls finish of the hooks
+        Returns: None
+
+        """
+        self.running = False
+        for hook in self.hooks:
+            if hasattr(hook, 'finish'):
+                hook.finish(self)
+        self.planned = None
+
+    def data(self):
+        """
+        Returns: dict with axis values, results, done mask and timing (for savemat or np.savez)
+
+        """
+        data = dict(self.coords())
+        data.update(self.results)
+        data['done'] = self.done
+        data['timing'] = self.timing
+        return data
+
+    def save_mat(self, file_name):
+        savemat(file_name, self.data())
@@ -0,0 +1,2 @@
+from .settle import *
+from .instrument_server import *
\ No newline at end of file
@@ -0,0 +1,391 @@
+import json
+import queue
+import socket
+import struct
+import itertools
+import threading
+import socketserver
+from concurrent.futures import Future
+
+import numpy as np
+
+instrument_host = '127.0.0.1'
+instrument_port = 50010
+
+frame_header = struct.Struct('<II')  # length of json header, length of binary payload
+
+
+def encode(value, arrays):
+    """
+    Function to convert a value into json-compatible form, numpy arrays are replaced by references
+    and appended to 'arrays' (they are sent as raw bytes)
+    Returns: json-compatible value
+
+    """
+    if isinstance(value, np.ndarray):
+        arrays.append(np.ascontiguousarray(value).reshape(value.shape))  # ascontiguousarray makes 0-d arrays 1-d
+        return {'__array__': len(arrays) - 1}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, complex):
+        return {'__complex__': [value.real, value.imag]}
+    if isinstance(value, tuple):
+        return {'__tuple__': [encode(v, arrays) for v in value]}
+    if isinstance(value, list):
+        return [encode(v, arrays) for v in value]
+    if isinstance(value, dict):
+        return {str(k): encode(v, arrays) for k, v in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError('{} can not be sent, only numbers, strings, lists, tuples, dicts and numpy arrays'.format(
+        type(value).__name__))
+
+
+def decode(value, arrays):
+    """
+    Function to restore a value converted by encode
+    Returns: value
+
+    """
+    if isinstance(value, list):
+        return [decode(v, arrays) for v in value]
+    if isinstance(value, dict):
+        if '__array__' in value:
+            return arrays[value['__array__']]
+        if '__complex__' in value:
+            return complex(*value['__complex__'])
+        if '__tuple__' in value:
+            return tuple(decode(v, arrays) for v in value['__tuple__'])
+        return {k: decode(v, arrays) for k, v in value.items()}
+    return value
+
+
+def send_message(sock, message, arrays=()):
+    """
+    Function to send one message: frame header, json header, raw bytes of the arrays
+    Args:
+        sock: socket
+        message: dict (json-compatible, see encode)
+        arrays: list of contiguous numpy arrays referenced in the message
+
+    Returns: None
+
+    """
+    message = dict(message, arrays=[[a.dtype.str, list(a.shape)] for a in arrays])
+    header = json.dumps(message).encode()
+    payload = [memoryview(a).cast('B') for a in arrays if a.nbytes]
+    sock.sendall(b''.join([frame_header.pack(len(header), sum(len(p) for p in payload)), header] + payload))
+
+
+def recv_exact(sock, n):
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    k = 0
+    while k < n:
+        got = sock.recv_into(view[k:])
+        if not got:
+            raise ConnectionError('Connection closed')
+        k += got
+    return buffer
+
+
+def recv_message(sock):
+    """
+    Function to receive one message sent by send_message
+    Returns: message dict, list of numpy arrays
+
+    """
+    n_header, n_payload = frame_header.unpack(recv_exact(sock, frame_header.size))
+    message = json.loads(recv_exact(sock, n_header).decode())
+    payload = recv_exact(sock, n_payload) if n_payload else bytearray()
+    arrays, offset = [], 0
+    for dtype, shape in message.pop('arrays'):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(payload, dtype, count, offset).reshape(shape))
+        offset += count * dtype.itemsize
+    return message, arrays
+
+
+def device_bus(device):
+    """
+    Function to find the bus of a device: all devices of one GPIB board share it, other devices
+    have their own (calls on one bus are done one at a time)
+    Returns: bus name or None (own bus)
+
+    """
+    name = getattr(getattr(device, 'device', None), 'resource_name', '')
+    if isinstance(name, str) and name.upper().startswith('GPIB'):
+        return name.split('::')[0].upper()
+    return None
+
+
+class InstrumentServer:
+    """
+    Local server owning the instrument sessions (BaseVisa drivers, Vaunix attenuators and phase
+    shifters, LakeShore...), so several notebooks and scripts can use the same rack at the same time
+    without opening sessions again. Clients call methods of the devices, see InstrumentClient.
+
+    Every bus (GPIB board, or a single device on USB/LAN) has one worker thread with a priority queue:
+    calls on one bus never overlap, calls on different buses run in parallel. Requests are queued by
+    priority of the client (lower number first), then in order of arrival. A client can send many
+    requests without waiting for the answers (pipelining), answers carry the id of the request.
+
+    Messages are json headers followed by raw bytes of numpy arrays (see send_message), so traces
+    come back in binary without conversion to text. Only localhost should be used: there is no
+    authentication and every public method of the devices can be called.
+
+    Example (server script, keep it running):
+        server = InstrumentServer({'vna': VNA(), 'ls': LakeShore(), 'att': DigAtt()})
+        server.serve()
+
+     Args:
+         devices:
+             dict {name: driver object}
+         buses:
+             dict {name: bus name} to override device_bus(device), devices with the same bus name share a worker
+     """
+    def __init__(self, devices, buses=None):
+        self.devices = dict(devices)
+        buses = dict() if buses is None else buses
+        self.bus = {name: buses.get(name, device_bus(device)) or name for name, device in self.devices.items()}
+        self.queues = {b: queue.PriorityQueue() for b in set(self.bus.values())}
+        self.counter = itertools.count()
+        self.n_calls = 0
+        self.workers = [threading.Thread(target=self.__work, args=(q,), daemon=True) for q in self.queues.values()]
+        for worker in self.workers:
+            worker.start()
+
+    def describe(self):
+        """
+        Returns: dict {device name: list of public methods}
+
+        """
+        return {name: sorted(m for m in dir(device) if not m.startswith('_') and callable(getattr(device, m)))
+                for name, device in self.devices.items()}
+
+    def call(self, device, method, args=(), kwargs=None):
+        """
+        Function to call a method of a device (or get a public attribute if it is not callable)
+        Returns: result
+
+        """
+        if device not in self.devices:
+            raise KeyError('Unknown device ' + str(device))
+        if method.startswith('_'):
+            raise AttributeError('Private attribute ' + method)
+        attr = getattr(self.devices[device], method)
+        self.n_calls += 1
+        if callable(attr):
+            return attr(*args, **(kwargs or dict()))
+        return attr
+
+    def __work(self, requests):
+        while True:
+            priority, seq, connection, request, arrays = requests.get()
+            if connection.closed:
+                continue
+            self.__answer(connection, request, arrays)
+
+    def __answer(self, connection, request, arrays):
+        try:
+            result = self.call(request['device'], request['method'], decode(request.get('args', []), arrays),
+                               decode(request.get('kwargs', dict()), arrays))
+            out = []
+            message = dict(id=request['id'], result=encode(result, out))
+        except Exception as err:
+            out = []
+            message = dict(id=request['id'], error='{}: {}'.format(type(err).__name__, err))
+        connection.send(message, out)
+
+    def submit(self, connection, request, arrays):
+        """
+        Function to queue a request of a client connection (server commands are answered right away)
+        Returns: None
+
+        """
+        device = request.get('device')
+        if device is None:
+            commands = {'describe': self.describe, 'ping': lambda: 'ok',
+                        'stats': lambda: dict(calls=self.n_calls,
+                                              queued={b: q.qsize() for b, q in self.queues.items()})}
+            func = commands.get(request.get('method'))
+            if func is None:
+                connection.send(dict(id=request['id'], error='Unknown server command {}'.format(request.get('method'))))
+            else:
+                connection.send(dict(id=request['id'], result=func()))
+            return
+        if device not in self.bus:
+            connection.send(dict(id=request['id'], error='KeyError: Unknown device {}'.format(device)))
+            return
+        priority = request.get('priority', 0)
+        self.queues[self.bus[device]].put((priority, next(self.counter), connection, request, arrays))
+
+    def serve(self, host=instrument_host, port=instrument_port):
+        """
+        Function to serve clients until KeyboardInterrupt
+        Args:
+            host: address to listen on, keep localhost
+            port: port number
+
+        Returns: None
+
+        """
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def setup(self):
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.send_lock = threading.Lock()  # answers come from several workers
+                self.closed = False
+
+            def send(self, message, arrays=()):
+                try:
+                    with self.send_lock:
+                        send_message(self.request, message, arrays)
+                except OSError:
+                    self.closed = True
+
+            def handle(self):
+                try:
+                    while True:
+                        request, arrays = recv_message(self.request)
+                        server.submit(self, request, arrays)
+                except (ConnectionError, OSError):
+                    pass
+                finally:
+                    self.closed = True  # queued requests of this client are dropped
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        with Server((host, port), Handler) as tcp:
+            print('Instrument server on {}:{}, devices {}'.format(host, port, self.bus))
+            try:
+                tcp.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+class InstrumentClient:
+    """
+    Client of InstrumentServer. Calls can be blocking (call, or methods of a device proxy) or
+    pipelined (submit returns a Future, many requests can be in flight). Numpy arrays in arguments
+    and results are sent in binary.
+
+    Example (any notebook):
+        rack = InstrumentClient(priority=1)
+        vna = rack.device('vna')
+        mag, pha = vna.get_data()
+        temps = [rack.submit('ls', 'get_temp', ch) for ch in (1, 2, 6)]   # pipelined
+        temps = [t.result() for t in temps]
+
+     Args:
+         host:
+             server address
+         port:
+             server port
+         priority:
+             priority of the requests of this client, lower number is served first
+         timeout:
+             time to wait for an answer in s
+     """
+    def __init__(self, host=instrument_host, port=instrument_port, priority=0, timeout=60.):
+        self.priority = priority
+        self.timeout = timeout
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send_lock = threading.Lock()
+        self.pending = dict()  # request id: Future
+        self.counter = itertools.count()
+        self.receiver = threading.Thread(target=self.__receive, daemon=True)
+        self.receiver.start()
+
+    def __receive(self):
+        try:
+            while True:
+                message, arrays = recv_message(self.sock)
+                future = self.pending.pop(message['id'], None)
+                if future is None:
+                    continue
+                if 'error' in message:
+                    future.set_exception(RuntimeError(message['error']))
+                else:
+                    future.set_result(decode(message['result'], arrays))
+        except (ConnectionError, OSError) as err:
+            for future in list(self.pending.values()):
+                future.set_exception(ConnectionError('Instrument server connection lost: {}'.format(err)))
+            self.pending.clear()
+
+    def submit(self, device, method, *args, **kwargs):
+        """
+        Function to send a request without waiting for the answer
+        Args:
+            device: device name (None - server commands: describe, ping, stats)
+            method: method name
+
+        Returns: Future, result() gives the result or raises RuntimeError with the error of the server
+
+        """
+        request_id = next(self.counter)
+        future = Future()
+        self.pending[request_id] = future
+        arrays = []
+        request = dict(id=request_id, device=device, method=method, priority=self.priority,
+                       args=encode(list(args), arrays), kwargs=encode(kwargs, arrays))
+        with self.send_lock:
+            send_message(self.sock, request, arrays)
+        return future
+
+    def call(self, device, method, *args, **kwargs):
+        """
+        Function to call a method of a device and wait for the result
+        Returns: result
+
+        """
+        return self.submit(device, method, *args, **kwargs).result(self.timeout)
+
+    def describe(self):
+        """
+        Returns: dict {device name: list of methods}
+
+        """
+        return self.call(None, 'describe')
+
+    def device(self, name):
+        """
+        Function to get a proxy of a device: its methods are called on the server
+        Returns: DeviceProxy
+
+        """
+        return DeviceProxy(self, name)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class DeviceProxy:
+    """
+    Device on the instrument server, proxy.method(*args) calls the method on the server.
+    Attributes that are not methods are read by calling them without arguments: vna.power()
+    """
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            return self.client.call(self.name, method, *args, **kwargs)
+        call.__name__ = method
+        return call
+
+    def __repr__(self):
+        return 'DeviceProxy({})'.format(self.name)
@@ -0,0 +1,274 @@
+import time
+import asyncio
+import numpy as np
+
+
+class Deadline:
+    """
+    Moment after which a set-point change is considered settled.
+    Time is counted with time.monotonic().
+
+    Deadline can be waited for (blocking), awaited inside a coroutine
+    or just checked, so that other devices can be configured in the meanwhile:
+
+        d = dc.settle.deadline
+        anapico.set_power(1, -5)   # done while DC is still settling
+        d.wait()                   # or: await d
+
+     Args:
+         t_end:
+             time.monotonic() value when settling is over
+     """
+    def __init__(self, t_end=0.):
+        self.t_end = float(t_end)
+
+    def __repr__(self):
+        return 'Deadline(remaining={:.3f} s)'.format(self.remaining())
+
+    def __await__(self):
+        return asyncio.sleep(self.remaining()).__await__()
+
+    def remaining(self):
+        """
+        Function to get time left until settling is over
+        Returns: time in seconds (0 if already settled)
+
+        """
+        return max(0., self.t_end - time.monotonic())
+
+    def done(self):
+        """
+        Returns: True if settled
+
+        """
+        return self.remaining() == 0
+
+    def wait(self):
+        """
+        Function blocks until the deadline
+        Returns: None
+
+        """
+        left = self.remaining()
+        while left > 0:
+            time.sleep(left)
+            left = self.remaining()
+
+    @staticmethod
+    def latest(*deadlines):
+        """
+        Function to combine several deadlines into the one that comes last
+        Args:
+            deadlines: Deadline objects
+
+        Returns: Deadline
+
+        """
+        return Deadline(max([d.t_end for d in deadlines] + [0.]))
+
+
+class SettleModel:
+    """
+    Settling time as a function of step size:
+
+        t = t0 + slope * |step| ** power,   but not longer than t_max
+
+     Args:
+         t0:
+             time needed after any change, s
+         slope:
+             seconds per (unit of step) ** power
+         power:
+             step exponent, 1 means linear model
+         t_max:
+             upper limit, s. Also used when the previous value is unknown
+     """
+    def __init__(self, t0=0., slope=0., power=1., t_max=np.inf):
+        self.t0 = float(t0)
+        self.slope = float(slope)
+        self.power = float(power)
+        self.t_max = float(t_max)
+
+    def __repr__(self):
+        return 'SettleModel(t0={}, slope={}, power={}, t_max={})'.format(self.t0, self.slope, self.power, self.t_max)
+
+    def time(self, step=None):
+        """
+        Function to get settling time for a given step
+        Args:
+            step: change of the parameter. None if the previous value is unknown
+
+        Returns: time in seconds
+
+        """
+        if step is None or not np.isfinite(step):
+            return self.t_max if np.isfinite(self.t_max) else self.t0
+        t = self.t0 + self.slope * abs(step) ** self.power
+        return min(t, self.t_max)
+
+    def fit(self, steps, times):
+        """
+        Function to fit t0 and slope to measured settling times (least squares, power is kept)
+        Args:
+            steps: array of step sizes
+            times: array of measured settling times in seconds
+
+        Returns: None
+
+        """
+        steps = np.abs(np.asarray(steps, dtype=float))
+        times = np.asarray(times, dtype=float)
+        ok = np.isfinite(times)
+        a = np.vstack([np.ones(np.sum(ok)), steps[ok] ** self.power]).T
+        (t0, slope), *_ = np.linalg.lstsq(a, times[ok], rcond=None)
+        self.t0 = max(t0, 0.)
+        self.slope = max(slope, 0.)
+
+
+class Settle:
+    """
+    Settle-time bookkeeping attached to a device (available as device.settle).
+    Each setter of the device reports the new value, the model turns the step size into
+    settling time and the device deadline is moved accordingly.
+
+     Args:
+         models:
+             dict {parameter name: SettleModel}, e.g. {'volt': SettleModel(0.05, 5)}
+     """
+    def __init__(self, models=None):
+        self.models = dict(models or {})
+        self.last = dict()
+        self.deadline = Deadline()
+
+    def known(self, param, value, key=None):
+        """
+        Function to register a value read from the device (no settling needed)
+        Args:
+            param: parameter name
+            value: current value
+            key: sub-address of the parameter (for example channel number)
+
+        Returns: None
+
+        """
+        self.last[(param, key)] = value
+
+    def step(self, param, value, key=None):
+        """
+        Function to register new value of the parameter
+        Args:
+            param: parameter name, same as in models
+            value: new value
+            key: sub-address of the parameter (for example channel number)
+
+        Returns: Deadline of this change
+
+        """
+        prev = self.last.get((param, key))
+        self.last[(param, key)] = value
+        model = self.models.get(param)
+        if model is None:
+            return Deadline()
+
+        step = None
+        try:
+            if prev is not None:
+                step = float(value) - float(prev)
+        except (TypeError, ValueError):
+            step = None  # non-numeric values like 'ON'/'OFF': treated as unknown step
+        d = Deadline(time.monotonic() + model.time(step))
+        self.deadline = Deadline.latest(self.deadline, d)
+        return d
+
+    def estimate(self, param, value, key=None):
+        """
+        Function to estimate settling time without changing anything
+        Args:
+            param: parameter name
+            value: value to go to
+            key: sub-address of the parameter
+
+        Returns: time in seconds
+
+        """
+        model = self.models.get(param)
+        if model is None:
+            return 0.
+        prev = self.last.get((param, key))
+        return model.time(None if prev is None else float(value) - float(prev))
+
+    def remaining(self):
+        return self.deadline.remaining()
+
+    def wait(self):
+        """
+        Function blocks until all changes of the device are settled
+        Returns: None
+
+        """
+        self.deadline.wait()
+
+    def calibrate(self, param, set_func, read_func, start, steps, tol, hold=5, poll=0.05, timeout=60.):
+        """
+        Built-in measurement of settling times. For every step the parameter is moved to 'start',
+        left to settle, then moved to start + step. Readback is polled until 'hold' successive
+        readings stay within 'tol' of each other; time to the first of them is the settling time.
+        The model of the parameter is fitted to the result.
+
+        Example:
+            dc.settle.calibrate('volt', dc.set_volt, lambda: np.mean(vna.get_data()[0]),
+                                start=2, steps=[0.01, 0.05, 0.1, 0.5], tol=0.05)
+
+        Args:
+            param: parameter name
+            set_func: function setting the value, set_func(value)
+            read_func: function returning a float that reacts on the parameter
+            start: base value
+            steps: list of steps to measure
+            tol: readback tolerance
+            hold: number of readings that must agree
+            poll: pause between readings in seconds
+            timeout: max time for one step in seconds
+
+        Returns: steps, times (numpy arrays). Time is nan if timeout is reached
+
+        """
+        def time_to_settle():
+            t_start = time.monotonic()
+            stamps, readings = [], []
+            while time.monotonic() - t_start < timeout:
+                stamps.append(time.monotonic() - t_start)
+                readings.append(float(read_func()))
+                last = readings[-hold:]
+                if len(last) == hold and max(last) - min(last) <= tol:
+                    return stamps[-hold]
+                time.sleep(poll)
+            return np.nan
+
+        steps = np.asarray(steps, dtype=float)
+        times = np.full(len(steps), np.nan)
+        for i, step in enumerate(steps):
+            set_func(start)
+            time_to_settle()
+            set_func(start + step)
+            times[i] = time_to_settle()
+
+        model = self.models.setdefault(param, SettleModel())
+        model.fit(steps, times)
+        return steps, times
+
+
+def wait_settled(*devices):
+    """
+    Function blocks until all listed devices (or Settle/Deadline objects) are settled
+    Args:
+        devices: devices with 'settle' attribute, Settle or Deadline objects
+
+    Returns: None
+
+    """
+    deadlines = []
+    for d in devices:
+        d = getattr(d, 'settle', d)
+        deadlines.append(getattr(d, 'deadline', d))
+    Deadline.latest(*deadlines).wait()
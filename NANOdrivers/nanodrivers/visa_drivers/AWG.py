@@ -1,26 +1,44 @@
 import numpy as np
 from numpy import *
-import os
-from ctypes import *
+import hashlib
 
 import nanodrivers.visa_drivers.visa_dev as v
 import nanodrivers.visa_drivers.global_settings as gs
 
 global_awg_address = gs.awg_address
 
+min_points = 8  # shortest arbitrary waveform
+max_name_length = 12
+play_modes = ['once', 'onceWaitTrig', 'repeat', 'repeatInf', 'repeatTilTrig']
+marker_modes = ['maintain', 'lowAtStart', 'highAtStart', 'highAtStartGoLow']
+
 
 class AWG(v.BaseVisa):
     """
         Class for Agilent Technologies, 33510B, Arbitrary Waveform Generator
 
+        Arbitrary waveforms are uploaded as binary blocks to the volatile memory of the channel.
+        The driver remembers what is loaded (name and hash of the data), so uploading the same
+        shape again only selects it. The instrument can not delete single waveforms, so when memory
+        is full (or a name gets new data) the memory is cleared and waveforms are uploaded again when used.
+
+        Example: hardware timed bias sweep, 1 ms per point, started by *TRG
+            awg = AWG()
+            awg.bias_sweep(1, np.linspace(0, 0.5, 501), dwell=1e-3)
+            awg.output(1, True)
+            awg.trigger()
+
         Args:
             device_num:
                 GPIB num (float) or full device address (string)
 
     """
 
-    def __int__(self, device_num=global_awg_address):
-        super().__int__(device_num)
+    def __init__(self, device_num=global_awg_address):
+        super().__init__(device_num)
+        self.write('FORM:BORD SWAP')  # binary blocks in little-endian, native for numpy
+        # channel: {name: hash of the data}, None for waveforms left in memory by an earlier session
+        self.waveforms = {ch: dict.fromkeys(self.get_catalog(ch)) for ch in (1, 2)}
 
     def set_freq(self, channel, frequency):
         """
@@ -35,3 +53,251 @@ class AWG(v.BaseVisa):
 
         command = r'SOUR{}:FREQ {}'.format(str(channel), str(frequency))
         self.write(command)
+
+    def output(self, channel, state=True):
+        """
+        Function to switch output on or off
+        Args:
+            channel: output channel
+            state: True - on
+
+        Returns: None
+
+        """
+        self.write('OUTP{} {}'.format(channel, 'ON' if state else 'OFF'))
+
+    def set_load(self, channel, load='INF'):
+        """
+        Function to set expected load, amplitudes are calculated for it
+        Args:
+            channel: output channel
+            load: resistance in Ohm or 'INF' for high impedance
+
+        Returns: None
+
+        """
+        self.write('OUTP{}:LOAD {}'.format(channel, load))
+
+    def get_errors(self):
+        """
+        Function to read the error queue of the instrument
+        Returns: list of error strings (empty if no errors)
+
+        """
+        errors = []
+        for i in range(20):
+            err = self.query('SYST:ERR?').strip()
+            if not err or err.startswith('+0') or err.startswith('0,'):
+                break
+            errors.append(err)
+        return errors
+
+    def get_free_points(self, channel):
+        """
+        Returns: number of free points in volatile memory of the channel
+
+        """
+        return self.query_int('SOUR{}:DATA:VOL:FREE?'.format(channel))
+
+    def get_catalog(self, channel):
+        """
+        Returns: names of the waveforms in volatile memory of the channel
+
+        """
+        resp = self.query('SOUR{}:DATA:VOL:CAT?'.format(channel)).strip()
+        return [name.strip().strip('"') for name in resp.split(',') if name.strip().strip('"')]
+
+    def get_output(self, channel):
+        """
+        Returns: 1 if the output is on, 0 if off
+
+        """
+        return self.query_int('OUTP{}?'.format(channel))
+
+    def clear_waveforms(self, channel):
+        """
+        Function to clear volatile memory of the channel. Memory used by the output can not be cleared,
+        so the output is switched off, the channel is set to DC (keeps the offset, no oscillation
+        on a bias line), and the output state is restored afterwards.
+        Returns: None
+
+        """
+        on = self.get_output(channel)
+        if on:
+            self.output(channel, False)
+        self.write('SOUR{}:FUNC DC'.format(channel))
+        self.write('SOUR{}:DATA:VOL:CLE'.format(channel))
+        self.waveforms[channel].clear()
+        if on:
+            self.output(channel, True)
+
+    def upload(self, channel, name, wf, dac=False):
+        """
+        Function to upload arbitrary waveform to volatile memory.
+        Nothing is sent if the same data is already loaded under this name (by this session:
+        a waveform with this name from an earlier session is replaced).
+        Args:
+            channel: output channel
+            name: waveform name, up to 12 characters
+            wf: numpy array, floats from -1 to 1 or int16 DAC codes (-32767..32767) if dac=True
+            dac: send DAC codes instead of floats (half the data size)
+
+        Returns: True if uploaded, False if it was already in memory
+
+        """
+        wf = np.asarray(wf, dtype=np.int16 if dac else np.float32)
+        if len(wf) < min_points:
+            raise ValueError('Arbitrary waveform needs at least {} points'.format(min_points))
+        if len(name) > max_name_length:
+            raise ValueError('Waveform name {} is longer than {} characters'.format(name, max_name_length))
+        digest = hashlib.sha1(wf.tobytes()).hexdigest()
+        cache = self.waveforms[channel]
+        if cache.get(name) == digest:
+            return False
+
+        if name in cache or self.get_free_points(channel) < len(wf):
+            # a name can not be overwritten and single waveforms can not be deleted: clear the memory
+            self.clear_waveforms(channel)
+        if dac:
+            self.write_binary('SOUR{}:DATA:ARB:DAC {},'.format(channel, name), wf, datatype='h')
+        else:
+            self.write_binary('SOUR{}:DATA:ARB {},'.format(channel, name), np.clip(wf, -1, 1), datatype='f')
+        cache[name] = digest
+        return True
+
+    def set_arb(self, channel, name, sample_rate, ampl=None, offset=None, filt='OFF'):
+        """
+        Function to play uploaded waveform or sequence
+        Args:
+            channel: output channel
+            name: waveform or sequence name
+            sample_rate: points per second
+            ampl: peak to peak amplitude in V (None - keep)
+            offset: offset in V (None - keep)
+            filt: 'OFF' - steps between points, 'STEP' or 'NORM' - smoothed
+
+        Returns: None
+
+        """
+        self.write('SOUR{}:FUNC:ARB {}'.format(channel, name))
+        self.write('SOUR{}:FUNC ARB'.format(channel))
+        self.write('SOUR{}:FUNC:ARB:SRAT {}'.format(channel, sample_rate))
+        self.write('SOUR{}:FUNC:ARB:FILT {}'.format(channel, filt))
+        if ampl is not None:
+            self.write('SOUR{}:VOLT {}'.format(channel, ampl))
+        if offset is not None:
+            self.write('SOUR{}:VOLT:OFFS {}'.format(channel, offset))
+
+    def upload_sequence(self, channel, name, steps):
+        """
+        Function to define a sequence of uploaded waveforms
+        Args:
+            channel: output channel
+            name: sequence name
+            steps: list of tuples (waveform name, repeats, play mode, marker mode, marker point),
+                the last three can be omitted (default 'repeat', 'maintain', 10). See play_modes, marker_modes
+
+        Returns: None
+
+        """
+        parts = ['"{}"'.format(name)]
+        for step in steps:
+            wf_name, repeats, mode, marker, point = tuple(step) + ('repeat', 'maintain', 10)[len(step) - 2:]
+            if mode not in play_modes or marker not in marker_modes:
+                raise ValueError('Wrong play or marker mode in sequence step {}'.format(step))
+            parts.append('"{}",{},{},{},{}'.format(wf_name, repeats, mode, marker, point))
+        descriptor = ','.join(parts)
+        self.write('SOUR{}:DATA:SEQ #{}{}{}'.format(channel, len(str(len(descriptor))), len(descriptor), descriptor))
+
+    def set_trigger(self, channel, source='BUS', slope='POS', delay=0., timer=None):
+        """
+        Function to set trigger of burst or sequence
+        Args:
+            channel: output channel
+            source: 'IMM', 'EXT', 'TIM' or 'BUS' (*TRG command, see trigger)
+            slope: 'POS' or 'NEG' for external trigger
+            delay: delay from trigger to output in s
+            timer: period of 'TIM' source in s
+
+        Returns: None
+
+        """
+        self.write('TRIG{}:SOUR {}'.format(channel, source))
+        self.write('TRIG{}:SLOP {}'.format(channel, slope))
+        self.write('TRIG{}:DEL {}'.format(channel, delay))
+        if timer is not None:
+            self.write('TRIG{}:TIM {}'.format(channel, timer))
+
+    def set_burst(self, channel, cycles=1, mode='TRIG', phase=0., period=None, state=True):
+        """
+        Function to set burst mode: the waveform is played 'cycles' times on every trigger
+        Args:
+            channel: output channel
+            cycles: number of cycles, or 'INF'
+            mode: 'TRIG' - triggered, 'GAT' - gated by external input
+            phase: start phase in degrees
+            period: burst period in s for internal (IMM) trigger
+            state: True - burst on
+
+        Returns: None
+
+        """
+        self.write('SOUR{}:BURS:MODE {}'.format(channel, mode))
+        self.write('SOUR{}:BURS:NCYC {}'.format(channel, cycles))
+        self.write('SOUR{}:BURS:PHAS {}'.format(channel, phase))
+        if period is not None:
+            self.write('SOUR{}:BURS:INT:PER {}'.format(channel, period))
+        self.write('SOUR{}:BURS:STAT {}'.format(channel, 'ON' if state else 'OFF'))
+
+    def trigger(self, channel=None):
+        """
+        Function to send software trigger, used with trigger source 'BUS'
+        Args:
+            channel: output channel, None - both channels
+
+        Returns: None
+
+        """
+        self.write('*TRG' if channel is None else 'TRIG{}'.format(channel))
+
+    def wait(self):
+        """
+        Function blocks until all commands are done (for example after upload)
+        Returns: None
+
+        """
+        self.query('*OPC?')
+
+    def bias_sweep(self, channel, volts, dwell, source='BUS', name=None):
+        """
+        Function to prepare hardware timed sweep of the output voltage: every value is held 'dwell' seconds,
+        the sweep is played once on every trigger. Before the trigger and after the sweep
+        the output is at the first value (burst start phase 0). If all values are the same,
+        a flat waveform is played at this value.
+        Args:
+            channel: output channel
+            volts: output voltages in V
+            dwell: time on every value in s
+            source: trigger source, see set_trigger
+            name: waveform name, default from the hash of the sweep
+
+        Returns: times of the steps from the trigger in s
+
+        """
+        volts = np.asarray(volts, dtype=float)
+        repeat = int(np.ceil(min_points / len(volts)))  # short sweeps: every value is repeated
+        lo, hi = np.min(volts), np.max(volts)
+        if hi > lo:
+            span = hi - lo
+            wf = np.repeat(2 * (volts - lo) / span - 1, repeat)
+        else:  # flat: output is the offset, amplitude only has to be valid
+            span = 2e-3
+            wf = np.zeros(len(volts) * repeat)
+        if name is None:
+            name = 'B' + hashlib.sha1(wf.astype(np.float32).tobytes()).hexdigest()[:max_name_length - 1]
+        self.output(channel, False)
+        self.upload(channel, name, wf)
+        self.set_arb(channel, name, repeat / dwell, ampl=span, offset=(hi + lo) / 2, filt='OFF')
+        self.set_trigger(channel, source)
+        self.set_burst(channel, cycles=1, phase=0)
+        return np.arange(len(volts)) * dwell
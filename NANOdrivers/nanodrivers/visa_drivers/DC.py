@@ -1,13 +1,20 @@
 from __future__ import (absolute_import, division, print_function)
 
 from numpy import *
+import numpy as np
 import pyvisa
+import time
+import asyncio
+import threading
 
 import nanodrivers.visa_drivers.visa_dev as v
 import nanodrivers.visa_drivers.global_settings as gs
+from nanodrivers.utilities.settle import Settle, SettleModel
 
 global_dc_address = gs.dc_source_address
 
+user_wf_name = 'RAMP_DC'  # name of the arbitrary waveform stored in the device for hardware ramps
+
 
 def get_class_attributes(print_it=False):
     """
@@ -38,6 +45,9 @@ class DC(v.BaseVisa):
      """
     def __init__(self, device_num=global_dc_address):
         super().__init__(device_num)
+        # flux settles slowly after large bias jumps, see settle.calibrate to measure it
+        self.settle = Settle({'volt': SettleModel(t0=0.05, slope=5, t_max=15)})
+
         self.volt = None
         self.set_volt(0)
 
@@ -47,6 +57,10 @@ class DC(v.BaseVisa):
         self.shape = None
         self.set_shape(shape_mode='DC')
 
+        self.ramp_rate = 0.1  # V/s
+        self.ramp_step = 0.001  # V
+        self.ramp_handle = None
+
     def dump(self, print_it=False):
         """
         Function returns all pre-defined class attributes
@@ -119,8 +133,139 @@ class DC(v.BaseVisa):
         Args:
             volt: voltage in volts
 
-        Returns: None
+        Returns: None. Settling deadline is in self.settle.deadline
 
         """
         self.volt = volt
         self.write('VOLT:OFFS {}'.format(str(self.volt)))
+        self.settle.step('volt', volt)
+
+    def set_ramp(self, rate=0.1, step=0.001):
+        """
+        Function to set parameters of voltage ramps
+        Args:
+            rate: max dV/dt in V/s
+            step: voltage step of software ramp in V
+
+        Returns: None
+
+        """
+        self.__check_ramp(rate, step)
+        self.ramp_rate = rate
+        self.ramp_step = step
+
+    def __check_ramp(self, rate, step):
+        if not (rate > 0 and step > 0):  # also catches nan
+            raise ValueError('Ramp rate and step must be positive, got rate {} V/s, step {} V'.format(rate, step))
+
+    def ramp_volt(self, volt, rate=None, step=None, hardware=False):
+        """
+        Function to move voltage to a new value with limited rate.
+        The ramp runs in a background thread, so other devices can be set up while bias is moving.
+        If another ramp is running, it is cancelled first.
+
+        Example:
+            r = dc.ramp_volt(2.5)
+            anapico.set_freq(1, 11e9)
+            r.wait()    # or: await r
+
+        Args:
+            volt: target voltage in volts
+            rate: max dV/dt in V/s, default self.ramp_rate
+            step: voltage step in V, default self.ramp_step
+            hardware: if True the ramp is uploaded as USER waveform and played by the device
+                (steps of 33120A DAC instead of GPIB writes). Needs |volt - current| >= 50 mV
+
+        Returns: RampHandle
+
+        """
+        rate = self.ramp_rate if rate is None else rate
+        step = self.ramp_step if step is None else step
+        self.__check_ramp(rate, step)
+        if self.ramp_handle is not None:
+            self.ramp_handle.cancel()
+            self.ramp_handle.wait()
+
+        start = float(self.volt if self.volt is not None else 0)
+        volt = float(volt)
+        if hardware and abs(volt - start) >= 0.05:
+            target = self.__hardware_ramp
+        else:
+            target = self.__software_ramp
+        self.ramp_handle = RampHandle(target, start, volt, rate, step)
+        return self.ramp_handle
+
+    def __software_ramp(self, handle, start, stop, rate, step):
+        n = int(np.ceil(abs(stop - start) / step)) or 1
+        dt = abs(stop - start) / n / rate
+        t_next = time.monotonic()
+        for v in np.linspace(start, stop, n + 1)[1:]:
+            t_next += dt
+            if handle.cancelled.wait(np.clip(t_next - time.monotonic(), 0, None)):
+                return
+            self.set_volt(v)
+
+    def __hardware_ramp(self, handle, start, stop, rate, step):
+        # Waveform is the ramp followed by a flat part of the same length. Output is switched
+        # to DC at the target value in the middle of the flat part, so late switching is harmless.
+        duration = abs(stop - start) / rate
+        n = int(np.clip(np.ceil(abs(stop - start) / step), 8, 8000))
+        sign = 1 if stop > start else -1
+        wf = np.concatenate([np.linspace(-1, 1, n), np.ones(n)]) * sign
+        self.write('DATA VOLATILE, ' + ','.join('{:.4f}'.format(w) for w in wf))
+        self.write('DATA:COPY {}, VOLATILE'.format(user_wf_name))
+        self.write('FUNC:USER {}'.format(user_wf_name))
+        self.write('APPL:USER {}, {}, {}'.format(1 / (2 * duration), abs(stop - start), (start + stop) / 2))
+        self.shape = 'USER'
+        t0 = time.monotonic()
+
+        cancelled = handle.cancelled.wait(1.5 * duration)
+        if cancelled:  # stop where the waveform is now
+            stop = start + (stop - start) * np.clip((time.monotonic() - t0) / duration, 0, 1)
+        self.write('APPL:DC DEF, DEF, {}'.format(str(stop)))
+        self.shape = 'DC'
+        self.volt = stop
+        self.settle.step('volt', stop)
+
+
+class RampHandle:
+    """
+    Handle of a running voltage ramp (returned by DC.ramp_volt).
+    Can be waited for, awaited inside a coroutine or cancelled.
+    After cancel() the voltage stays at the last value reached.
+    """
+    def __init__(self, target, start, stop, rate, step):
+        self.start = start
+        self.stop = stop
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=target, args=(self, start, stop, rate, step), daemon=True)
+        self.thread.start()
+
+    def __repr__(self):
+        return 'RampHandle({} V -> {} V, done={})'.format(self.start, self.stop, self.done())
+
+    def __await__(self):
+        return asyncio.get_event_loop().run_in_executor(None, self.thread.join).__await__()
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def cancel(self):
+        """
+        Function to stop the ramp
+        Returns: None
+
+        """
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        """
+        Function blocks until the ramp is finished
+        Args:
+            timeout: max waiting time in seconds, None - no limit
+
+        Returns: True if ramp is finished
+
+        """
+        self.thread.join(timeout)
+        return self.done()
@@ -9,6 +9,9 @@ import nanodrivers.visa_drivers.global_settings as gs
 
 global_dSA_address = gs.din_SA_address
 
+# FAVM averaging modes
+avg_modes = {'none': 0, 'vector': 1, 'rms': 2, 'peak_hold': 3}
+
 
 class Din_SA(v.BaseVisa):
     """ Class for Stanford_Research_Systems, SR785, Dynamic Signal Analyzer
@@ -23,8 +26,10 @@ class Din_SA(v.BaseVisa):
 
     """
 
-    def __int__(self, device_num=global_dSA_address):
-        super().__int__(device_num)
+    def __init__(self, device_num=global_dSA_address):
+        super().__init__(device_num)
+        self.GPIB_output()
+        self.freq = None
 
     def idn(self):
         """
@@ -33,11 +38,7 @@ class Din_SA(v.BaseVisa):
         Returns: Name of the device if connection exist
 
         """
-        try:
-            print("Connection exist:", self.query('*IDN?\n'))
-        except:
-            self.__error_message()
-
+        print("Connection exist:", self.query('*IDN?\n'))
 
     def start(self):
         self.write('STRT')
@@ -45,28 +46,119 @@ class Din_SA(v.BaseVisa):
     def GPIB_output(self):
         self.write('OUTX 0')
 
-    def get_freq(self, lines=100, d=0):
-        self.write('*CLS')
-        max_freq = float(self.query('FSPN? {}'.format(int(d))))
-        min_freq = float(self.query('FSTR? {}'.format(int(d))))
-        fr = np.linspace(min_freq, max_freq, lines)
-        return fr
+    def get_nop(self, d=0):
+        """
+        Function to get number of points of the display
+        Args:
+            d: display 0 (A) or 1 (B)
 
-    def read_d(self, avg=1, d=0):
+        Returns: number of points
+
+        """
+        return int(self.query_float('DSPN? {}'.format(int(d))))
+
+    def get_freq(self, lines=None, d=0):
+        """
+        Function to get frequency axis of the display (FSTR? start, FSPN? span).
+        The axis is kept in self.freq (last axis read, get_spectrum reads it again on every call).
+        Args:
+            lines: number of points, default - number of points of the display
+            d: display 0 (A) or 1 (B)
+
+        Returns: freq in Hz (numpy array)
+
+        """
         self.write('*CLS')
+        span = float(self.query('FSPN? {}'.format(int(d))))
+        start = float(self.query('FSTR? {}'.format(int(d))))
+        if lines is None:
+            lines = self.get_nop(d)
+        self.freq = np.linspace(start, start + span, lines)
+        return self.freq
+
+    def set_averaging(self, avg, mode='rms', d=2, exponential=False):
+        """
+        Function to set averaging of the analyser
+        Args:
+            avg: number of averages (1 - averaging off)
+            mode: 'rms', 'vector', 'peak_hold' or 'none', see avg_modes
+            d: display 0 (A), 1 (B) or 2 (both)
+            exponential: False - fixed length, True - exponential averaging
+
+        Returns: None
+
+        """
+        d = int(d)
+        self.write('FAVG {},{}'.format(d, int(avg > 1 and mode != 'none')))
+        self.write('FAVM {},{}'.format(d, avg_modes[mode]))
+        self.write('FAVT {},{}'.format(d, int(exponential)))
+        self.write('FAVN {},{}'.format(d, int(avg)))
 
-        def read_c():
-            self.start()
-            self.GPIB_output()
-            time.sleep(8 + 0.5)
-            read_s = self.query('DSPY? {}'.format(int(d)))
-            rear_f = np.array(read_s.split(','), dtype=float)
-            return rear_f
+    def wait_avg_done(self, d=0, timeout=600., poll=0.1):
+        """
+        Function waits until averaging is complete (DSPS? status bit AVGA/AVGB)
+        Args:
+            d: display 0 (A) or 1 (B)
+            timeout: max waiting time in s
+            poll: time between status queries in s
+
+        Returns: True if averaging is complete, False on timeout
+
+        """
+        bit = 1 + 8 * int(d)
+        t_end = time.monotonic() + timeout
+        while time.monotonic() < t_end:
+            if int(self.query_float('DSPS? {}'.format(bit))):
+                return True
+            time.sleep(poll)
+        return False
+
+    def read_display(self, d=0, n=None):
+        """
+        Function to read display data in one binary transfer (DSPB?)
+        Args:
+            d: display 0 (A) or 1 (B)
+            n: number of points, default - number of points of the display (DSPN?), it must be exact:
+               the binary block has no header
+
+        Returns: data in display units (numpy array)
+
+        """
+        if n is None:
+            n = self.get_nop(d)
+        return self.query_binary('DSPB? {}'.format(int(d)), datatype='f', header_fmt='empty', data_points=n,
+                                 expect_termination=False).astype(float)
 
-        fft_0 = read_c()
-        for i in range(avg - 1):
-            fft_0 += read_c()
+    def get_spectrum(self, avg=1, d=0, mode='rms', timeout=600.):
+        """
+        Function to measure averaged spectrum. Averaging is done by the analyser,
+        the result is read once in binary. The frequency axis and number of points are read on every call,
+        so changes of span or lines are followed.
+        Args:
+            avg: number of averages
+            d: display 0 (A) or 1 (B)
+            mode: averaging mode, see avg_modes
+            timeout: max measurement time in s
+
+        Returns: freq (Hz), spectrum (numpy arrays)
+
+        """
+        self.set_averaging(avg, mode, d)
+        self.get_freq(d=d)
+        self.query_float('DSPS? {}'.format(1 + 8 * int(d)))  # reading the bit clears it
+        self.start()
+        if not self.wait_avg_done(d, timeout):
+            print('Averaging is not complete after {} s, data is read anyway'.format(timeout))
+        return self.freq, self.read_display(d, len(self.freq))
 
-        fft_0 = fft_0 / avg
+    def read_d(self, avg=1, d=0):
+        """
+        Function to measure averaged spectrum (RMS averaging), see get_spectrum
+        Args:
+            avg: number of averages
+            d: display 0 (A) or 1 (B)
 
-        return fft_0[:-1]
+        Returns: spectrum (numpy array), frequency axis is in self.freq
+
+        """
+        return self.get_spectrum(avg, d)[1]
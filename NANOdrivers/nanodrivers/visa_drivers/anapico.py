@@ -2,6 +2,7 @@ from numpy import *
 import numpy as np
 import nanodrivers.visa_drivers.visa_dev as v
 import nanodrivers.visa_drivers.global_settings as gs
+from nanodrivers.utilities.settle import Settle, SettleModel
 import pyvisa
 
 
@@ -37,6 +38,9 @@ class ANAPICO(v.BaseVisa):
     def __init__(self, device_num=global_anapico_address):
         super().__init__(device_num)  # initialise device with the init of parent class VisaDevice
         self.write(r':SYST:COMM:LAN:RTMO {}'.format(str(1)))  # reconnect timeout in seconds
+        self.settle = Settle({'status': SettleModel(t0=0.1),
+                              'power': SettleModel(t0=0.01, slope=0.02, t_max=0.5),  # s per dB
+                              'freq': SettleModel(t0=0.01, slope=1e-10, t_max=0.5)})  # s per Hz
 
         self.channel_status = np.array([nan, nan, nan, nan])
         self.channel_freqs = np.array([nan, nan, nan, nan])
@@ -81,6 +85,7 @@ class ANAPICO(v.BaseVisa):
         """
         channel_py = channel-1
         self.channel_status[channel_py] = self.query('OUTPut{}:STATe?'.format(str(channel)))
+        self.settle.known('status', self.channel_status[channel_py], channel)
         return self.channel_status[channel_py]
 
     def get_freq(self, channel):
@@ -95,6 +100,7 @@ class ANAPICO(v.BaseVisa):
         """
         channel_py = channel - 1
         self.channel_freqs[channel_py] = self.query('SOUR{}:FREQ?'.format(str(channel)))
+        self.settle.known('freq', self.channel_freqs[channel_py], channel)
         return self.channel_freqs[channel_py]
 
     def get_power(self, channel):
@@ -109,6 +115,7 @@ class ANAPICO(v.BaseVisa):
         """
         channel_py = channel - 1
         self.channel_pows[channel_py] = self.query('SOUR{}:POW?'.format(str(channel)))
+        self.settle.known('power', self.channel_pows[channel_py], channel)
         return self.channel_pows[channel_py]
 
     def set_on(self, channel):
@@ -125,6 +132,7 @@ class ANAPICO(v.BaseVisa):
         command = r'OUTP{} ON'.format(str(channel))
         self.write(command)
         self.channel_status[channel_py] = 1
+        self.settle.step('status', 1, channel)
 
     def set_off(self, channel):
         """
@@ -140,6 +148,7 @@ class ANAPICO(v.BaseVisa):
         command = r'OUTP{} OFF'.format(str(channel))
         self.write(command)
         self.channel_status[channel_py] = 0
+        self.settle.step('status', 0, channel)
 
     def set_power(self, channel, ch_power):
         """
@@ -156,6 +165,7 @@ class ANAPICO(v.BaseVisa):
         command = r'SOUR{}:POW {}'.format(str(channel), str(ch_power))
         self.write(command)
         self.channel_pows[channel_py] = ch_power
+        self.settle.step('power', ch_power, channel)
 
     def set_freq(self, channel, frequency):
         """
@@ -172,3 +182,4 @@ class ANAPICO(v.BaseVisa):
         command = r'SOUR{}:FREQ {}'.format(str(channel), str(frequency))
         self.write(command)
         self.channel_freqs[channel_py] = frequency
+        self.settle.step('freq', frequency, channel)
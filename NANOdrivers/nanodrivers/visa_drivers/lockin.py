@@ -2,12 +2,26 @@ import numpy as np
 from numpy import *
 from ctypes import *
 import pyvisa
+import time
 
 import nanodrivers.visa_drivers.visa_dev as v
 import nanodrivers.visa_drivers.global_settings as gs
 
 global_lokin_address = gs.loking_address
 
+buffer_size = 16383  # points per channel in SR844 internal storage
+
+# SNAP? parameters
+snap_params = {'X': 1, 'Y': 2, 'R': 3, 'R_dBm': 4, 'theta': 5}
+
+# full scale in Vrms for SENS 0..14
+sensitivities = np.array([1e-7, 3e-7, 1e-6, 3e-6, 1e-5, 3e-5, 1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1.])
+
+# time constant in s for OFLT 0..17
+time_constants = np.array([1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1., 3., 1e1, 3e1, 1e2, 3e2, 1e3, 3e3, 1e4, 3e4])
+
+overload_mask = 0b111  # LIAS? bits: input/amplifier, filter and output overloads
+
 
 def get_class_attributes(print_it=False):
     """
@@ -176,14 +190,200 @@ class LOCKIN(v.BaseVisa):
             '12: 100 mVrms / -7 dBm',
             '13: 300 mVrms / +3 dBm',
             '14: 1 Vrms / +13 dBm']
-        self.query_float('SENS {}'.format(str(s)))
+        self.write('SENS {}'.format(str(s)))
+        self.sensitivity = s
         return sensitivity_options[s]
 
     def set_auto_sens(self):
         """
         Function to set autotunned sensitivity. Doesn't work well...
 
-        Returns: Not really reliable. Sets too sensitive rate. Not recommended to use
+        Returns: Not really reliable. Sets too sensitive rate. Not recommended to use.
+        See auto_range for software autoranging.
 
         """
         return self.write('AGAN')
+
+    def get_overload_and_r(self):
+        """
+        Function to read overload status and R with one command line.
+        Reading LIAS? clears the status bits, so overload is reported since the previous call.
+
+        Returns: overload (bool), R in Vrms
+
+        """
+        resp = self.query('LIAS?;SNAP? 3,5')
+        parts = resp.replace(';', '\n').split()
+        if len(parts) < 2:  # device terminated each answer separately
+            parts += self.read().split()
+        status = int(parts[0])
+        r = float(parts[1].split(',')[0])
+        return bool(status & overload_mask), r
+
+    def auto_range(self, fill=0.5, max_steps=3, settle_tc=5):
+        """
+        Software autoranging. Sensitivity is computed from measured R and set directly,
+        so usually one or two range changes are needed (AGAN goes range by range).
+        When the input is overloaded R is not reliable, and range is increased by two decades.
+
+        Args:
+            fill: wanted R / full scale, the smallest range with R <= fill * full scale is chosen
+            max_steps: max number of range changes
+            settle_tc: waiting time after range change in time constants
+
+        Returns: sensitivity index chosen and its full scale description
+
+        """
+        i = int(self.get_sensitivity())
+        self.get_time_const()
+        wait = settle_tc * time_constants[int(self.time_const)]
+
+        for _ in range(max_steps):
+            overload, r = self.get_overload_and_r()
+            if overload:
+                new_i = int(np.clip(i + 4, 0, len(sensitivities) - 1))
+            else:
+                new_i = int(np.searchsorted(sensitivities * fill, r))
+                new_i = int(np.clip(new_i, 0, len(sensitivities) - 1))
+            if new_i == i:
+                break
+            i = new_i
+            self.set_sensitivity(i)
+            time.sleep(wait)
+
+        return i, '{}: {:g} Vrms full scale'.format(i, sensitivities[i])
+
+    def get_snap(self, params=('X', 'Y', 'R', 'theta')):
+        """
+        Function to read several outputs at the same moment with one SNAP? query
+        Args:
+            params: names from snap_params: X, Y, R, R_dBm, theta (2 to 6 names)
+
+        Returns: numpy array of values in the same order (V, dBm, deg)
+
+        """
+        resp = self.query('SNAP? {}'.format(','.join(str(snap_params[p]) for p in params)))
+        return np.array(resp.strip().split(','), dtype=float)
+
+    def get_sample_rate(self):
+        """
+        Function to get sample rate of data storage
+        Returns: rate in Hz (nan for external trigger)
+
+        """
+        i = int(self.query_float('SRAT?'))
+        return nan if i == 14 else 2. ** (i - 4)
+
+    def set_sample_rate(self, rate):
+        """
+        Function to set sample rate of data storage
+        Args:
+            rate: rate in Hz, rounded to nearest 62.5 mHz * 2^i up to 512 Hz,
+                or 'TRIG' for external trigger
+
+        Returns: rate in Hz actually set
+
+        """
+        if rate == 'TRIG':
+            self.write('SRAT 14')
+            return nan
+        i = int(np.clip(np.round(np.log2(rate) + 4), 0, 13))
+        self.write('SRAT {}'.format(i))
+        return 2. ** (i - 4)
+
+    def set_buffer_loop(self, loop=False):
+        """
+        Function to set end of buffer mode
+        Args:
+            loop: False - stop when buffer is full (1 shot), True - overwrite from the beginning
+
+        Returns: None
+
+        """
+        self.write('SEND {}'.format(int(loop)))
+
+    def start_buffer(self):
+        self.write('STRT')
+
+    def pause_buffer(self):
+        self.write('PAUS')
+
+    def reset_buffer(self):
+        self.write('REST')
+
+    def get_buffer_points(self):
+        """
+        Function to get number of points stored in the buffer
+        Returns: number of points
+
+        """
+        return int(self.query_float('SPTS?'))
+
+    def get_buffer(self, n=None, start=0, binary='TRCB'):
+        """
+        Function to read stored data of both channels, one binary transfer per channel
+        Args:
+            n: number of points, default all stored points
+            start: first point
+            binary: 'TRCB' - IEEE float format, 'TRCL' - compact integer format
+
+        Returns: X, Y (numpy arrays), channels must display X and Y (see acquire)
+
+        """
+        if n is None:
+            n = self.get_buffer_points() - start
+        if n <= 0:
+            return np.array([]), np.array([])
+
+        data = []
+        for ch in [1, 2]:
+            cmd = '{}? {},{},{}'.format(binary, ch, int(start), int(n))
+            if binary == 'TRCL':
+                raw = self.query_binary(cmd, datatype='h', header_fmt='empty', data_points=2 * n,
+                                        expect_termination=False)
+                data.append(raw[0::2] * 2. ** (raw[1::2] - 124))  # mantissa * 2^(exp - 124)
+            else:
+                data.append(self.query_binary(cmd, datatype='f', header_fmt='empty', data_points=n,
+                                              expect_termination=False).astype(float))
+        return data[0], data[1]
+
+    def acquire(self, n, rate=512, binary='TRCB', timeout=None):
+        """
+        Function to record X and Y with fixed sample rate using internal storage of the lock-in.
+        Both channels are sampled at the same moments, data is read after recording.
+
+        Args:
+            n: number of points, max 16383
+            rate: sample rate in Hz (max 512), or 'TRIG' - one point per external trigger
+            binary: transfer format, 'TRCB' or 'TRCL'
+            timeout: max time to wait for the points in s (None - no limit), after it the stored points are read
+
+        Returns: t (s, from start of recording; sample index for 'TRIG'), X, Y (numpy arrays)
+
+        """
+        n = int(np.clip(n, 1, buffer_size))
+        self.pause_buffer()
+        self.write('DDEF 1,0')  # CH1 stores X
+        self.write('DDEF 2,0')  # CH2 stores Y
+        rate = self.set_sample_rate(rate)
+        triggered = not np.isfinite(rate)
+        self.set_buffer_loop(False)
+        self.reset_buffer()
+        t_end = None if timeout is None else time.monotonic() + timeout
+        self.start_buffer()
+
+        if not triggered:
+            time.sleep(n / rate if t_end is None else min(n / rate, timeout))
+        poll = 0.01 if triggered else 0.1 / rate + 0.01
+        stored = self.get_buffer_points()
+        while stored < n and (t_end is None or time.monotonic() < t_end):
+            time.sleep(poll)
+            stored = self.get_buffer_points()
+        self.pause_buffer()
+        if stored < n:
+            print('Only {} of {} points are stored after {} s'.format(stored, n, timeout))
+            n = self.get_buffer_points()
+
+        x, y = self.get_buffer(n, binary=binary)
+        t = np.arange(n) if triggered else np.arange(n) / rate
+        return t, x, y
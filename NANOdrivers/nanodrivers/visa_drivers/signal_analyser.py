@@ -1,11 +1,16 @@
 from numpy import *
 import numpy as np
-import time
 import nanodrivers.visa_drivers.visa_dev as v
 import nanodrivers.visa_drivers.global_settings as gs
 
 global_sa_address = gs.sa_address
 
+# trace mode name: (TRAC:MODE, TRAC:STOR:MODE)
+trace_modes = {'clear_write': ('WRIT', 'OFF'),
+               'max_hold': ('WRIT', 'MAXH'),
+               'min_hold': ('WRIT', 'MINH'),
+               'average': ('WRIT', 'LAV')}
+
 
 class Anri(v.BaseVisa):
     """Class for ANRITSU MS2830A signal analyzer
@@ -17,6 +22,9 @@ class Anri(v.BaseVisa):
     def __init__(self, device_num=global_sa_address):
         super().__init__(device_num)  # initialise device with the init of parent class VisaDevice
         self.write(r':SYST:COMM:LAN:RTMO {}'.format(str(1)))  # reconnect timeout in seconds
+        self.nop = self.get_nop()
+        self.binary = None
+        self.set_binary(True)
 
     def set_cent_freq(self, freq):
         """
@@ -72,9 +80,11 @@ class Anri(v.BaseVisa):
 
         ''"""
         self.write('SWEep:POINts {}'.format(str(nop)))
+        self.nop = int(nop)
 
     def get_nop(self):
-        return self.query_int('SWEep:POINts?')
+        self.nop = self.query_int('SWEep:POINts?')
+        return self.nop
 
     def get_sweep_time(self):
         return self.query_float('SWEep:TIME?')
@@ -85,9 +95,116 @@ class Anri(v.BaseVisa):
     def sweep_mode_sing(self):
         self.write('INIT:MODE:SING')
 
-    def get_data(self):
-        self.write('INIT:IMM')
-        time.sleep(self.get_sweep_time()*12)
-        raw_data = self.query('TRAC? TRAC1')
-        data = np.array(raw_data.split(','), dtype=float)
-        return data
+    def set_binary(self, binary=True):
+        """
+        Function to set trace transfer format
+        Args:
+            binary: True - 32 bit float little-endian block, False - comma separated text
+
+        Returns: None
+
+        """
+        self.binary = binary
+        if binary:
+            self.write('FORM REAL,32')
+            self.write('FORM:BORD SWAP')
+        else:
+            self.write('FORM ASC')
+
+    def set_trace_mode(self, trace, mode='clear_write'):
+        """
+        Function to set trace mode
+        Args:
+            trace: trace number [1..6]
+            mode: one of trace_modes: clear_write, max_hold, min_hold, average
+
+        Returns: None
+
+        """
+        write_mode, storage_mode = trace_modes[mode]
+        self.write('TRAC{}:MODE {}'.format(int(trace), write_mode))
+        self.write('TRAC{}:STOR:MODE {}'.format(int(trace), storage_mode))
+
+    def set_avgs(self, count):
+        """
+        Function to set number of sweeps for average/hold traces in single sweep mode
+        Args:
+            count: number of sweeps
+
+        Returns: None
+
+        """
+        self.write('AVER:COUN {}'.format(int(count)))
+
+    def trigger(self, sweeps=1):
+        """
+        Function to start single measurement and wait for the end of it with *OPC?
+        (instead of a guessed pause). VISA timeout is extended for the duration of the sweeps.
+        Args:
+            sweeps: number of sweeps expected (average count)
+
+        Returns: None
+
+        """
+        self.sweep_mode_sing()
+        timeout = self.device.timeout
+        sweep_timeout = 1e3 * (2 * sweeps * self.get_sweep_time() + 5)  # ms
+        if timeout is not None and sweep_timeout > timeout:
+            self.device.timeout = sweep_timeout
+        try:
+            self.query('INIT:IMM;*OPC?')
+        finally:
+            self.device.timeout = timeout
+
+    def read_trace(self, trace=1, out=None):
+        """
+        Function to read trace data in one block
+        Args:
+            trace: trace number [1..6]
+            out: preallocated numpy array of nop points to put data in, None - new array
+
+        Returns: data in dBm (numpy array)
+
+        """
+        if self.binary:
+            return self.query_binary('TRAC? TRAC{}'.format(int(trace)), datatype='f', out=out)
+        data = np.array(self.query('TRAC? TRAC{}'.format(int(trace))).split(','), dtype=float)
+        if out is None:
+            return data
+        out[:len(data)] = data
+        return out
+
+    def get_data(self, trace=1, out=None):
+        """
+        Function to measure one single sweep and read it
+        Args:
+            trace: trace number [1..6]
+            out: preallocated numpy array of nop points, None - new array
+
+        Returns: data in dBm (numpy array)
+
+        """
+        self.trigger()
+        return self.read_trace(trace, out)
+
+    def get_traces(self, modes=('clear_write', 'max_hold', 'average'), count=10, out=None):
+        """
+        Function to measure several trace types at once: traces 1, 2, ... are set to the given modes,
+        'count' sweeps are done in single sweep mode and all traces are read.
+        Args:
+            modes: trace modes, see trace_modes
+            count: number of sweeps for hold and average traces
+            out: preallocated numpy array [len(modes), nop], None - new array
+
+        Returns: numpy array [len(modes), nop], rows in order of modes
+
+        """
+        if out is None:
+            out = np.empty((len(modes), self.nop))
+        for i, mode in enumerate(modes):
+            self.set_trace_mode(i + 1, mode)
+        self.set_avgs(count)
+        self.trigger(count)
+        for i in range(len(modes)):
+            self.read_trace(i + 1, out[i])
+        return out
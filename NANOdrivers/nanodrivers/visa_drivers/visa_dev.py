@@ -1,3 +1,4 @@
+import threading
 import pyvisa
 import numpy as np
 
@@ -15,6 +16,7 @@ class BaseVisa:
         else:
             raise ValueError('Invalid device initialization, please provide GPIB num or device address.')
         self.device = device
+        self.lock = threading.RLock()  # one command at a time when device is used from several threads
 
     def __error_message(self):
         print('Check that device is connected, visible in NI MAX and is not used by another software.')
@@ -30,7 +32,8 @@ class BaseVisa:
         """
         device = self.device
         try:
-            device.write(cmd_str)
+            with self.lock:
+                device.write(cmd_str)
         except pyvisa.VisaIOError as e:
             print('Unable to connect device.\n', e)
             self.__error_message()
@@ -43,7 +46,8 @@ class BaseVisa:
         """
         device = self.device
         try:
-            resp = device.read()
+            with self.lock:
+                resp = device.read()
         except pyvisa.VisaIOError as e:
             print('Unable to connect device.\n', e)
             self.__error_message()
@@ -61,7 +65,8 @@ class BaseVisa:
         """
         device = self.device
         try:
-            resp = device.query(cmd_str)
+            with self.lock:
+                resp = device.query(cmd_str)
             return resp
         except Exception as e:
             print('Unable to connect device.\n', e)
@@ -80,7 +85,8 @@ class BaseVisa:
         device = self.device
         resp = ""
         try:
-            resp = device.query(cmd_str)
+            with self.lock:
+                resp = device.query(cmd_str)
             num = np.float64(resp)
             return num
         except pyvisa.VisaIOError as e:
@@ -102,8 +108,9 @@ class BaseVisa:
         device = self.device
         resp = ""
         try:
-            resp = device.query(cmd_str)
-            num = np.int(resp)
+            with self.lock:
+                resp = device.query(cmd_str)
+            num = int(resp)
             return num
         except pyvisa.VisaIOError as e:
             print('Unable to read data from device.\n', e)
@@ -112,6 +119,60 @@ class BaseVisa:
         except Exception:
             print('Device returned an invalid responce:', resp)
 
+    def query_binary(self, cmd_str, datatype='f', is_big_endian=False, header_fmt='ieee', data_points=None,
+                     expect_termination=True, out=None):
+        """
+        2nd order command. Same as 'query', but reads binary block response in one transfer
+        Args:
+            cmd_str: command (string)
+            datatype: format of one value as in struct module: 'f' - float32, 'd' - float64, 'h' - int16...
+            is_big_endian: byte order of the device
+            header_fmt: 'ieee' - block starts with #<n><length>, 'empty' - raw bytes without header
+            data_points: number of values, needed when header_fmt='empty'
+            expect_termination: False if device does not send termination character after the block
+            out: preallocated numpy array, values are converted from the received block straight into it
+                (the first len(block) elements), None - array over the received block
+
+        Returns: response (numpy array, out if given)
+
+        """
+        device = self.device
+        try:
+            with self.lock:
+                data = device.query_binary_values(cmd_str, datatype=datatype, is_big_endian=is_big_endian,
+                                                  header_fmt=header_fmt, data_points=data_points,
+                                                  expect_termination=expect_termination, container=np.array)
+            if out is None:
+                return data  # view of the received bytes, no copy
+            if len(data) > len(out):
+                raise ValueError('Block has {} values, out has only {}'.format(len(data), len(out)))
+            out[:len(data)] = data
+            return out
+        except pyvisa.VisaIOError as e:
+            print('Unable to read data from device.\n', e)
+            self.__error_message()
+            return np.array([])
+
+    def write_binary(self, cmd_str, values, datatype='f', is_big_endian=False):
+        """
+        2nd order command. Writes command followed by values as one IEEE binary block (#<n><length><data>)
+        Args:
+            cmd_str: command (string), block is appended right after it
+            values: numpy array or list of values
+            datatype: format of one value as in struct module: 'f' - float32, 'h' - int16...
+            is_big_endian: byte order of the device
+
+        Returns: NONE
+
+        """
+        device = self.device
+        try:
+            with self.lock:
+                device.write_binary_values(cmd_str, values, datatype=datatype, is_big_endian=is_big_endian)
+        except pyvisa.VisaIOError as e:
+            print('Unable to connect device.\n', e)
+            self.__error_message()
+
     def idn(self):
         """
         Base Visa command queries *IDN?.
@@ -7,7 +7,6 @@ import time
 
 import nanodrivers.visa_drivers.visa_dev as v
 import nanodrivers.visa_drivers.global_settings as gs
-from datetime import datetime, timedelta
 
 
 global_vna_address = gs.vna_address
@@ -113,6 +112,8 @@ class VNA(v.BaseVisa):
         self.avgs = nan
         self.set_avgs(1) # sets averaging number to 1
 
+        self.last_timing = dict()  # phases of the last get_data in s, used by sweep progress monitors
+
     def dump(self, print_it=False):
         """
         Function returns all pre-defined class attributes
@@ -188,19 +189,23 @@ class VNA(v.BaseVisa):
         Readout in any mode. After initialisation of the measurements a pause need to be set.
         The pause = sweep time + 0.2 s.
         Otherwise, readout request will come before measurement ends.
+        Durations of the phases are kept in self.last_timing: acquire (measurement and waiting),
+        transfer (data query), parse (conversion of the string).
 
         Returns: data in specified form
 
         """
+        t0 = time.perf_counter()
         self.set_on()
         self.write("INIT1:IMM")
         sweep_time = self.get_sweep_time()
-        now2 = datetime.now()
-        print(now2, '+', sweep_time/60, 'min')
         time.sleep(0.4 + sweep_time)
 
+        t1 = time.perf_counter()
         data_str = self.query("CALC1:DATA? SDAT")
+        t2 = time.perf_counter()
         data = np.array(data_str.rstrip().split(",")).astype("float64")
+        self.last_timing = dict(acquire=t1 - t0, transfer=t2 - t1, parse=time.perf_counter() - t2)
 
         s = data[0::2] + 1j * data[1::2]
         # self.set_off()